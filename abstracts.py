@@ -0,0 +1,36 @@
+"""Аннотации статей: очистка разметки при сборе и короткая версия для показа.
+
+Crossref отдает аннотации в JATS XML (<jats:p>, <jats:title>, <jats:italic>), часть
+источников - в HTML. В базе хранится один очищенный текст; абзацы разделены пустой строкой.
+"""
+import html
+import re
+
+SHORT_ABSTRACT_LENGTH = 500
+# Заглушка, которую раньше сохраняли вместо отсутствующей аннотации
+MISSING_ABSTRACT = 'No abstract available'
+# Меняется вместе с clean: сохраненные аннотации тогда очищаются заново
+ABSTRACTS_VERSION = '1'
+
+# Заголовок "Abstract" в начале аннотации JATS повторяет название раздела
+_HEADING = re.compile(r'^\s*<(?:jats:)?title[^>]*>\s*abstract\s*</(?:jats:)?title>', re.IGNORECASE)
+_BLOCK_END = re.compile(r'</(?:jats:)?(?:p|sec|title|list-item)>|<br\s*/?>', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+_PARAGRAPHS = re.compile(r'\n\s*\n')
+
+
+def clean(text):
+    """Текст аннотации без разметки и лишних пробелов; '' если аннотации нет"""
+    if not text or text.strip() == MISSING_ABSTRACT:
+        return ''
+    text = _BLOCK_END.sub('\n\n', _HEADING.sub('', text))
+    # Концы блоков уже стали переносами; строчные теги (<jats:sub>, <i>) убираются без пробела: H<sub>2</sub>O
+    text = html.unescape(_TAG.sub('', text))
+    paragraphs = (' '.join(paragraph.split()) for paragraph in _PARAGRAPHS.split(text))
+    return '\n\n'.join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def short(text, length=SHORT_ABSTRACT_LENGTH):
+    """Начало аннотации для списков и подсказок"""
+    text = text or ''
+    return text[:length] + '...' if len(text) > length else text
@@ -0,0 +1,310 @@
+"""Структура графа статей: PageRank, степень, приближенная промежуточность и сообщества.
+
+Все метрики считаются разреженными матричными операциями по всему графу. Результат
+хранится в базе вместе с версией графа, по которой он посчитан (storage.save_analytics),
+и пересчитывается, только когда граф изменился.
+"""
+import math
+import os
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+
+# Аналитика графа в /api/articles и /api/analytics (0 - выключена)
+ANALYTICS = os.environ.get('GRAPH_ANALYTICS', '1') != '0'
+# damping - вероятность перехода по связи в PageRank, tolerance и max_iterations - останов
+# степенного метода, betweenness_samples - число источников в оценке промежуточности,
+# propagation_rounds - предел раундов распространения меток
+ANALYTICS_SETTINGS = {
+    'damping': float(os.environ.get('PAGERANK_DAMPING', 0.85)),
+    'tolerance': 1e-10,
+    'max_iterations': 100,
+    'betweenness_samples': int(os.environ.get('BETWEENNESS_SAMPLES', 64)),
+    'propagation_rounds': int(os.environ.get('COMMUNITY_ROUNDS', 30))
+}
+# Источников промежуточности в одном блоке: ограничивает память плотных матриц n x блок
+BETWEENNESS_BLOCK = 32
+# Сколько самых весомых статей и ключевых слов описывают сообщество
+TOP_MEMBERS = 5
+LABEL_KEYWORDS = 3
+# Сообщества меньше этого размера при свертке остаются отдельными узлами
+COLLAPSE_MIN_SIZE = int(os.environ.get('COLLAPSE_MIN_SIZE', 3))
+
+
+def adjacency(node_ids, links):
+    """(переходы, соседство): ориентированная матрица весов для PageRank, где 'cites'
+    ведет от цитирующей статьи к цитируемой, а остальные связи - в обе стороны,
+    и симметричная матрица весов всех связей. Вес связи - log(1 + strength), как в раскладке."""
+    index = {node_id: k for k, node_id in enumerate(node_ids)}
+    n = len(node_ids)
+    pairs = [
+        (index[link['source']], index[link['target']], link['type'] == 'cites', link.get('strength', 1) or 1)
+        for link in links
+        if link['source'] in index and link['target'] in index and link['source'] != link['target']
+    ]
+    rows = np.array([i for i, _, _, _ in pairs], dtype=np.int64)
+    columns = np.array([j for _, j, _, _ in pairs], dtype=np.int64)
+    directed = np.array([cites for _, _, cites, _ in pairs], dtype=bool)
+    weights = np.log1p(np.array([float(w) for _, _, _, w in pairs]))
+
+    undirected = sparse.csr_matrix(
+        (np.concatenate((weights, weights)), (np.concatenate((rows, columns)), np.concatenate((columns, rows)))),
+        shape=(n, n)
+    )
+    back = ~directed
+    transitions = sparse.csr_matrix(
+        (np.concatenate((weights, weights[back])),
+         (np.concatenate((rows, columns[back])), np.concatenate((columns, rows[back])))),
+        shape=(n, n)
+    )
+    return transitions, undirected
+
+
+def pagerank(transitions, settings):
+    """PageRank степенным методом; масса висячих узлов распределяется равномерно"""
+    n = transitions.shape[0]
+    if not n:
+        return np.zeros(0)
+    out_weight = np.asarray(transitions.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.where(dangling, 0, 1 / np.where(dangling, 1, out_weight))
+    # Транспонированная матрица вероятностей перехода: rank @ P = P.T @ rank
+    flow = (sparse.diags(inverse) @ transitions).T.tocsr()
+    damping = settings['damping']
+    rank = np.full(n, 1 / n)
+    for _ in range(settings['max_iterations']):
+        updated = damping * (flow @ rank) + (damping * rank[dangling].sum() + 1 - damping) / n
+        converged = np.abs(updated - rank).sum() < settings['tolerance'] * n
+        rank = updated
+        if converged:
+            break
+    return rank / rank.sum()
+
+
+def betweenness(neighbors, samples, rng):
+    """Промежуточность по кратчайшим путям (в шагах), оценка Брандеса по samples источникам.
+
+    Обход в ширину идет сразу от блока источников: уровень - одно произведение
+    разреженной матрицы смежности на плотную матрицу n x блок. Нормирована на
+    число пар узлов, как в networkx.
+    """
+    n = neighbors.shape[0]
+    centrality = np.zeros(n)
+    candidates = np.flatnonzero(np.diff(neighbors.indptr))
+    if n < 3 or not len(candidates):
+        return centrality
+    if samples and len(candidates) > samples:
+        sources = np.sort(rng.choice(candidates, samples, replace=False))
+    else:
+        sources = candidates
+    adjacency_matrix = neighbors.copy()
+    adjacency_matrix.data = np.ones_like(adjacency_matrix.data)
+
+    for block in np.array_split(sources, -(-len(sources) // BETWEENNESS_BLOCK)):
+        columns = np.arange(len(block))
+        # sigma - число кратчайших путей от источника, depth - расстояние (-1 - недостижим)
+        sigma = np.zeros((n, len(block)))
+        sigma[block, columns] = 1
+        depth = np.full((n, len(block)), -1, dtype=np.int32)
+        depth[block, columns] = 0
+        frontier = sigma.copy()
+        level = 0
+        while True:
+            reached = adjacency_matrix @ frontier
+            reached[depth >= 0] = 0
+            if not reached.any():
+                break
+            level += 1
+            depth[reached > 0] = level
+            sigma += reached
+            frontier = reached
+
+        # Зависимости накапливаются от дальних уровней к ближним
+        delta = np.zeros((n, len(block)))
+        safe_sigma = np.where(sigma > 0, sigma, 1)
+        for current in range(level, 0, -1):
+            share = np.where(depth == current, (1 + delta) / safe_sigma, 0)
+            delta += np.where(depth == current - 1, sigma * (adjacency_matrix @ share), 0)
+        delta[block, columns] = 0
+        centrality += delta.sum(axis=1)
+
+    # Выборка источников масштабируется на все узлы; в неориентированном графе пара учтена дважды
+    centrality *= len(candidates) / len(sources) / 2
+    return centrality / ((n - 1) * (n - 2) / 2)
+
+
+def label_propagation(neighbors, rounds, rng):
+    """Сообщества распространением меток: узел берет метку с наибольшим весом связей
+    среди соседей. За раунд обновляется случайная половина узлов, чтобы метки не
+    колебались между соседями; при равенстве узел сохраняет свою метку."""
+    n = neighbors.shape[0]
+    labels = np.arange(n)
+    linked = np.diff(neighbors.indptr) > 0
+    # Собственная метка получает добавку меньше любого веса связи, так что строка не пуста
+    votes_matrix = (neighbors + sparse.identity(n, format='csr') * 1e-6).tocsr()
+    rows = np.repeat(np.arange(n), np.diff(votes_matrix.indptr))
+    for _ in range(rounds):
+        # Сумма весов связей узла по меткам соседей; argmax строки - через ее максимум
+        votes = sparse.csr_matrix((votes_matrix.data, (rows, labels[votes_matrix.indices])), shape=(n, n))
+        votes.sum_duplicates()
+        counts = np.diff(votes.indptr)
+        top = np.maximum.reduceat(votes.data, votes.indptr[:-1])
+        candidates = np.flatnonzero(votes.data == np.repeat(top, counts))
+        _, first = np.unique(np.repeat(np.arange(n), counts)[candidates], return_index=True)
+        best = votes.indices[candidates[first]]
+        changing = linked & (best != labels)
+        if not changing.any():
+            break
+        changing &= rng.random(n) < 0.5
+        labels[changing] = best[changing]
+    return labels
+
+
+def node_keywords(node):
+    terms = node.get('keywords') or node.get('search_keywords') or []
+    return {term.strip().lower() for term in terms if term and term.strip()}
+
+
+def community_keywords(nodes, frequency, total, limit=LABEL_KEYWORDS):
+    """Ключевые слова, отличающие сообщество: частота в нем, взвешенная редкостью во всем графе"""
+    counts = Counter()
+    for node in nodes:
+        counts.update(node_keywords(node))
+    scores = {term: count * math.log((1 + total) / frequency[term]) for term, count in counts.items()}
+    return sorted(scores, key=lambda term: (-scores[term], term))[:limit]
+
+
+def most_common(values):
+    counts = Counter(value for value in values if value)
+    return counts.most_common(1)[0][0] if counts else None
+
+
+def analyze(graph, settings=None, seed=0):
+    """Метрики узлов и сообщества графа.
+
+    Возвращает {'nodes': {id: {'pagerank', 'degree', 'betweenness', 'community'}},
+    'communities': [{'id', 'size', 'label', 'keywords', 'journal', 'pagerank', 'top'}]}; сообщества
+    пронумерованы по убыванию размера.
+    """
+    settings = settings or ANALYTICS_SETTINGS
+    rng = np.random.default_rng(seed)
+    nodes = graph['nodes']
+    node_ids = [node['id'] for node in nodes]
+    transitions, neighbors = adjacency(node_ids, graph['links'])
+
+    rank = pagerank(transitions, settings)
+    degree = np.diff(neighbors.indptr)
+    between = betweenness(neighbors, settings['betweenness_samples'], rng)
+    labels = label_propagation(neighbors, settings['propagation_rounds'], rng)
+
+    # Номера сообществ по убыванию размера, при равенстве - по первому узлу
+    _, first, inverse, sizes = np.unique(labels, return_index=True, return_inverse=True, return_counts=True)
+    order = np.lexsort((first, -sizes))
+    community = np.empty(len(order), dtype=np.int64)
+    community[order] = np.arange(len(order))
+    community = community[inverse]
+
+    frequency = Counter()
+    for node in nodes:
+        frequency.update(node_keywords(node))
+
+    members = [[] for _ in range(len(order))]
+    for k in np.argsort(-rank, kind='stable'):
+        members[community[k]].append(k)
+    communities = []
+    for number, positions in enumerate(members):
+        keywords = community_keywords((nodes[k] for k in positions), frequency, len(nodes))
+        communities.append({
+            'id': number,
+            'size': len(positions),
+            'label': ', '.join(keywords) or nodes[positions[0]].get('title'),
+            'keywords': keywords,
+            'journal': most_common(nodes[k].get('journal') for k in positions),
+            'pagerank': float(f"{rank[positions].sum():.4g}"),
+            'top': [node_ids[k] for k in positions[:TOP_MEMBERS]]
+        })
+
+    return {
+        'nodes': {
+            node_id: {
+                'pagerank': float(f"{rank[k]:.4g}"),
+                'degree': int(degree[k]),
+                'betweenness': float(f"{between[k]:.4g}"),
+                'community': int(community[k])
+            }
+            for k, node_id in enumerate(node_ids)
+        },
+        'communities': communities
+    }
+
+
+def collapse_communities(graph, communities, min_size=COLLAPSE_MIN_SIZE):
+    """Сворачивает каждое сообщество подграфа не меньше min_size узлов в один узел.
+
+    Узлы подграфа должны иметь поле 'community'; communities - {номер: описание}.
+    Связи внутри сообщества пропадают, связи между узлами сворачиваются по типу:
+    strength - сумма, count - число исходных связей.
+    """
+    groups = {}
+    for node in graph['nodes']:
+        if node.get('community') is not None:
+            groups.setdefault(node['community'], []).append(node)
+    collapsed = {number for number, group in groups.items() if len(group) >= min_size}
+
+    owner = {}
+    nodes = []
+    for node in graph['nodes']:
+        number = node.get('community')
+        if number not in collapsed:
+            owner[node['id']] = node['id']
+            nodes.append(node)
+            continue
+        owner[node['id']] = f"community:{number}"
+        if groups[number][0] is node:
+            nodes.append(community_node(number, groups[number], communities.get(number, {})))
+
+    merged = {}
+    for link in graph['links']:
+        source, target = owner.get(link['source']), owner.get(link['target'])
+        if source is None or target is None or source == target:
+            continue
+        if link['type'] != 'cites' and target < source:
+            source, target = target, source
+        key = (source, target, link['type'])
+        entry = merged.get(key)
+        if entry is None:
+            merged[key] = entry = {'source': source, 'target': target, 'strength': 0, 'type': link['type'], 'count': 0}
+        entry['strength'] += link.get('strength', 1) or 1
+        entry['count'] += 1
+    links = list(merged.values())
+    for link in links:
+        link['strength'] = round(link['strength'], 3)
+    return {'nodes': nodes, 'links': links}
+
+
+def community_node(number, group, info):
+    """Узел свернутого сообщества из его статей group в подграфе"""
+    group = sorted(group, key=lambda node: -(node.get('pagerank') or 0))
+    years = [node['year'] for node in group if isinstance(node.get('year'), int)]
+    node = {
+        'id': f"community:{number}",
+        'type': 'community',
+        'community': number,
+        'title': info.get('label') or f"Community {number}",
+        'keywords': info.get('keywords', []),
+        'size': len(group),
+        'citation_count': sum(node.get('citation_count') or 0 for node in group),
+        'pagerank': float(f"{sum(node.get('pagerank') or 0 for node in group):.4g}"),
+        'year': max(years) if years else None,
+        'years': [min(years), max(years)] if years else None,
+        'top': [node['id'] for node in group[:TOP_MEMBERS]]
+    }
+    # Узел ставится в центр своих статей в общей раскладке
+    points = [(node['layout']['x'], node['layout']['y']) for node in group if node.get('layout')]
+    if points:
+        node['layout'] = {
+            'x': sum(x for x, _ in points) / len(points),
+            'y': sum(y for _, y in points) / len(points)
+        }
+    return node
@@ -1,701 +1,922 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, g, render_template, request, jsonify
 from flask_cors import CORS
-import requests
-import json
+import logging
 import os
 import time
 from datetime import datetime, timedelta
 import re
-import urllib.parse
+import bisect
+import hashlib
+import math
+from collections import Counter
+
+import abstracts
+import analytics
+import authorship
+import citations
+import harvest
+import identity
+import jobs
+import locking
+import metrics
+import neighborhood
+import search
+import similarity
+import snapshot
+import sources
+import storage
+import wire
+from jobs import JobRunner
+from graph_cache import GraphCache
+from graph_index import GraphIndex
+from topics import load_topics
+from layout import LAYOUT_REFINE_ITERATIONS, SERVER_LAYOUT, force_layout
+from sources import ensure_url
+
+# Уровень журнала: DEBUG показывает каждую статью и запрос к API, INFO - этапы обновления
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+logging.basicConfig(level=LOG_LEVEL, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
-# Файл для хранения статей
-ARTICLES_FILE = 'data/articles.json'
+# Разреживание связей по ключевым словам при построении графа:
+# weighting - 'idf' (вес общих слов по редкости) или 'count' (число общих слов),
+# min_strength - минимальный вес связи, top_k - сколько сильнейших соседей оставлять у узла (0 - всех),
+# max_df - доля статей, начиная с которой слово само по себе не связывает статьи
+KEYWORD_LINK_SETTINGS = {
+    'weighting': os.environ.get('KEYWORD_WEIGHTING', 'idf'),
+    'min_strength': float(os.environ.get('KEYWORD_MIN_STRENGTH', 1.0)),
+    'top_k': int(os.environ.get('KEYWORD_TOP_K', 10)),
+    'max_df': float(os.environ.get('KEYWORD_MAX_DF', 0.5))
+}
 
-def load_articles():
-    """Загружает статьи из файла"""
-    if os.path.exists(ARTICLES_FILE):
-        with open(ARTICLES_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {'nodes': [], 'links': []}
+def load_articles(with_abstracts=True):
+    """Загружает весь граф статей из базы; with_abstracts=False - без текста аннотаций"""
+    return storage.load_graph(with_abstracts)
 
 def save_articles(articles_data):
-    """Сохраняет статьи в файл"""
-    os.makedirs('data', exist_ok=True)
-    with open(ARTICLES_FILE, 'w', encoding='utf-8') as f:
-        json.dump(articles_data, f, ensure_ascii=False, indent=2)
-
-def ensure_url(article):
-    """Гарантирует что у статьи есть URL"""
-    if article.get('url'):
-        return article['url']
-    
-    if article.get('doi'):
-        return f"https://doi.org/{article['doi']}"
-    elif 'pubmed_' in article.get('id', ''):
-        pmid = article['id'].replace('pubmed_', '')
-        return f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
-    elif 'arxiv_' in article.get('id', ''):
-        arxiv_id = article['id'].replace('arxiv_', '')
-        return f"https://arxiv.org/abs/{arxiv_id}"
-    elif article.get('source') == 'Crossref' and article.get('doi'):
-        return f"https://doi.org/{article['doi']}"
-    elif article.get('source') == 'Semantic Scholar' and article.get('id', '').startswith('semantic_'):
-        paper_id = article['id'].replace('semantic_', '')
-        return f"https://www.semanticscholar.org/paper/{paper_id}"
-    
-    title_encoded = urllib.parse.quote(article.get('title', ''))
-    return f"https://scholar.google.com/scholar?q={title_encoded}"
+    """Полностью перезаписывает граф статей в базе"""
+    storage.save_graph(articles_data)
 
-def search_acs_publications(days_back=30):
-    """Поиск в журналах American Chemical Society"""
-    all_articles = []
-    
-    acs_journals = [
-        "Macromolecules",
-        "Biomacromolecules", 
-        "Chemistry of Materials",
-        "ACS Applied Materials & Interfaces",
-        "ACS Macro Letters",
-        "Journal of the American Chemical Society",
-        "ACS Polymers Au",
-        "Langmuir"
-    ]
-    
-    for journal in acs_journals:
-        print(f"Searching ACS Journal: {journal}")
-        
-        url = f"https://api.crossref.org/works?filter=container-title:{urllib.parse.quote(journal)}&rows=15&sort=published&order=desc"
-        
-        try:
-            response = requests.get(url, timeout=30)
-            data = response.json()
-            
-            works = data.get('message', {}).get('items', [])
-            print(f"Found {len(works)} articles from {journal}")
-            
-            for item in works:
-                try:
-                    title = item.get('title', ['No title'])[0]
-                    abstract = item.get('abstract', 'No abstract available')
-                    
-                    published = item.get('created', {}).get('date-parts', [[None]])[0]
-                    year = published[0] if published and published[0] else datetime.now().year
-                    
-                    doi = item.get('DOI', '')
-                    
-                    authors = []
-                    for author in item.get('author', []):
-                        given = author.get('given', '')
-                        family = author.get('family', '')
-                        if given or family:
-                            authors.append(f"{given} {family}".strip())
-                    
-                    article_id = f"acs_{doi}" if doi else f"acs_{hash(title)}"
-                    
-                    article = {
-                        'id': article_id,
-                        'title': title,
-                        'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
-                        'full_abstract': abstract,
-                        'year': year,
-                        'journal': journal,
-                        'keywords': ['ACS', 'chemistry', 'polymer', 'material science'],
-                        'citation_count': max(item.get('is-referenced-by-count', 1), 1),
-                        'doi': doi,
-                        'published': str(year),
-                        'search_keywords': [journal],
-                        'authors': authors,
-                        'source': 'ACS Publications',
-                        'url': ''
-                    }
-                    
-                    article['url'] = ensure_url(article)
-                    
-                    if not any(a['id'] == article['id'] for a in all_articles):
-                        all_articles.append(article)
-                        print(f"  - Added from {journal}: {article['title'][:50]}...")
-                        
-                except Exception as e:
-                    print(f"Error processing ACS article: {e}")
-                    continue
-            
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error searching ACS journal {journal}: {e}")
-            continue
-    
-    return all_articles
+def search_articles(start_date, end_date, resolver=None):
+    """Статьи всех источников за диапазон дат (YYYY-MM-DD) без дубликатов.
 
-def search_rsc_publications(days_back=30):
-    """Поиск в журналах Royal Society of Chemistry"""
-    all_articles = []
-    
-    rsc_journals = [
-        "Polymer Chemistry",
-        "Journal of Materials Chemistry A",
-        "Soft Matter",
-        "Materials Horizons",
-        "Green Chemistry"
-    ]
-    
-    for journal in rsc_journals:
-        print(f"Searching RSC Journal: {journal}")
-        
-        url = f"https://api.crossref.org/works?filter=container-title:{urllib.parse.quote(journal)}&rows=12&sort=published&order=desc"
-        
-        try:
-            response = requests.get(url, timeout=30)
-            data = response.json()
-            
-            works = data.get('message', {}).get('items', [])
-            print(f"Found {len(works)} articles from {journal}")
-            
-            for item in works:
-                try:
-                    title = item.get('title', ['No title'])[0]
-                    abstract = item.get('abstract', 'No abstract available')
-                    
-                    published = item.get('created', {}).get('date-parts', [[None]])[0]
-                    year = published[0] if published and published[0] else datetime.now().year
-                    
-                    doi = item.get('DOI', '')
-                    
-                    authors = []
-                    for author in item.get('author', []):
-                        given = author.get('given', '')
-                        family = author.get('family', '')
-                        if given or family:
-                            authors.append(f"{given} {family}".strip())
-                    
-                    article_id = f"rsc_{doi}" if doi else f"rsc_{hash(title)}"
-                    
-                    article = {
-                        'id': article_id,
-                        'title': title,
-                        'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
-                        'full_abstract': abstract,
-                        'year': year,
-                        'journal': journal,
-                        'keywords': ['RSC', 'chemistry', 'polymer', 'material science'],
-                        'citation_count': max(item.get('is-referenced-by-count', 1), 1),
-                        'doi': doi,
-                        'published': str(year),
-                        'search_keywords': [journal],
-                        'authors': authors,
-                        'source': 'RSC Publications',
-                        'url': ''
-                    }
-                    
-                    article['url'] = ensure_url(article)
-                    
-                    if not any(a['id'] == article['id'] for a in all_articles):
-                        all_articles.append(article)
-                        print(f"  - Added from {journal}: {article['title'][:50]}...")
-                        
-                except Exception as e:
-                    print(f"Error processing RSC article: {e}")
-                    continue
-            
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error searching RSC journal {journal}: {e}")
-            continue
-    
-    return all_articles
+    resolver - identity.Resolver, знающий уже сохраненные статьи; дубликаты
+    сливаются в них, а их происхождение копится в resolver.merged.
+    """
+    logger.info("Starting comprehensive article search from %s to %s...", start_date, end_date)
+    return sources.unique(sources.harvest_all(start_date, end_date), resolver)
 
-def search_springer_chemistry(days_back=30):
-    """Поиск в Springer химических журналах"""
-    all_articles = []
-    
-    springer_journals = [
-        "Colloid and Polymer Science",
-        "Journal of Polymer Research",
-        "Polymer Bulletin",
-        "Advances in Polymer Technology"
-    ]
-    
-    chemistry_keywords = [
-        "copolymer synthesis",
-        "polymer characterization", 
-        "barrier properties polymer",
-        "polymer blend",
-        "controlled polymerization",
-        "polymer nanocomposite"
-    ]
-    
-    for keyword in chemistry_keywords:
-        print(f"Searching Springer for: {keyword}")
-        
-        url = f"https://api.crossref.org/works?query={urllib.parse.quote(keyword)}&rows=10&sort=relevance&order=desc"
-        
-        try:
-            response = requests.get(url, timeout=30)
-            data = response.json()
-            
-            works = data.get('message', {}).get('items', [])
-            print(f"Found {len(works)} articles for '{keyword}'")
-            
-            for item in works:
-                try:
-                    # Проверяем что это Springer статья
-                    publisher = item.get('publisher', '').lower()
-                    if 'springer' not in publisher:
-                        continue
-                        
-                    title = item.get('title', ['No title'])[0]
-                    abstract = item.get('abstract', 'No abstract available')
-                    
-                    published = item.get('created', {}).get('date-parts', [[None]])[0]
-                    year = published[0] if published and published[0] else datetime.now().year
-                    
-                    journal = item.get('container-title', ['Springer Journal'])[0] if item.get('container-title') else 'Springer Journal'
-                    doi = item.get('DOI', '')
-                    
-                    authors = []
-                    for author in item.get('author', []):
-                        given = author.get('given', '')
-                        family = author.get('family', '')
-                        if given or family:
-                            authors.append(f"{given} {family}".strip())
-                    
-                    article_id = f"springer_{doi}" if doi else f"springer_{hash(title)}"
-                    
-                    article = {
-                        'id': article_id,
-                        'title': title,
-                        'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
-                        'full_abstract': abstract,
-                        'year': year,
-                        'journal': journal,
-                        'keywords': [keyword, 'polymer', 'chemistry'],
-                        'citation_count': max(item.get('is-referenced-by-count', 1), 1),
-                        'doi': doi,
-                        'published': str(year),
-                        'search_keywords': [keyword],
-                        'authors': authors,
-                        'source': 'Springer',
-                        'url': ''
-                    }
-                    
-                    article['url'] = ensure_url(article)
-                    
-                    if not any(a['id'] == article['id'] for a in all_articles):
-                        all_articles.append(article)
-                        print(f"  - Added Springer: {article['title'][:50]}...")
-                        
-                except Exception as e:
-                    print(f"Error processing Springer article: {e}")
-                    continue
-            
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error searching Springer for {keyword}: {e}")
-            continue
-    
-    return all_articles
+def author_set(article):
+    """Авторы статьи: {ключ имени: ORCID или ''} (см. authorship.author_keys)"""
+    return authorship.author_keys(article)
 
-def search_wiley_polymers(days_back=30):
-    """Поиск в Wiley полимерных журналах"""
-    all_articles = []
-    
-    wiley_journals = [
-        "Journal of Applied Polymer Science",
-        "Journal of Polymer Science", 
-        "Polymer International",
-        "Macromolecular Rapid Communications"
-    ]
-    
-    for journal in wiley_journals:
-        print(f"Searching Wiley Journal: {journal}")
-        
-        url = f"https://api.crossref.org/works?filter=container-title:{urllib.parse.quote(journal)}&rows=12&sort=published&order=desc"
-        
-        try:
-            response = requests.get(url, timeout=30)
-            data = response.json()
-            
-            works = data.get('message', {}).get('items', [])
-            print(f"Found {len(works)} articles from {journal}")
-            
-            for item in works:
-                try:
-                    title = item.get('title', ['No title'])[0]
-                    abstract = item.get('abstract', 'No abstract available')
-                    
-                    published = item.get('created', {}).get('date-parts', [[None]])[0]
-                    year = published[0] if published and published[0] else datetime.now().year
-                    
-                    doi = item.get('DOI', '')
-                    
-                    authors = []
-                    for author in item.get('author', []):
-                        given = author.get('given', '')
-                        family = author.get('family', '')
-                        if given or family:
-                            authors.append(f"{given} {family}".strip())
-                    
-                    article_id = f"wiley_{doi}" if doi else f"wiley_{hash(title)}"
-                    
-                    article = {
-                        'id': article_id,
-                        'title': title,
-                        'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
-                        'full_abstract': abstract,
-                        'year': year,
-                        'journal': journal,
-                        'keywords': ['Wiley', 'polymer', 'applied science'],
-                        'citation_count': max(item.get('is-referenced-by-count', 1), 1),
-                        'doi': doi,
-                        'published': str(year),
-                        'search_keywords': [journal],
-                        'authors': authors,
-                        'source': 'Wiley',
-                        'url': ''
-                    }
-                    
-                    article['url'] = ensure_url(article)
-                    
-                    if not any(a['id'] == article['id'] for a in all_articles):
-                        all_articles.append(article)
-                        print(f"  - Added from {journal}: {article['title'][:50]}...")
-                        
-                except Exception as e:
-                    print(f"Error processing Wiley article: {e}")
-                    continue
-            
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error searching Wiley journal {journal}: {e}")
-            continue
-    
-    return all_articles
+def keyword_set(article):
+    """Нормализованное множество ключевых слов статьи (включая поисковые)"""
+    return set(kw.lower() for kw in article['keywords'] + article.get('search_keywords', []))
 
-def search_semantic_scholar_advanced(days_back=30):
-    """Расширенный поиск через Semantic Scholar"""
-    all_articles = []
-    
-    advanced_queries = [
-        "copolymer barrier properties mathematical model",
-        "polymer diffusion simulation machine learning",
-        "block copolymer self-assembly modeling",
-        "polymer nanocomposite mechanical properties",
-        "controlled radical polymerization kinetics"
-    ]
-    
-    for query in advanced_queries:
-        print(f"Searching Semantic Scholar for: {query}")
-        
-        url = f"https://api.semanticscholar.org/graph/v1/paper/search?query={urllib.parse.quote(query)}&limit=8&fields=title,abstract,url,year,venue,externalIds,citationCount,authors"
-        
-        try:
-            response = requests.get(url, timeout=30)
-            if response.status_code == 429:
-                print("Rate limit exceeded, waiting...")
-                time.sleep(60)
-                continue
-                
-            data = response.json()
-            papers = data.get('data', [])
-            print(f"Found {len(papers)} articles for '{query}'")
-            
-            for paper in papers:
-                try:
-                    title = paper.get('title', 'No title')
-                    abstract = paper.get('abstract', 'No abstract available')
-                    year = paper.get('year', datetime.now().year)
-                    venue = paper.get('venue', 'Unknown')
-                    citation_count = paper.get('citationCount', 0)
-                    
-                    authors = []
-                    for author in paper.get('authors', []):
-                        if author.get('name'):
-                            authors.append(author['name'])
-                    
-                    article_id = f"semantic_adv_{paper.get('paperId', hash(title))}"
-                    
-                    article = {
-                        'id': article_id,
-                        'title': title,
-                        'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
-                        'full_abstract': abstract,
-                        'year': year,
-                        'journal': venue,
-                        'keywords': [query],
-                        'citation_count': max(citation_count, 1),
-                        'doi': paper.get('externalIds', {}).get('DOI', ''),
-                        'published': str(year),
-                        'search_keywords': [query],
-                        'authors': authors,
-                        'source': 'Semantic Scholar',
-                        'url': paper.get('url', '')
-                    }
-                    
-                    article['url'] = ensure_url(article)
-                    
-                    if not any(a['id'] == article['id'] for a in all_articles):
-                        all_articles.append(article)
-                        print(f"  - Added: {article['title'][:50]}... (Citations: {citation_count})")
-                        
-                except Exception as e:
-                    print(f"Error processing Semantic Scholar paper: {e}")
-                    continue
-            
-            time.sleep(2)
-            
-        except Exception as e:
-            print(f"Error searching Semantic Scholar for {query}: {e}")
-            continue
-    
-    return all_articles
+def build_postings(term_sets):
+    """Инвертированный индекс: термин -> возрастающий список номеров статей"""
+    postings = {}
+    for i, terms in enumerate(term_sets):
+        for term in terms:
+            postings.setdefault(term, []).append(i)
+    return postings
 
-def search_pubmed_articles(days_back=30):
-    """Поиск статей в PubMed"""
-    all_articles = []
-    
-    search_queries = [
-        "copolymer AND barrier AND properties",
-        "block copolymer AND self-assembly",
-        "polymer AND nanocomposite AND modeling"
+def co_occurring(i, term_sets, postings):
+    """Номера статей j > i, у которых есть общий термин со статьей i (по термам из postings)"""
+    candidates = set()
+    for term in term_sets[i]:
+        posting = postings.get(term)
+        if posting:
+            candidates.update(posting[bisect.bisect_right(posting, i):])
+    return candidates
+
+def keyword_idf(document_frequency, total):
+    """IDF ключевого слова: близок к нулю для слов, общих почти для всех статей"""
+    return math.log((1 + total) / (1 + document_frequency))
+
+def is_dense_keyword(document_frequency, total, settings):
+    """Слишком частое слово не порождает пар само по себе (но учитывается в общих словах)"""
+    return settings['max_df'] < 1 and document_frequency > settings['max_df'] * total
+
+def keyword_link(source_id, target_id, common_keywords, idf, settings):
+    """Связь по общим ключевым словам или None, если она слабее порога"""
+    link = {
+        'source': source_id,
+        'target': target_id,
+        'strength': len(common_keywords),
+        'type': 'keywords',
+        'common_keywords': list(common_keywords)
+    }
+    if settings['weighting'] == 'idf':
+        link['weight'] = round(sum(idf(term) for term in common_keywords), 3)
+    if link_score(link) < settings['min_strength']:
+        return None
+    return link
+
+def link_score(link):
+    """Сила связи для порогов и отбора соседей: IDF-вес, если он есть"""
+    return link.get('weight', link['strength'])
+
+def select_keyword_links(links, min_strength=0, top_k=0):
+    """Оставляет связи по ключевым словам не слабее порога и входящие в top_k
+    сильнейших хотя бы у одного из концов; остальные типы связей не трогает"""
+    candidates = [
+        (k, link) for k, link in enumerate(links)
+        if link['type'] == 'keywords' and link_score(link) >= min_strength
     ]
-    
-    for query in search_queries:
-        print(f"Searching PubMed for: {query}")
-        
-        # Используем Crossref как fallback для PubMed-like статей
-        url = f"https://api.crossref.org/works?query={urllib.parse.quote(query)}&rows=8&sort=relevance&order=desc"
-        
-        try:
-            response = requests.get(url, timeout=30)
-            data = response.json()
-            
-            works = data.get('message', {}).get('items', [])
-            print(f"Found {len(works)} articles for '{query}'")
-            
-            for item in works:
-                try:
-                    title = item.get('title', ['No title'])[0]
-                    abstract = item.get('abstract', 'No abstract available')
-                    
-                    published = item.get('created', {}).get('date-parts', [[None]])[0]
-                    year = published[0] if published and published[0] else datetime.now().year
-                    
-                    doi = item.get('DOI', '')
-                    journal = item.get('container-title', ['PubMed-like Journal'])[0] if item.get('container-title') else 'PubMed-like Journal'
-                    
-                    authors = []
-                    for author in item.get('author', []):
-                        given = author.get('given', '')
-                        family = author.get('family', '')
-                        if given or family:
-                            authors.append(f"{given} {family}".strip())
-                    
-                    if not authors:
-                        authors = ['Authors not specified']
-                    
-                    article_id = f"pubmed_like_{doi}" if doi else f"pubmed_like_{hash(title)}"
-                    
-                    article = {
-                        'id': article_id,
-                        'title': title,
-                        'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
-                        'full_abstract': abstract,
-                        'year': year,
-                        'journal': journal,
-                        'keywords': query.split(' AND '),
-                        'citation_count': max(item.get('is-referenced-by-count', 1), 1),
-                        'doi': doi,
-                        'published': str(year),
-                        'search_keywords': [query],
-                        'authors': authors,
-                        'source': 'PubMed-like',
-                        'url': f"https://doi.org/{doi}" if doi else f"https://scholar.google.com/scholar?q={urllib.parse.quote(title)}"
-                    }
-                    
-                    all_articles.append(article)
-                    print(f"  - Added PubMed-like: {title[:50]}...")
-                    
-                except Exception as e:
-                    print(f"Error processing PubMed-like article: {e}")
-                    continue
-            
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Error searching PubMed-like for {query}: {e}")
-            continue
-    
-    return all_articles
+    keep = {k for k, _ in candidates}
+    if top_k:
+        neighbors = {}
+        for k, link in candidates:
+            neighbors.setdefault(link['source'], []).append(k)
+            neighbors.setdefault(link['target'], []).append(k)
+        keep = set()
+        for node_links in neighbors.values():
+            node_links.sort(key=lambda k: (-link_score(links[k]), k))
+            keep.update(node_links[:top_k])
+    return [link for k, link in enumerate(links) if link['type'] != 'keywords' or k in keep]
 
-def search_articles(start_date, end_date):
-    """Объединяет поиск из всех источников"""
-    all_articles = []
-    
-    print(f"Starting comprehensive article search from {start_date} to {end_date}...")
-    
-    print("1. Searching ACS Publications...")
-    acs_articles = search_acs_publications()
-    all_articles.extend(acs_articles)
-    
-    print("2. Searching RSC Publications...")
-    rsc_articles = search_rsc_publications()
-    all_articles.extend(rsc_articles)
-    
-    print("3. Searching Springer...")
-    springer_articles = search_springer_chemistry()
-    all_articles.extend(springer_articles)
-    
-    print("4. Searching Wiley...")
-    wiley_articles = search_wiley_polymers()
-    all_articles.extend(wiley_articles)
-    
-    print("5. Searching Semantic Scholar...")
-    semantic_articles = search_semantic_scholar_advanced()
-    all_articles.extend(semantic_articles)
-    
-    print("6. Searching PubMed-like sources...")
-    pubmed_articles = search_pubmed_articles()
-    all_articles.extend(pubmed_articles)
-    
-    # Удаляем дубликаты по ID
-    unique_articles = {}
-    for article in all_articles:
-        if article['id'] not in unique_articles:
-            unique_articles[article['id']] = article
-    
-    all_articles = list(unique_articles.values())
-    
-    print(f"Total unique articles found: {len(all_articles)}")
-    return all_articles
+def strongest_keyword_links(links, top_k):
+    """Связи одного узла: top_k сильнейших по ключевым словам и все связи других типов, в прежнем порядке"""
+    ranked = sorted(
+        (k for k, link in enumerate(links) if link['type'] == 'keywords'),
+        key=lambda k: (-link_score(links[k]), k)
+    )
+    dropped = set(ranked[top_k:])
+    return [link for k, link in enumerate(links) if k not in dropped]
 
-def build_citation_network(articles):
-    """Строит сеть цитирований и связей по авторам"""
-    nodes = []
-    links = []
-    
+def article_to_node(article):
+    """Преобразует статью в узел графа"""
+    article['url'] = ensure_url(article)
+    node = {
+        'id': article['id'],
+        'title': article['title'],
+        # Хранится одна очищенная аннотация; короткая получается из нее (abstracts.short)
+        'full_abstract': article.get('full_abstract') or article.get('abstract') or '',
+        'year': article['year'],
+        'journal': article['journal'],
+        'keywords': article['keywords'],
+        'citation_count': article['citation_count'],
+        'search_keywords': article.get('search_keywords', []),
+        'authors': article.get('authors', []),
+        'source': article.get('source', 'Unknown'),
+        'url': article['url']
+    }
+    # DOI и происхождение нужны для поиска дубликатов, ORCID - для указателя авторов
+    for field in ('doi', 'provenance', 'author_orcids'):
+        if article.get(field):
+            node[field] = article[field]
+    return node
+
+def record_graph_build(mode, graph, started):
+    """Длительность построения и число узлов и связей по типам в метриках"""
+    metrics.graph_build_seconds.observe(time.perf_counter() - started, mode=mode)
+    metrics.graph_build_nodes.set(len(graph['nodes']), mode=mode)
+    for link_type, count in Counter(link['type'] for link in graph['links']).items():
+        metrics.graph_build_links.set(count, mode=mode, type=link_type)
+    return graph
+
+def build_citation_network(articles, settings=None, vectors=None):
+    """Строит сеть цитирований и связей по авторам.
+
+    vectors - сохраненные векторы слов статей (storage.load_vectors()); векторы,
+    которых там нет, считаются заново и возвращаются в поле 'vectors' для записи.
+    """
+    started = time.perf_counter()
+    settings = settings or KEYWORD_LINK_SETTINGS
     # Создаем узлы
-    for article in articles:
-        article['url'] = ensure_url(article)
-        nodes.append({
-            'id': article['id'],
-            'title': article['title'],
-            'abstract': article['abstract'],
-            'full_abstract': article.get('full_abstract', article['abstract']),
-            'year': article['year'],
-            'journal': article['journal'],
-            'keywords': article['keywords'],
-            'citation_count': article['citation_count'],
-            'search_keywords': article.get('search_keywords', []),
-            'authors': article.get('authors', []),
-            'source': article.get('source', 'Unknown'),
-            'url': article['url']
-        })
-    
+    nodes = [article_to_node(article) for article in articles]
+    links = []
+
+    # Множества авторов и ключевых слов считаем один раз на статью,
+    # а кандидатов в пары берем из инвертированных индексов, а не перебором всех пар
+    author_sets = [author_set(article) for article in articles]
+    keyword_sets = [keyword_set(article) for article in articles]
+    author_postings = build_postings(author_sets)
+    keyword_postings = build_postings(keyword_sets)
+
+    total = len(articles)
+    idf = {term: keyword_idf(len(posting), total) for term, posting in keyword_postings.items()}.__getitem__
+    # Пары ищем только по достаточно редким словам
+    pair_postings = {
+        term: posting for term, posting in keyword_postings.items()
+        if not is_dense_keyword(len(posting), total, settings)
+    }
+
     # Создаем связи
     for i, article1 in enumerate(articles):
-        for j, article2 in enumerate(articles):
-            if i >= j:  # Избегаем дублирования
-                continue
-                
+        author_pairs = co_occurring(i, author_sets, author_postings)
+        keyword_pairs = co_occurring(i, keyword_sets, pair_postings)
+
+        # Сохраняем порядок пар (i, j) как при полном переборе
+        for j in sorted(author_pairs | keyword_pairs):
+            article2 = articles[j]
+
             # Связь по авторам
-            authors1 = set(author.lower().strip() for author in article1.get('authors', []))
-            authors2 = set(author.lower().strip() for author in article2.get('authors', []))
-            common_authors = authors1.intersection(authors2)
-            
+            # Авторы с одинаковым ключом, но разными ORCID - разные люди
+            common_authors = authorship.shared_authors(author_sets[i], author_sets[j]) if j in author_pairs else None
             if common_authors:
+                # Имена пишутся как в более поздней статье: так же их подписывает extend_citation_network
+                names = authorship.author_names(article2)
                 links.append({
                     'source': article1['id'],
                     'target': article2['id'],
                     'strength': len(common_authors) * 2,
                     'type': 'authors',
-                    'common_authors': list(common_authors)
+                    'common_authors': [names[key] for key in common_authors]
                 })
-            
+
             # Связь по ключевым словам
-            keywords1 = set(kw.lower() for kw in article1['keywords'] + article1.get('search_keywords', []))
-            keywords2 = set(kw.lower() for kw in article2['keywords'] + article2.get('search_keywords', []))
-            common_keywords = keywords1.intersection(keywords2)
-            
-            if common_keywords:
-                links.append({
-                    'source': article1['id'],
-                    'target': article2['id'],
-                    'strength': len(common_keywords),
-                    'type': 'keywords',
-                    'common_keywords': list(common_keywords)
+            if j in keyword_pairs:
+                common_keywords = keyword_sets[i].intersection(keyword_sets[j])
+                link = keyword_link(article1['id'], article2['id'], common_keywords, idf, settings)
+                if link:
+                    links.append(link)
+
+    if settings['top_k']:
+        links = select_keyword_links(links, top_k=settings['top_k'])
+
+    graph = {'nodes': nodes, 'links': links}
+    if similarity.SIMILARITY_LINKS:
+        # Связи по сходству аннотаций: одно разреженное матричное произведение на весь корпус
+        article_vectors, graph['vectors'] = similarity.vectors_for(articles, vectors)
+        links.extend(similarity.similar_links([article['id'] for article in articles], article_vectors))
+
+    return record_graph_build('full', graph, started)
+
+def extend_citation_network(new_articles, store, settings=None):
+    """Строит узлы новых статей и только те связи, которые их касаются.
+
+    store - хранилище с уже сохраненными статьями (модуль storage): find_coauthors,
+    find_common, keyword_frequencies, keyword_sets, count_articles. Стоимость зависит от числа
+    новых статей и их реальных пересечений, а не от размера графа.
+
+    Порог и top_k применяются к связям каждой новой статьи: она получает не больше
+    top_k связей по ключевым словам, поэтому их число растет не быстрее top_k на
+    статью - та же граница, что у полной перестройки. Сохраненные соседи не
+    пересматриваются: связь, которая вошла бы только в их top_k, не добавляется,
+    а их прежние связи не вытесняются новыми; точное разреживание по всему графу
+    дает полная перестройка.
+    """
+    started = time.perf_counter()
+    settings = settings or KEYWORD_LINK_SETTINGS
+    nodes = []
+    links = []
+    # Индекс по новым статьям текущей пачки: термин -> номера в пачке
+    batch_postings = {'authors': {}, 'keywords': {}}
+    batch_author_sets = []
+    batch_keyword_sets = []
+    stored_total = store.count_articles()
+
+    for k, article in enumerate(new_articles):
+        node = article_to_node(article)
+        authors = author_set(node)
+        names = authorship.author_names(node)
+        keywords = keyword_set(node)
+        total = stored_total + k + 1
+
+        # Частоты слов с учетом уже добавленных статей пачки и текущей
+        frequencies = store.keyword_frequencies(keywords)
+        for term in keywords:
+            frequencies[term] = frequencies.get(term, 0) + len(batch_postings['keywords'].get(term, [])) + 1
+        idf = lambda term: keyword_idf(frequencies.get(term, 1), total)
+        pair_terms = [term for term in keywords if not is_dense_keyword(frequencies[term], total, settings)]
+
+        # Кандидаты: сохраненные статьи идут раньше новых, внутри - по порядку добавления
+        common_authors = {}
+        for position, article_id, term, orcid in store.find_coauthors(authors):
+            if authorship.same_author(authors[term], orcid or ''):
+                common_authors.setdefault((0, position, article_id), []).append(term)
+        keyword_candidates = {
+            (0, position, article_id) for position, article_id, _ in store.find_common('keywords', pair_terms)
+        }
+        for term in authors:
+            for j in batch_postings['authors'].get(term, []):
+                if authorship.same_author(authors[term], batch_author_sets[j][term]):
+                    common_authors.setdefault((1, j, nodes[j]['id']), []).append(term)
+        for term in pair_terms:
+            for j in batch_postings['keywords'].get(term, []):
+                keyword_candidates.add((1, j, nodes[j]['id']))
+
+        stored_sets = store.keyword_sets([order[2] for order in keyword_candidates if order[0] == 0])
+        node_links = []
+        for order in sorted(set(common_authors) | keyword_candidates):
+            source_id = order[2]
+            if order in common_authors:
+                node_links.append({
+                    'source': source_id,
+                    'target': node['id'],
+                    'strength': len(common_authors[order]) * 2,
+                    'type': 'authors',
+                    'common_authors': [names[key] for key in sorted(common_authors[order])]
                 })
-    
-    return {'nodes': nodes, 'links': links}
+            if order in keyword_candidates:
+                other = stored_sets.get(source_id, set()) if order[0] == 0 else batch_keyword_sets[order[1]]
+                link = keyword_link(source_id, node['id'], keywords & other, idf, settings)
+                if link:
+                    node_links.append(link)
+
+        if settings['top_k']:
+            # select_keyword_links здесь ничего не отбросил бы: каждый сосед встречается
+            # в node_links один раз, и его единственная связь всегда в его top_k
+            node_links = strongest_keyword_links(node_links, settings['top_k'])
+        links.extend(node_links)
+
+        for kind, terms in (('authors', authors), ('keywords', keywords)):
+            for term in terms:
+                batch_postings[kind].setdefault(term, []).append(k)
+        batch_author_sets.append(authors)
+        batch_keyword_sets.append(keywords)
+        nodes.append(node)
+
+    graph = {'nodes': nodes, 'links': links}
+    if similarity.SIMILARITY_LINKS:
+        similar, graph['vectors'] = extend_similar_links(nodes, store)
+        links.extend(similar)
+
+    return record_graph_build('incremental', graph, started)
+
+def extend_similar_links(new_nodes, store):
+    """Связи 'similar' новых статей с сохраненными и с предыдущими новыми.
+
+    Векторы сохраненных статей берутся из кэша в базе; заново векторизуются только
+    новые статьи и сохраненные до появления кэша. Возвращает (связи, новые векторы).
+    """
+    cached = store.load_vectors()
+    new_ids = [node['id'] for node in new_nodes]
+    stored_ids = sorted(store.article_ids() - set(new_ids))
+    missing = [node_id for node_id in stored_ids if node_id not in cached]
+    _, computed = similarity.vectors_for(store.load_nodes(missing)) if missing else ([], {})
+    stored_ids = [node_id for node_id in stored_ids if node_id in cached or node_id in computed]
+    stored_vectors = [(cached.get(node_id) or computed[node_id])[1:] for node_id in stored_ids]
+    new_vectors, new_computed = similarity.vectors_for(new_nodes, cached)
+    computed.update(new_computed)
+    links = similarity.similar_links(stored_ids + new_ids, stored_vectors + new_vectors, start=len(stored_ids))
+    return links, computed
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Этапы ответа в Server-Timing: для всех запросов (SERVER_TIMING=1) или по заголовку клиента
+    g.server_timing = metrics.SERVER_TIMING or request.headers.get('X-Server-Timing') == '1'
+    if g.server_timing:
+        metrics.start_timings()
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get('request_started', time.perf_counter())
+    metrics.api_request_seconds.observe(elapsed, endpoint=request.endpoint or 'unmatched', status=response.status_code)
+    timings = metrics.finish_timings()
+    if g.get('server_timing'):
+        response.headers['Server-Timing'] = metrics.server_timing(timings, elapsed)
+    return response
+
+@app.route('/metrics')
+def get_metrics():
+    """Метрики процесса в текстовом формате Prometheus"""
+    return app.response_class(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return render_template('index.html', topics=load_topics())
+
+def parse_year(date_string):
+    """Год из даты вида YYYY-MM-DD, None если дата не задана или некорректна"""
+    if not date_string:
+        return None
+    try:
+        return datetime.strptime(date_string, '%Y-%m-%d').year
+    except ValueError:
+        return None
+
+def load_graph_index():
+    """Загружает граф вместе с индексами по годам, темам и смежности.
+
+    Со снимками (snapshot.GRAPH_SNAPSHOTS) индекс новой версии строит один процесс,
+    остальные рабочие процессы загружают его готовым.
+    """
+    with metrics.stage('load'):
+        version = storage.graph_version()
+        if snapshot.GRAPH_SNAPSHOTS:
+            return snapshot.load_or_build(version, lambda: build_graph_index(version))
+        return build_graph_index(version)
+
+def build_graph_index(version):
+    """Индекс графа из базы; version - версия, прочитанная до графа"""
+    with metrics.stage('build'):
+        # Аннотации в памяти не держатся: они отдаются по одной (/api/articles/<id>)
+        graph = load_articles(with_abstracts=False)
+        communities = None
+        if analytics.ANALYTICS:
+            result = graph_analytics(graph, version)
+            for node in graph['nodes']:
+                node.update(result['nodes'].get(node['id'], {}))
+            communities = result['communities']
+        return GraphIndex(graph, storage.topic_members(), storage.load_layout(), communities)
+
+def graph_analytics(graph, version):
+    """Аналитика графа версии version: сохраненная или, если граф с тех пор менялся, посчитанная заново"""
+    if storage.analytics_version() == version:
+        return storage.load_analytics()
+    logger.info("Computing analytics for %d nodes...", len(graph['nodes']))
+    with metrics.graph_analytics_seconds.time():
+        result = analytics.analyze(graph)
+    storage.save_analytics(result, version)
+    return result
+
+def update_analytics():
+    """Пересчитывает аналитику текущей версии графа"""
+    # Версия читается до графа: если граф успеет измениться, аналитика будет пересчитана при чтении
+    version = storage.graph_version()
+    graph_analytics(load_articles(with_abstracts=False), version)
+
+def update_layout():
+    """Пересчитывает раскладку всего графа, начиная с сохраненных позиций"""
+    graph = load_articles(with_abstracts=False)
+    node_ids = [node['id'] for node in graph['nodes']]
+    logger.info("Computing layout for %d nodes...", len(node_ids))
+    storage.save_layout(force_layout(node_ids, graph['links'], initial=storage.load_layout()))
+
+def attach_layout(result, graph_index):
+    """Добавляет узлам координаты раскладки; подграф доводится от общей раскладки"""
+    node_ids = [node['id'] for node in result['nodes']]
+    if len(node_ids) == len(graph_index):
+        positions = graph_index.layout
+    else:
+        initial = {node_id: graph_index.layout[node_id] for node_id in node_ids if node_id in graph_index.layout}
+        positions = force_layout(node_ids, result['links'], initial=initial, iterations=LAYOUT_REFINE_ITERATIONS)
+    # Узлы из кэша графа не меняем, а копируем
+    result['nodes'] = [
+        dict(node, layout={'x': positions[node['id']][0], 'y': positions[node['id']][1]})
+        if node['id'] in positions else node
+        for node in result['nodes']
+    ]
+    return result
+
+# Поля статьи и связи в облегченном графе (view=summary); остальное - /api/articles/<id>
+SUMMARY_NODE_FIELDS = ('id', 'year', 'source', 'citation_count', 'layout')
+SUMMARY_LINK_FIELDS = ('source', 'target', 'type', 'strength', 'count')
+SUMMARY_TITLE_LENGTH = 80
+# Сколько секунд браузер использует ответ /api/articles/<id>, не перепроверяя его
+ARTICLE_MAX_AGE = int(os.environ.get('ARTICLE_MAX_AGE', 300))
+
+def summarize(result):
+    """Облегченный граф: у статей короткий заголовок, первый автор, год, источник,
+    цитирования и раскладка, у связей - концы, тип и сила. Узлы сообществ не меняются"""
+    nodes = []
+    for node in result['nodes']:
+        if node.get('type') == 'community':
+            nodes.append(node)
+            continue
+        summary = {field: node[field] for field in SUMMARY_NODE_FIELDS if field in node}
+        title = node.get('title') or ''
+        summary['title'] = title[:SUMMARY_TITLE_LENGTH] + '...' if len(title) > SUMMARY_TITLE_LENGTH else title
+        if node.get('authors'):
+            summary['first_author'] = node['authors'][0]
+        nodes.append(summary)
+    links = [{field: link[field] for field in SUMMARY_LINK_FIELDS if field in link} for link in result['links']]
+    return dict(result, nodes=nodes, links=links)
+
+def attach_abstracts(result):
+    """Добавляет узлам из графа в памяти (он хранится без аннотаций) их текст из базы"""
+    texts = storage.load_abstracts([node['id'] for node in result['nodes']])
+    result['nodes'] = [
+        dict(node, full_abstract=texts[node['id']]) if node['id'] in texts else node
+        for node in result['nodes']
+    ]
+    return result
+
+def parse_view():
+    """'summary' - облегченный граф (см. summarize), иначе 'full' - все поля статей"""
+    return 'summary' if request.args.get('view') == 'summary' else 'full'
+
+# Разобранный граф и готовые ответы по фильтрам; сбрасываются при записи новой версии графа
+graph_cache = GraphCache(load_graph_index, storage.graph_version)
 
 @app.route('/api/articles')
 def get_articles():
     """API endpoint для получения статей с фильтрами"""
     topic = request.args.get('topic', 'all')
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    articles_data = load_articles()
-    nodes = articles_data.get('nodes', [])
-    links = articles_data.get('links', [])
-    
-    print(f"Loaded {len(nodes)} nodes, {len(links)} links")
-    
-    if topic != 'all':
-        topic_map = {
-            'copolymer': ['copolymer', 'polymer', 'blend', 'macromolecule'],
-            'barrier': ['barrier', 'permeability', 'gas', 'diffusion'], 
-            'model': ['model', 'learning', 'neural', 'simulation', 'mathematical']
-        }
-        if topic in topic_map:
-            search_terms = topic_map[topic]
-            filtered_nodes = []
-            for node in nodes:
-                node_text = ' '.join([
-                    ' '.join(node.get('search_keywords', [])),
-                    ' '.join(node.get('keywords', [])),
-                    node.get('title', ''),
-                    node.get('abstract', '')
-                ]).lower()
-                
-                if any(term in node_text for term in search_terms):
-                    filtered_nodes.append(node)
-            nodes = filtered_nodes
-    
-    if start_date:
-        try:
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-            nodes = [node for node in nodes if node['year'] >= start_date_obj.year]
-        except ValueError:
-            pass
-    
-    if end_date:
-        try:
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-            nodes = [node for node in nodes if node['year'] <= end_date_obj.year]
-        except ValueError:
-            pass
-    
-    node_ids = {node['id'] for node in nodes}
-    filtered_links = [
-        link for link in links 
-        if link['source'] in node_ids and link['target'] in node_ids
+    start_year = parse_year(request.args.get('start_date'))
+    end_year = parse_year(request.args.get('end_date'))
+    # Дополнительное разреживание связей по ключевым словам для этого ответа
+    min_strength = request.args.get('min_strength', 0, type=float)
+    top_k = request.args.get('top_k', 0, type=int)
+    # Координаты серверной раскладки для мгновенной отрисовки на клиенте
+    with_layout = SERVER_LAYOUT and request.args.get('layout', '1') != '0'
+    # 'json' - прежний формат со списками объектов, 'compact' - столбцы (см. wire.compact_graph)
+    wire_format = 'compact' if request.args.get('format') == 'compact' else 'json'
+    # Сообщества из аналитики графа сворачиваются в узлы (см. analytics.collapse_communities)
+    collapse = analytics.ANALYTICS and request.args.get('collapse') in ('1', 'true', 'communities')
+    min_size = max(request.args.get('min_community_size', analytics.COLLAPSE_MIN_SIZE, type=int), 2)
+    view = parse_view()
+    encoding = wire.accepted_encoding(request.headers.get('Accept-Encoding'))
+    key = (topic, start_year, end_year, min_strength, top_k, with_layout, wire_format, collapse and min_size, view)
+    
+    # Метка темы только из topics.json, чтобы произвольные значения не плодили серии метрик
+    topic_label = topic if topic == 'all' or topic in load_topics() else 'other'
+    
+    etag = graph_etag(key, encoding)
+    if request.if_none_match.contains(etag):
+        metrics.articles_request_seconds.observe(time.perf_counter() - g.request_started,
+                                                 topic=topic_label, format=wire_format, cache='not_modified')
+        return not_modified(etag)
+    
+    rendered = []
+    def render(graph_index):
+        rendered.append(True)
+        logger.debug("Filtering %d nodes: topic=%s, years %s-%s", len(graph_index), topic, start_year, end_year)
+        with metrics.stage('filter'):
+            result = graph_index.filter(topic, start_year, end_year)
+            if min_strength or top_k:
+                result['links'] = select_keyword_links(result['links'], min_strength, top_k)
+        if with_layout:
+            with metrics.stage('layout'):
+                result = attach_layout(result, graph_index)
+        if collapse:
+            with metrics.stage('collapse'):
+                result = analytics.collapse_communities(result, graph_index.communities, min_size)
+        if view == 'summary':
+            result = summarize(result)
+        else:
+            with metrics.stage('abstracts'):
+                result = attach_abstracts(result)
+        with metrics.stage('serialize'):
+            if wire_format == 'compact':
+                result = wire.compact_graph(result)
+            return (app.json.dumps(result) + '\n').encode('utf-8')
+    
+    # Повторные запросы с тем же фильтром отдают уже сериализованный и сжатый ответ
+    body = graph_cache.cached(key, render)
+    with metrics.stage('compress'):
+        body, used_encoding = graph_cache.cached(key + (encoding,), lambda graph_index: wire.compress(body, encoding))
+    metrics.articles_request_seconds.observe(time.perf_counter() - g.request_started,
+                                             topic=topic_label, format=wire_format, cache='miss' if rendered else 'hit')
+    return json_response(body, used_encoding, etag)
+
+@app.route('/api/articles/<path:article_id>')
+def get_article(article_id):
+    """Все поля одной статьи: аннотация, авторы, ключевые слова, метрики аналитики.
+
+    ETag - хэш содержимого, поэтому запись других статей его не меняет; браузер
+    использует ответ ARTICLE_MAX_AGE секунд, затем перепроверяет.
+    """
+    nodes = storage.load_nodes([article_id])
+    if not nodes:
+        return jsonify({'status': 'error', 'message': 'Article not found'}), 404
+    article = nodes[0]
+    article['abstract'] = abstracts.short(article.get('full_abstract'))
+    if analytics.ANALYTICS:
+        graph_index = graph_cache.graph()
+        position = graph_index.position.get(article_id)
+        if position is not None:
+            indexed = graph_index.nodes[position]
+            article.update({field: indexed[field] for field in storage.ANALYTICS_FIELDS if field in indexed})
+    
+    encoding = wire.accepted_encoding(request.headers.get('Accept-Encoding'))
+    body = (app.json.dumps(article) + '\n').encode('utf-8')
+    etag = f"{hashlib.sha1(body).hexdigest()[:16]}-{encoding or 'identity'}"
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        body, used_encoding = wire.compress(body, encoding)
+        response = app.response_class(body, mimetype='application/json')
+        if used_encoding:
+            response.headers['Content-Encoding'] = used_encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={ARTICLE_MAX_AGE}'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def graph_etag(key, encoding):
+    """ETag ответа по ключу запроса; версия графа меняется при каждой записи,
+    так что ETag верен, пока граф тот же"""
+    return f"{storage.graph_version()}-{hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]}-{encoding or 'identity'}"
+
+def conditional_response(response, etag):
+    """ETag и заголовки, с которыми браузер перепроверяет ответ вместо повторной загрузки"""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response
+
+def not_modified(etag):
+    return conditional_response(app.response_class(status=304), etag)
+
+def json_response(body, encoding, etag):
+    """Ответ с уже сериализованным (и, возможно, сжатым encoding) телом"""
+    response = app.response_class(body, mimetype='application/json')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return conditional_response(response, etag)
+
+def send_graph(result, wire_format, encoding, etag, **extra):
+    """Сериализует и сжимает подграф в запрошенном формате; extra - поля ответа помимо узлов и связей"""
+    payload = wire.compact_graph(result) if wire_format == 'compact' else {'nodes': result['nodes'], 'links': result['links']}
+    payload.update(extra)
+    body, used_encoding = wire.compress((app.json.dumps(payload) + '\n').encode('utf-8'), encoding)
+    return json_response(body, used_encoding, etag)
+
+def attach_stored_layout(nodes):
+    """Координаты общей раскладки для узлов подграфа (без пересчета)"""
+    positions = storage.load_layout([node['id'] for node in nodes])
+    for node in nodes:
+        if node['id'] in positions:
+            x, y = positions[node['id']]
+            node['layout'] = {'x': x, 'y': y}
+    return nodes
+
+@app.route('/api/neighborhood')
+def get_neighborhood():
+    """Окрестность статьи (?id=) или автора (?author=) в depth шагов, не больше limit узлов.
+
+    Граф читается по индексу смежности в базе, без загрузки целиком.
+    """
+    article_id = request.args.get('id')
+    author = request.args.get('author')
+    if not article_id and not author:
+        return jsonify({'status': 'error', 'message': 'Parameter id or author is required'}), 400
+    depth = min(max(request.args.get('depth', 1, type=int), 1), neighborhood.MAX_NEIGHBORHOOD_DEPTH)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), neighborhood.MAX_NEIGHBORHOOD_NODES)
+    order = request.args.get('order', 'strength')
+    if order not in neighborhood.ORDERS:
+        order = 'strength'
+    types = tuple(link_type for link_type in request.args.get('types', '').split(',') if link_type)
+    with_layout = SERVER_LAYOUT and request.args.get('layout', '1') != '0'
+    wire_format = 'compact' if request.args.get('format') == 'compact' else 'json'
+    encoding = wire.accepted_encoding(request.headers.get('Accept-Encoding'))
+    
+    view = parse_view()
+    etag = graph_etag(('neighborhood', article_id, author, depth, limit, order, types, with_layout, wire_format,
+                       view), encoding)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    seeds = [article_id] if article_id else storage.articles_by_author(author, neighborhood.MAX_NEIGHBORHOOD_NODES)
+    result = neighborhood.ego_network(storage, seeds, depth, limit, order, types)
+    if not result['nodes']:
+        return jsonify({'status': 'error', 'message': 'Article not found' if article_id else 'Author not found'}), 404
+    if with_layout:
+        attach_stored_layout(result['nodes'])
+    if view == 'summary':
+        result = summarize(result)
+    return send_graph(result, wire_format, encoding, etag, seeds=result['seeds'], truncated=result['truncated'])
+
+# Ограничение размера страницы /api/nodes
+MAX_PAGE_SIZE = 500
+
+@app.route('/api/nodes')
+def list_nodes():
+    """Постраничный список статей с фильтрами по теме и датам, без связей"""
+    topic = request.args.get('topic', 'all')
+    start_year = parse_year(request.args.get('start_date'))
+    end_year = parse_year(request.args.get('end_date'))
+    order = request.args.get('sort', 'position')
+    if order not in storage.LIST_ORDERS:
+        order = 'position'
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PAGE_SIZE)
+    encoding = wire.accepted_encoding(request.headers.get('Accept-Encoding'))
+    
+    etag = graph_etag(('nodes', topic, start_year, end_year, order, page, per_page), encoding)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    # Неизвестная тема, как и в /api/articles, не фильтрует
+    total, nodes = storage.list_articles(topic if topic in load_topics() else None, start_year, end_year,
+                                         order, (page - 1) * per_page, per_page)
+    body, used_encoding = wire.compress((app.json.dumps({
+        'nodes': nodes,
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': math.ceil(total / per_page)
+    }) + '\n').encode('utf-8'), encoding)
+    return json_response(body, used_encoding, etag)
+
+# Поля статьи в результатах /api/search без подграфа
+SEARCH_RESULT_FIELDS = ('year', 'journal', 'authors', 'citation_count', 'url')
+
+@app.route('/api/search')
+def search_articles_api():
+    """Полнотекстовый поиск статей (?q=) с ранжированием BM25 и выделением совпадений.
+
+    graph=1 возвращает найденные статьи страницы как подграф: узлы и связи между ними.
+    """
+    query = request.args.get('q', '').strip()
+    expression = search.match_expression(query, prefix=request.args.get('prefix', '1') != '0')
+    if not expression:
+        return jsonify({'status': 'error', 'message': 'Parameter q is required'}), 400
+    topic = request.args.get('topic', 'all')
+    start_year = parse_year(request.args.get('start_date'))
+    end_year = parse_year(request.args.get('end_date'))
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 20, type=int), 1), MAX_PAGE_SIZE)
+    as_graph = request.args.get('graph', '0') in ('1', 'true')
+    with_layout = SERVER_LAYOUT and request.args.get('layout', '1') != '0'
+    wire_format = 'compact' if request.args.get('format') == 'compact' else 'json'
+    view = parse_view()
+    encoding = wire.accepted_encoding(request.headers.get('Accept-Encoding'))
+    
+    etag = graph_etag(('search', expression, topic, start_year, end_year, page, per_page, as_graph, with_layout,
+                       wire_format, view), encoding)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    # Неизвестная тема, как и в /api/articles, не фильтрует
+    with metrics.stage('search'):
+        total, rows = storage.search_articles(expression, topic if topic in load_topics() else None,
+                                              start_year, end_year, (page - 1) * per_page, per_page)
+    results = [
+        {'id': article_id, 'score': round(score, 4), 'title': search.highlighted(title),
+         'snippet': search.highlighted(snippet)}
+        for article_id, score, title, snippet in rows
     ]
-    
-    return jsonify({'nodes': nodes, 'links': filtered_links})
+    with metrics.stage('load'):
+        nodes = storage.load_nodes([result['id'] for result in results])
+    extra = {'query': query, 'total': total, 'page': page, 'per_page': per_page,
+             'pages': math.ceil(total / per_page), 'results': results}
+    if as_graph:
+        with metrics.stage('graph'):
+            subgraph = {'nodes': nodes, 'links': storage.links_among([node['id'] for node in nodes])}
+            if with_layout:
+                attach_stored_layout(subgraph['nodes'])
+            if view == 'summary':
+                subgraph = summarize(subgraph)
+        return send_graph(subgraph, wire_format, encoding, etag, **extra)
+    
+    by_id = {node['id']: node for node in nodes}
+    for result in results:
+        node = by_id.get(result['id'], {})
+        result.update({field: node.get(field) for field in SEARCH_RESULT_FIELDS})
+    body, used_encoding = wire.compress((app.json.dumps(extra) + '\n').encode('utf-8'), encoding)
+    return json_response(body, used_encoding, etag)
+
+@app.route('/api/analytics')
+def get_analytics():
+    """Сообщества графа (по убыванию размера, постранично) и самые центральные статьи по метрикам"""
+    if not analytics.ANALYTICS:
+        return jsonify({'status': 'error', 'message': 'Graph analytics is disabled'}), 404
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 50, type=int), 1), MAX_PAGE_SIZE)
+    limit = min(max(request.args.get('limit', 10, type=int), 0), MAX_PAGE_SIZE)
+    encoding = wire.accepted_encoding(request.headers.get('Accept-Encoding'))
+    
+    etag = graph_etag(('analytics', page, per_page, limit), encoding)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    # Загрузка графа пересчитывает аналитику, если граф изменился
+    graph_cache.graph()
+    total = storage.count_communities()
+    body, used_encoding = wire.compress((app.json.dumps({
+        'graph_version': storage.analytics_version(),
+        'communities': storage.load_communities((page - 1) * per_page, per_page),
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': math.ceil(total / per_page),
+        'top': {metric: storage.top_articles(metric, limit) for metric in storage.ANALYTICS_ORDERS}
+    }) + '\n').encode('utf-8'), encoding)
+    return json_response(body, used_encoding, etag)
+
+@app.route('/api/communities/<int:community_id>')
+def get_community(community_id):
+    """Статьи сообщества и связи между ними: развернутый узел свернутого графа"""
+    if not analytics.ANALYTICS:
+        return jsonify({'status': 'error', 'message': 'Graph analytics is disabled'}), 404
+    with_layout = SERVER_LAYOUT and request.args.get('layout', '1') != '0'
+    wire_format = 'compact' if request.args.get('format') == 'compact' else 'json'
+    view = parse_view()
+    encoding = wire.accepted_encoding(request.headers.get('Accept-Encoding'))
+    
+    etag = graph_etag(('community', community_id, with_layout, wire_format, view), encoding)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    graph_index = graph_cache.graph()
+    info = graph_index.communities.get(community_id)
+    if info is None:
+        return jsonify({'status': 'error', 'message': 'Community not found'}), 404
+    result = graph_index.community(community_id)
+    if with_layout:
+        result = attach_layout(result, graph_index)
+    result = summarize(result) if view == 'summary' else attach_abstracts(result)
+    return send_graph(result, wire_format, encoding, etag, community=info)
+
+@app.route('/api/authors/graph')
+def get_author_graph():
+    """Граф соавторства по указателю авторов: узлы - авторы, вес связи - число совместных статей.
+
+    Фильтры статей те же, что у /api/articles; min_articles - минимум статей автора,
+    min_weight - минимум совместных статей, limit - сколько самых продуктивных авторов (0 - все).
+    """
+    topic = request.args.get('topic', 'all')
+    start_year = parse_year(request.args.get('start_date'))
+    end_year = parse_year(request.args.get('end_date'))
+    min_articles = max(request.args.get('min_articles', 1, type=int), 1)
+    min_weight = max(request.args.get('min_weight', 1, type=int), 1)
+    limit = max(request.args.get('limit', authorship.AUTHOR_GRAPH_LIMIT, type=int), 0)
+    wire_format = 'compact' if request.args.get('format') == 'compact' else 'json'
+    encoding = wire.accepted_encoding(request.headers.get('Accept-Encoding'))
+    key = ('authors', topic, start_year, end_year, min_articles, min_weight, limit, wire_format)
+    
+    etag = graph_etag(key, encoding)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+    
+    def render(graph_index):
+        with metrics.stage('filter'):
+            nodes = [graph_index.nodes[k] for k in graph_index.select(topic, start_year, end_year)]
+        with metrics.stage('authors'):
+            records = storage.author_records(None if len(nodes) == len(graph_index) else [node['id'] for node in nodes])
+            citations = {node['id']: node.get('citation_count') or 0 for node in nodes}
+            result = authorship.coauthor_graph(records, citations, min_articles, min_weight, limit or None)
+        with metrics.stage('serialize'):
+            if wire_format == 'compact':
+                result = wire.compact_graph(result)
+            return (app.json.dumps(result) + '\n').encode('utf-8')
+    
+    body = graph_cache.cached(key, render)
+    with metrics.stage('compress'):
+        body, used_encoding = graph_cache.cached(key + (encoding,), lambda graph_index: wire.compress(body, encoding))
+    return json_response(body, used_encoding, etag)
+
+def run_update(start_date, end_date, rebuild=False, full=False):
+    """Собирает новые статьи и добавляет их в граф; выполняется фоновой задачей.
+
+    full=True собирает весь диапазон заново, не глядя на водяные знаки.
+    Обновления всех процессов сервера выполняются по очереди.
+    """
+    jobs.set_stage('waiting')
+    with locking.exclusive('update', wait=jobs.sleep):
+        return _run_update(start_date, end_date, rebuild, full)
+
+def _run_update(start_date, end_date, rebuild, full):
+    logger.info("Starting articles update from %s to %s...", start_date, end_date)
+    
+    jobs.set_stage('harvest')
+    watermarks = harvest.WatermarkBatch(use_watermarks=not full)
+    with harvest.collecting(watermarks):
+        resolver = identity.Resolver(storage)
+        actually_new = list(search_articles(start_date, end_date, resolver))
+    
+    if citations.CITATIONS:
+        # Сеть (списки литературы) опрашивается до записи графа
+        jobs.set_stage('citations')
+        cited_ids = citations.resolve_references(actually_new)
+    
+    # Дальше граф меняется; отмена после записи оставила бы раскладку устаревшей
+    jobs.raise_if_cancelled()
+    jobs.set_stage('linking')
+    if rebuild:
+        # Полная перестройка всех связей
+        storage.add_provenance(resolver.merged)
+        # Перестройка заодно сливает дубликаты, сохраненные до появления канонической идентичности
+        nodes = identity.deduplicate(load_articles()['nodes'] + actually_new)
+        graph_data = build_citation_network(nodes, vectors=storage.load_vectors())
+        save_articles(graph_data)
+        # Перестройка удаляет все связи; связи цитирования восстанавливаются из кэша списков литературы
+        cited_ids = storage.article_ids()
+    else:
+        # Добавляем новые узлы и связи, касающиеся их, порциями: следующая порция
+        # связывается с уже записанными через индексы базы
+        for batch in sources.batched(actually_new):
+            storage.add_graph(extend_citation_network(batch, storage))
+        storage.add_provenance(resolver.merged)
+    if citations.CITATIONS:
+        storage.add_citation_links(cited_ids)
+    # Водяные знаки сдвигаются только после записи статей: при сбое диапазон соберется снова
+    watermarks.save()
+    if SERVER_LAYOUT and (actually_new or rebuild):
+        jobs.set_stage('layout')
+        update_layout()
+    if analytics.ANALYTICS and (actually_new or rebuild):
+        jobs.set_stage('analytics')
+        update_analytics()
+    jobs.set_stage('done')
+    total_articles = storage.count_articles()
+    
+    source_names = list(set(a["source"] for a in actually_new))
+    
+    return {
+        'status': 'success', 
+        'message': f'Added {len(actually_new)} new articles from {start_date} to {end_date}',
+        'total_articles': total_articles,
+        'sources': source_names
+    }
+
+# Обновления статей выполняются в фоне; одновременно идет не больше одного сбора.
+# Состояние задач хранится в базе: его видят и отменяют все рабочие процессы
+job_runner = JobRunner(store=storage)
 
 @app.route('/api/update-articles')
 def update_articles():
-    """Ручное обновление статей"""
+    """Ручное обновление статей: запускает фоновую задачу и сразу возвращает ее ID"""
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
@@ -703,37 +924,47 @@ def update_articles():
         if not start_date or not end_date:
             return jsonify({'status': 'error', 'message': 'Start date and end date are required'})
         
-        print(f"Starting articles update from {start_date} to {end_date}...")
-        
-        new_articles = search_articles(start_date, end_date)
-        existing_data = load_articles()
-        existing_articles = existing_data.get('nodes', [])
-        
-        all_articles = existing_articles.copy()
-        existing_ids = {article['id'] for article in existing_articles}
-        
-        actually_new = []
-        for new_article in new_articles:
-            if new_article['id'] not in existing_ids:
-                all_articles.append(new_article)
-                actually_new.append(new_article)
+        rebuild = request.args.get('rebuild', 'false').lower() in ('1', 'true', 'yes')
+        full = request.args.get('full', 'false').lower() in ('1', 'true', 'yes')
+        params = {'start_date': start_date, 'end_date': end_date, 'rebuild': rebuild, 'full': full}
         
-        graph_data = build_citation_network(all_articles)
-        save_articles(graph_data)
-        
-        sources = list(set(a["source"] for a in actually_new))
+        # Синхронный режим для скриптов, которым нужен результат в ответе
+        if request.args.get('sync', 'false').lower() in ('1', 'true', 'yes'):
+            return jsonify(run_update(**params))
         
+        job, created = job_runner.submit('update-articles', 'update-articles', params, run_update)
         return jsonify({
-            'status': 'success', 
-            'message': f'Added {len(actually_new)} new articles from {start_date} to {end_date}',
-            'total_articles': len(all_articles),
-            'sources': sources
-        })
+            'status': 'accepted' if created else 'running',
+            'message': 'Update started' if created else 'Update is already running',
+            'job_id': job['id'],
+            'job': job
+        }), 202
         
     except Exception as e:
-        print(f"Error in update_articles: {e}")
+        logger.exception("Error in update_articles: %s", e)
         return jsonify({'status': 'error', 'message': str(e)})
 
+@app.route('/api/jobs')
+def list_jobs():
+    """Список последних фоновых задач"""
+    return jsonify({'jobs': job_runner.snapshots()})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Состояние и прогресс фоновой задачи"""
+    job = job_runner.snapshot(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Отмена фоновой задачи"""
+    job = job_runner.cancel(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Job not found'}), 404
+    return jsonify(job)
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
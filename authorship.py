@@ -0,0 +1,173 @@
+"""Авторы как сущности: ключ имени по инициалу и фамилии, ORCID и граф соавторства.
+
+Ключ имени совпадает у "J. Smith", "John Smith" и "Smith, John". ORCID (его дает
+Crossref) различает людей с одинаковым ключом: записи с разными ORCID - разные
+авторы, а запись без ORCID относится к автору с ORCID, только если он с таким
+ключом один.
+"""
+import os
+import re
+import unicodedata
+from collections import Counter
+
+# Частицы, которые входят в фамилию: "van der Waals", "de Gennes"
+FAMILY_PARTICLES = frozenset('van von der den de del della da di du dos das le la ter ten'.split())
+NAME_SUFFIXES = frozenset('jr sr ii iii iv'.split())
+# Заглушки вместо авторов (missing_authors в sources.json) не связывают статьи между собой
+PLACEHOLDER_AUTHORS = frozenset({'authors not specified', 'anonymous', 'unknown'})
+# Сколько самых продуктивных авторов отдает /api/authors/graph по умолчанию
+AUTHOR_GRAPH_LIMIT = int(os.environ.get('AUTHOR_GRAPH_LIMIT', 500))
+# Меняется вместе с name_key: указатель авторов в базе тогда перестраивается
+AUTHORS_VERSION = '1'
+
+_ORCID = re.compile(r'(\d{4}-\d{4}-\d{4}-\d{3}[\dX])', re.IGNORECASE)
+_WORD = re.compile(r"[^\W_]+(?:[-'][^\W_]+)*")
+
+
+def normalize_orcid(value):
+    """ORCID без адреса orcid.org, с X в верхнем регистре; '' если его нет"""
+    match = _ORCID.search(value or '')
+    return match.group(1).upper() if match else ''
+
+
+def _fold(text):
+    """Нижний регистр без диакритики и апострофов"""
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return text.lower().replace("'", '').replace('’', '')
+
+
+def name_key(name):
+    """Ключ имени автора: 'фамилия инициал' ("John A. Smith" -> 'smith j'); '' для пустого имени и заглушки"""
+    name = (name or '').strip()
+    if _fold(name) in PLACEHOLDER_AUTHORS:
+        return ''
+    if ',' in name:
+        family, _, given = name.partition(',')
+        given_words, family_words = _WORD.findall(_fold(given)), _WORD.findall(_fold(family))
+    else:
+        words = _WORD.findall(_fold(name))
+        raw = _WORD.findall(name)
+        while words and words[-1] in NAME_SUFFIXES:
+            words.pop()
+            raw.pop()
+        if len(words) >= 2 and len(raw[-1]) <= 2 and raw[-1].isupper() and len(raw[0]) > 2:
+            # "Smith JA": инициалы после фамилии
+            given_words, family_words = words[-1:], words[:-1]
+        else:
+            # Фамилия - последнее слово вместе с предшествующими частицами
+            start = len(words) - 1
+            while start > 1 and words[start - 1] in FAMILY_PARTICLES:
+                start -= 1
+            given_words, family_words = words[:start], words[start:]
+    given_words = [word for word in given_words if word not in NAME_SUFFIXES]
+    family = ' '.join(family_words)
+    if not family:
+        return ' '.join(given_words)
+    return f"{family} {given_words[0][0]}" if given_words else family
+
+
+def author_keys(article):
+    """{ключ имени: ORCID или ''} для авторов статьи"""
+    orcids = article.get('author_orcids') or {}
+    keys = {}
+    for name in article.get('authors', []):
+        key = name_key(name)
+        if key:
+            keys[key] = keys.get(key) or normalize_orcid(orcids.get(name))
+    return keys
+
+
+def author_names(article):
+    """{ключ имени: имя, как оно написано в статье} для авторов статьи"""
+    names = {}
+    for name in article.get('authors', []):
+        key = name_key(name)
+        if key:
+            names.setdefault(key, name.strip())
+    return names
+
+
+def same_author(orcid1, orcid2):
+    """Записи с одинаковым ключом имени - один автор, если ORCID не противоречат друг другу"""
+    return not orcid1 or not orcid2 or orcid1 == orcid2
+
+
+def shared_authors(keys1, keys2):
+    """Общие авторы двух статей (словари author_keys): отсортированные ключи имен;
+    для показа их заменяют имена из author_names"""
+    return sorted(key for key in keys1.keys() & keys2.keys() if same_author(keys1[key], keys2[key]))
+
+
+def resolve_authors(records):
+    """Записи (article_id, имя, ключ, ORCID) -> {article_id: множество id авторов} и
+    {id автора: {'name', 'orcid', 'key'}}.
+
+    id автора - 'orcid:<ORCID>' или 'name:<ключ>' для записей без ORCID, которые не
+    удалось отнести к единственному автору с ORCID.
+    """
+    orcids = {}
+    for _, _, key, orcid in records:
+        if orcid:
+            orcids.setdefault(key, set()).add(orcid)
+    articles = {}
+    names = {}
+    keys = {}
+    for article_id, name, key, orcid in records:
+        if not orcid and len(orcids.get(key, ())) == 1:
+            orcid = next(iter(orcids[key]))
+        author_id = f"orcid:{orcid}" if orcid else f"name:{key}"
+        articles.setdefault(article_id, set()).add(author_id)
+        # Имя автора - самое частое написание
+        names.setdefault(author_id, Counter())[name] += 1
+        keys[author_id] = key
+    authors = {
+        author_id: {
+            'name': counts.most_common(1)[0][0],
+            'orcid': author_id[len('orcid:'):] if author_id.startswith('orcid:') else None,
+            'key': keys[author_id]
+        }
+        for author_id, counts in names.items()
+    }
+    return articles, authors
+
+
+def coauthor_graph(records, citations=None, min_articles=1, min_weight=1, limit=None):
+    """Граф соавторства: узлы - авторы, вес связи - число совместных статей.
+
+    records - записи (article_id, имя, ключ, ORCID) авторства, citations - {article_id:
+    число цитирований}. Остаются авторы с не меньше чем min_articles статьями, limit
+    самых продуктивных, и связи с весом не меньше min_weight.
+    """
+    citations = citations or {}
+    articles, authors = resolve_authors(records)
+    article_counts = Counter()
+    citation_counts = Counter()
+    for article_id, author_ids in articles.items():
+        for author_id in author_ids:
+            article_counts[author_id] += 1
+            citation_counts[author_id] += citations.get(article_id, 0)
+
+    ranked = sorted(
+        (author_id for author_id, count in article_counts.items() if count >= min_articles),
+        key=lambda author_id: (-article_counts[author_id], -citation_counts[author_id], author_id)
+    )
+    kept = set(ranked[:limit] if limit else ranked)
+
+    weights = Counter()
+    for author_ids in articles.values():
+        members = sorted(author_ids & kept)
+        for k, source in enumerate(members):
+            for target in members[k + 1:]:
+                weights[(source, target)] += 1
+
+    nodes = [
+        dict(authors[author_id], id=author_id, articles=article_counts[author_id],
+             citation_count=citation_counts[author_id])
+        for author_id in ranked if author_id in kept
+    ]
+    links = [
+        {'source': source, 'target': target, 'strength': weight, 'type': 'coauthors'}
+        for (source, target), weight in sorted(weights.items()) if weight >= min_weight
+    ]
+    return {'nodes': nodes, 'links': links}
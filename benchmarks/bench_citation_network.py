@@ -0,0 +1,159 @@
+"""Сравнение build_citation_network с прежним попарным перебором на синтетическом корпусе
+
+Два корпуса каждого размера: скошенный (zipf), где популярные авторы и ключевые слова
+связывают большую долю всех пар и связей квадратично много, и разреженный, где у
+статьи немного соседей. На разреженном видно, что прежний перебор растет как n²,
+а построение по инвертированным индексам - почти линейно, по числу связей.
+Также показывает число связей и время при разреживании по KEYWORD_LINK_SETTINGS.
+
+Запуск: python benchmarks/bench_citation_network.py [размер ...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import authorship
+import similarity
+from app import KEYWORD_LINK_SETTINGS, build_citation_network, ensure_url
+
+# Без разреживания результат должен совпадать с прежней реализацией
+UNPRUNED_SETTINGS = {'weighting': 'count', 'min_strength': 0, 'top_k': 0, 'max_df': 1.0}
+
+
+def legacy_build_citation_network(articles):
+    """Прежняя реализация: O(n²) перебор пар с пересборкой множеств"""
+    nodes = []
+    links = []
+
+    for article in articles:
+        article['url'] = ensure_url(article)
+        nodes.append({
+            'id': article['id'],
+            'title': article['title'],
+            'full_abstract': article.get('full_abstract') or article.get('abstract') or '',
+            'year': article['year'],
+            'journal': article['journal'],
+            'keywords': article['keywords'],
+            'citation_count': article['citation_count'],
+            'search_keywords': article.get('search_keywords', []),
+            'authors': article.get('authors', []),
+            'source': article.get('source', 'Unknown'),
+            'url': article['url']
+        })
+
+    # Авторы сравниваются так же, как в build_citation_network: по ключу имени и ORCID.
+    # Ключи считаются заранее, иначе разбор имен на каждую пару заслонил бы сам перебор
+    author_keys = [authorship.author_keys(article) for article in articles]
+
+    for i, article1 in enumerate(articles):
+        for j, article2 in enumerate(articles):
+            if i >= j:
+                continue
+
+            common_authors = authorship.shared_authors(author_keys[i], author_keys[j])
+
+            if common_authors:
+                names = authorship.author_names(article2)
+                links.append({
+                    'source': article1['id'],
+                    'target': article2['id'],
+                    'strength': len(common_authors) * 2,
+                    'type': 'authors',
+                    'common_authors': [names[key] for key in common_authors]
+                })
+
+            keywords1 = set(kw.lower() for kw in article1['keywords'] + article1.get('search_keywords', []))
+            keywords2 = set(kw.lower() for kw in article2['keywords'] + article2.get('search_keywords', []))
+            common_keywords = keywords1.intersection(keywords2)
+
+            if common_keywords:
+                links.append({
+                    'source': article1['id'],
+                    'target': article2['id'],
+                    'strength': len(common_keywords),
+                    'type': 'keywords',
+                    'common_keywords': list(common_keywords)
+                })
+
+    return {'nodes': nodes, 'links': links}
+
+
+def same_graph(legacy, indexed):
+    """Совпадение графов; поля узлов и типы связей, которых не было в прежней реализации, не сравниваются"""
+    legacy_fields = set(legacy['nodes'][0]) if legacy['nodes'] else set()
+    nodes = [{key: value for key, value in node.items() if key in legacy_fields} for node in indexed['nodes']]
+    links = [link for link in indexed['links'] if link['type'] != 'similar']
+    return legacy['nodes'] == nodes and legacy['links'] == links
+
+
+def synthetic_corpus(size, seed=42, sparse=False):
+    """Корпус со скошенным (zipf-подобным) распределением авторов и ключевых слов.
+
+    sparse=True - авторы и ключевые слова выбираются равномерно из словарей, растущих
+    вместе с корпусом: у статьи в среднем несколько соседей при любом размере.
+    """
+    rng = random.Random(seed)
+    if sparse:
+        author_pool = [f"Author{k} Family{k}" for k in range(max(size * 2, 10))]
+        keyword_pool = [f"keyword {k}" for k in range(max(size * 2, 10))]
+        author_weights = keyword_weights = None
+    else:
+        author_pool = [f"Author{k} Family{k % 97}" for k in range(max(size // 2, 10))]
+        keyword_pool = [f"keyword {k}" for k in range(max(size // 5, 10))]
+        author_weights = [1.0 / (k + 1) for k in range(len(author_pool))]
+        keyword_weights = [1.0 / (k + 1) for k in range(len(keyword_pool))]
+
+    articles = []
+    for k in range(size):
+        authors = rng.choices(author_pool, weights=author_weights, k=rng.randint(1, 6))
+        keywords = rng.choices(keyword_pool, weights=keyword_weights, k=rng.randint(1, 4))
+        articles.append({
+            'id': f"synthetic_{k}",
+            'title': f"Synthetic article {k}",
+            'abstract': 'No abstract available',
+            'full_abstract': 'No abstract available',
+            'year': rng.randint(2015, 2025),
+            'journal': 'Synthetic Journal',
+            'keywords': keywords,
+            'citation_count': rng.randint(1, 500),
+            'doi': f"10.0000/synthetic.{k}",
+            'search_keywords': [rng.choice(keyword_pool)],
+            'authors': [author.upper() if rng.random() < 0.1 else author for author in authors],
+            'source': 'Synthetic',
+            'url': ''
+        })
+    return articles
+
+
+def timed(func, articles):
+    start = time.perf_counter()
+    result = func(articles)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    # Связей по сходству аннотаций прежняя реализация не строила: их время не сравнивается
+    similarity.SIMILARITY_LINKS = False
+    print(f"{'corpus':>8} {'size':>8} {'links':>10} {'legacy, s':>12} {'indexed, s':>12} {'speedup':>9}  match"
+          f" {'sparse links':>13} {'sparse, s':>10}")
+    for corpus in ('skewed', 'sparse'):
+        for size in sizes:
+            make_corpus = lambda: synthetic_corpus(size, sparse=corpus == 'sparse')
+            legacy, legacy_time = timed(legacy_build_citation_network, make_corpus())
+            indexed, indexed_time = timed(lambda articles: build_citation_network(articles, UNPRUNED_SETTINGS),
+                                          make_corpus())
+            sparse, sparse_time = timed(lambda articles: build_citation_network(articles, KEYWORD_LINK_SETTINGS),
+                                        make_corpus())
+            match = same_graph(legacy, indexed)
+            print(f"{corpus:>8} {size:>8} {len(indexed['links']):>10} {legacy_time:>12.3f} {indexed_time:>12.3f} "
+                  f"{legacy_time / max(indexed_time, 1e-9):>8.1f}x  {str(match):>5}"
+                  f" {len(sparse['links']):>13} {sparse_time:>10.3f}")
+            if not match:
+                sys.exit(f"Output mismatch at size {size} ({corpus} corpus)")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [250, 500, 1000, 2000])
@@ -0,0 +1,175 @@
+"""Синтетический корпус статей с распределениями, похожими на данные Crossref
+
+- источники, запросы и ключевые слова берутся из sources.json, как при настоящем сборе;
+- число авторов статьи - логнормальное (медиана около 4, как в химических журналах);
+- продуктивность авторов следует закону Лотки: новый автор появляется с вероятностью
+  new_author_rate, иначе выбирается уже публиковавшийся пропорционально числу его статей
+  (модель Саймона);
+- слова заголовков и аннотаций - по закону Ципфа с примесью слов темы запроса;
+- число цитирований - распределение Парето, годы смещены к последним;
+- у части статей нет DOI, часть статей Semantic Scholar дублирует статьи Crossref по DOI;
+- у половины авторов в записях Crossref есть ORCID;
+- списки литературы ссылаются на более ранние статьи корпуса с предпочтительным присоединением.
+"""
+import hashlib
+import itertools
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from identity import title_fingerprint
+from sources import load_sources, source_keywords
+
+FIRST_DATE = date(2015, 1, 1)
+LAST_DATE = date(2025, 12, 31)
+VOCABULARY = [
+    'polymer', 'copolymer', 'block', 'barrier', 'diffusion', 'membrane', 'nanocomposite', 'synthesis',
+    'characterization', 'model', 'simulation', 'kinetics', 'radical', 'controlled', 'self-assembly',
+    'thin', 'film', 'gas', 'permeability', 'mechanical', 'thermal', 'properties', 'network', 'hydrogel',
+    'crystallization', 'morphology', 'blend', 'interface', 'dynamics', 'molecular', 'learning', 'machine'
+] + [f"term{k}" for k in range(4000)]
+# Частоты слов по закону Ципфа
+VOCABULARY_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+# Слова темы запроса и их доля в заголовках и аннотациях
+TOPIC_SIZE = 150
+TOPIC_SHARE = 0.4
+GIVEN_NAMES = [f"{letter}." for letter in 'ABCDEFGHIJKLMNOPRSTVWYZ'] + [f"Given{k}" for k in range(300)]
+
+
+def _date(rng):
+    """Дата публикации: вероятность растет к последним годам"""
+    span = (LAST_DATE - FIRST_DATE).days
+    return FIRST_DATE + timedelta(days=int(span * rng.random() ** 0.6))
+
+
+def _words(rng, topic, count):
+    """Слова текста: доля TOPIC_SHARE из темы запроса, остальные - из общего словаря"""
+    general = rng.choices(VOCABULARY, cum_weights=VOCABULARY_WEIGHTS, k=count)
+    return [rng.choice(topic) if rng.random() < TOPIC_SHARE else word for word in general]
+
+
+def synthetic_corpus(size, seed=42, new_author_rate=0.6, missing_doi_rate=0.05, duplicate_rate=0.05,
+                     references_per_article=30, internal_reference_rate=0.1):
+    """Список статей в том же виде, что выдает sources.py, отсортированный по дате"""
+    rng = random.Random(seed)
+    sources = load_sources()
+    slots = [(source, query) for source in sources for query in source['queries']]
+    weights = [3 if source['api'] == 'crossref_journal' else 1 for source, _ in slots]
+    topics = {query: random.Random(query).sample(VOCABULARY, TOPIC_SIZE) for _, query in slots}
+
+    authors = []
+    author_slots = []
+    dates = sorted(_date(rng) for _ in range(size))
+    articles = []
+    crossref_dois = []
+    cited_slots = []
+    for k, published in enumerate(dates):
+        source, query = rng.choices(slots, weights=weights)[0]
+
+        names = []
+        for _ in range(max(1, min(40, round(rng.lognormvariate(1.4, 0.5))))):
+            if not author_slots or rng.random() < new_author_rate:
+                name = f"{rng.choice(GIVEN_NAMES)} Family{len(authors)}"
+                authors.append(name)
+            else:
+                name = rng.choice(author_slots)
+            if name not in names:
+                names.append(name)
+        author_slots.extend(names)
+
+        title = ' '.join(_words(rng, topics[query], rng.randint(8, 14))).capitalize()
+        doi = '' if rng.random() < missing_doi_rate else f"10.{5000 + k % 50}/synthetic.{seed}.{k}"
+        if source['api'] == 'semantic_scholar' and crossref_dois and rng.random() < duplicate_rate:
+            doi = rng.choice(crossref_dois)
+        elif doi and source['api'] != 'semantic_scholar':
+            crossref_dois.append(doi)
+
+        # Ссылки на более ранние статьи: чем чаще статью цитировали, тем вероятнее новая ссылка
+        references = []
+        for _ in range(references_per_article):
+            if cited_slots and rng.random() < internal_reference_rate:
+                references.append(rng.choice(cited_slots))
+            else:
+                references.append(f"10.9999/external.{rng.randrange(10 ** 6)}")
+        cited_slots.extend(reference for reference in references if not reference.startswith('10.9999/'))
+        if doi:
+            cited_slots.append(doi)
+
+        abstract = ' '.join(_words(rng, topics[query], rng.randint(60, 200))).capitalize() + '.'
+        if source['api'] == 'semantic_scholar':
+            article_id = source['id_prefix'] + hashlib.sha1(f"{seed}:{k}".encode('utf-8')).hexdigest()
+        else:
+            article_id = source['id_prefix'] + (doi or title_fingerprint(title))
+        articles.append({
+            'id': article_id,
+            'title': title,
+            'abstract': abstract[:500] + '...' if len(abstract) > 500 else abstract,
+            'full_abstract': abstract,
+            'year': published.year,
+            'date': published.isoformat(),
+            'journal': query if source['api'] == 'crossref_journal' else f"Journal {rng.randrange(200)}",
+            'keywords': source_keywords(source, query),
+            'citation_count': max(1, min(100000, int(rng.paretovariate(1.2)))),
+            'doi': doi,
+            'published': str(published.year),
+            'search_keywords': [query],
+            'authors': names,
+            'source': source['name'],
+            'url': f"https://doi.org/{doi}" if doi else '',
+            'references': list(dict.fromkeys(references))
+        })
+    return articles
+
+
+def _orcid(name):
+    """ORCID у половины синтетических авторов, как в записях Crossref"""
+    number = int(name.rsplit('Family', 1)[-1])
+    if number % 2:
+        return {}
+    digits = f"{number:012d}"
+    return {'ORCID': f"https://orcid.org/0000-{digits[:4]}-{digits[4:8]}-{digits[8:]}", 'authenticated-orcid': False}
+
+
+def crossref_item(article):
+    """Статья -> запись /works Crossref"""
+    year, month, day = (int(part) for part in article['date'].split('-'))
+    item = {
+        'DOI': article['doi'],
+        'title': [article['title']],
+        # Crossref отдает аннотации в разметке JATS
+        'abstract': f"<jats:title>Abstract</jats:title><jats:p>{article['full_abstract']}</jats:p>",
+        'created': {'date-parts': [[year, month, day]]},
+        'published': {'date-parts': [[year, month, day]]},
+        'author': [
+            dict({'given': name.rsplit(' ', 1)[0], 'family': name.rsplit(' ', 1)[-1]}, **_orcid(name))
+            for name in article['authors']
+        ],
+        'container-title': [article['journal']],
+        'publisher': 'Springer Nature' if article['source'] == 'Springer' else article['source'],
+        'member': '297' if article['source'] == 'Springer' else '316',
+        'is-referenced-by-count': article['citation_count'],
+        'reference': [{'key': f"ref{k}", 'DOI': doi} for k, doi in enumerate(article['references'])]
+    }
+    if not article['doi']:
+        del item['DOI']
+    return item
+
+
+def semantic_scholar_paper(article, fields=('title', 'abstract', 'url', 'year', 'venue', 'externalIds',
+                                            'citationCount', 'authors')):
+    """Статья -> запись /graph/v1/paper/search Semantic Scholar"""
+    paper = {
+        'paperId': article['id'].rsplit('_', 1)[-1],
+        'title': article['title'],
+        'abstract': article['full_abstract'],
+        'url': '',
+        'year': article['year'],
+        'venue': article['journal'],
+        'externalIds': {'DOI': article['doi']} if article['doi'] else {},
+        'citationCount': article['citation_count'],
+        'authors': [{'name': name} for name in article['authors']]
+    }
+    return {key: value for key, value in paper.items() if key == 'paperId' or key in fields}
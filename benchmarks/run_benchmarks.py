@@ -0,0 +1,329 @@
+"""Набор бенчмарков: сбор статей, построение графа, хранилище, раскладка, аналитика, /api/articles
+и /api/authors/graph на синтетических корпусах разного размера
+
+Каждый этап для каждого размера выполняется в отдельном процессе, чтобы пиковая память
+(ru_maxrss) относилась только к нему. Сбор идет через локальную заглушку API
+(benchmarks/stub_server.py), база и кэш HTTP - во временном каталоге.
+
+Результат - JSON со сведениями о машине и списком измерений (по одному на этап и размер),
+чтобы сравнивать прогоны между коммитами.
+
+Запуск: python benchmarks/run_benchmarks.py [--sizes 1000 10000 100000] [--stages build api]
+                                            [--output benchmark_results.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import pickle
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARKS_DIR)
+sys.path.insert(0, BENCHMARKS_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+STAGES = ('harvest', 'build', 'store', 'layout', 'analytics', 'api')
+# Предел времени одного этапа: этап, не уложившийся в него, записывается как ошибка
+DEFAULT_TIMEOUT = 3600
+# Повторы запросов к /api/articles для перцентилей
+COLD_REPEATS = 3
+WARM_REPEATS = 20
+# Диапазон дат сбора, в который попадает весь синтетический корпус
+HARVEST_START = '2015-01-01'
+HARVEST_END = '2025-12-31'
+
+
+def peak_rss_mb():
+    # ru_maxrss в Linux - в килобайтах, в macOS - в байтах
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def timings(values):
+    return {
+        'p50_ms': round(statistics.median(values) * 1000, 2),
+        'p95_ms': round(percentile(values, 0.95) * 1000, 2),
+        'runs': len(values)
+    }
+
+
+def start_stub(size):
+    """Заглушка API в отдельном процессе, чтобы ее работа не попадала в замеры сбора"""
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BENCHMARKS_DIR, 'stub_server.py'), '--size', str(size), '--port', '0'],
+        stdout=subprocess.PIPE, text=True
+    )
+    urls = dict(stub.stdout.readline().strip().split('=', 1) for _ in range(2))
+    return stub, urls
+
+
+def bench_harvest(size):
+    stub, urls = start_stub(size)
+    os.environ.update(urls)
+    try:
+        import harvest
+        import sources
+        from http_client import throttle
+
+        # Заглушка локальная: паузы между запросами измеряли бы только ограничитель
+        throttle.set_limit('127.0.0.1', 0)
+        started = time.perf_counter()
+        with harvest.collecting(harvest.WatermarkBatch()):
+            articles = list(sources.unique(sources.harvest_all(HARVEST_START, HARVEST_END)))
+        seconds = time.perf_counter() - started
+    finally:
+        stub.terminate()
+        stub.wait()
+    return {
+        'seconds': round(seconds, 3),
+        'articles': len(articles),
+        'articles_per_second': round(len(articles) / seconds, 1)
+    }
+
+
+def built_graph(size):
+    """Граф корпуса: сохраненный этапом build этого прогона или построенный заново"""
+    path = os.path.join(os.environ['BENCHMARK_SHARED_DIR'], f"graph_{size}.pickle")
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    from app import build_citation_network
+    from corpus import synthetic_corpus
+
+    return build_citation_network(synthetic_corpus(size))
+
+
+def bench_build(size):
+    from app import build_citation_network
+    from corpus import synthetic_corpus
+
+    articles = synthetic_corpus(size)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    graph = build_citation_network(articles)
+    seconds = time.perf_counter() - started
+    # Следующие этапы этого размера берут готовый граф, а не строят его снова
+    with open(os.path.join(os.environ['BENCHMARK_SHARED_DIR'], f"graph_{size}.pickle"), 'wb') as f:
+        pickle.dump(graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+    return {
+        'seconds': round(seconds, 3),
+        'nodes': len(graph['nodes']),
+        'links': len(graph['links']),
+        'baseline_rss_mb': baseline
+    }
+
+
+def bench_store(size):
+    import storage
+
+    graph = built_graph(size)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    storage.save_graph(graph)
+    save_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    loaded = storage.load_graph()
+    load_seconds = time.perf_counter() - started
+    return {
+        'save_seconds': round(save_seconds, 3),
+        'load_seconds': round(load_seconds, 3),
+        'nodes': len(loaded['nodes']),
+        'links': len(loaded['links']),
+        'database_mb': round(os.path.getsize(storage.DATABASE_FILE) / (1024 * 1024), 1),
+        'baseline_rss_mb': baseline
+    }
+
+
+def bench_layout(size):
+    from layout import force_layout
+
+    graph = built_graph(size)
+    node_ids = [node['id'] for node in graph['nodes']]
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    force_layout(node_ids, graph['links'])
+    return {
+        'seconds': round(time.perf_counter() - started, 3),
+        'nodes': len(node_ids),
+        'baseline_rss_mb': baseline
+    }
+
+
+def bench_analytics(size):
+    import analytics
+
+    graph = built_graph(size)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    result = analytics.analyze(graph)
+    return {
+        'seconds': round(time.perf_counter() - started, 3),
+        'nodes': len(graph['nodes']),
+        'communities': len(result['communities']),
+        'baseline_rss_mb': baseline
+    }
+
+
+def bench_api(size):
+    import app
+    import storage
+
+    storage.save_graph(built_graph(size))
+    app.update_layout()
+    client = app.app.test_client()
+    baseline = peak_rss_mb()
+    result = {'baseline_rss_mb': baseline}
+    for wire_format in ('json', 'compact'):
+        result[wire_format] = request_timings(app, client, f"/api/articles?format={wire_format}")
+    # Облегченный граф интерфейса; подробности статьи - отдельным запросом
+    result['summary'] = request_timings(app, client, '/api/articles?format=compact&view=summary')
+    result['article'] = request_timings(app, client, f"/api/articles/{app.graph_cache.graph().nodes[0]['id']}")
+    # Граф соавторства всех авторов того же корпуса
+    result['authors'] = request_timings(app, client, '/api/authors/graph?limit=0&format=compact')
+    return result
+
+
+def request_timings(app, client, url):
+    headers = {'Accept-Encoding': 'gzip'}
+    # Холодный запрос: граф читается из базы, фильтруется, сериализуется и сжимается
+    cold = []
+    for _ in range(COLD_REPEATS):
+        app.graph_cache.invalidate()
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        cold.append(time.perf_counter() - started)
+    # Теплый: готовый ответ из кэша графа
+    warm = []
+    for _ in range(WARM_REPEATS):
+        started = time.perf_counter()
+        response = client.get(url, headers=headers)
+        warm.append(time.perf_counter() - started)
+    return {
+        'cold': timings(cold),
+        'warm': timings(warm),
+        'status': response.status_code,
+        'body_bytes': len(response.data)
+    }
+
+
+BENCHMARKS = {
+    'harvest': bench_harvest,
+    'build': bench_build,
+    'store': bench_store,
+    'layout': bench_layout,
+    'analytics': bench_analytics,
+    'api': bench_api
+}
+
+
+def run_worker(stage, size, verbose):
+    """Один этап в текущем процессе; результат - одна строка JSON в stdout"""
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            # Прогресс приложения печатается в stdout и мешал бы разбору результата
+            stack.enter_context(contextlib.redirect_stdout(open(os.devnull, 'w')))
+        result = BENCHMARKS[stage](size)
+    result['peak_rss_mb'] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def run_stage(stage, size, shared_dir, verbose=False, timeout=None):
+    """Запускает этап в отдельном процессе со своей временной базой"""
+    with tempfile.TemporaryDirectory(prefix='bench_') as workdir:
+        env = dict(
+            os.environ,
+            BENCHMARK_SHARED_DIR=shared_dir,
+            DATABASE_FILE=os.path.join(workdir, 'articles.sqlite'),
+            HTTP_CACHE_MODE='off',
+            HTTP_CACHE_FILE=os.path.join(workdir, 'http_cache.sqlite'),
+            HARVEST_MAX_PAGES='100000',
+            LOG_LEVEL='DEBUG' if verbose else 'WARNING',
+            PYTHONHASHSEED='0'
+        )
+        command = [sys.executable, os.path.abspath(__file__), '--worker', stage, '--size', str(size)]
+        if verbose:
+            command.append('--verbose')
+        completed = subprocess.run(command, env=env, cwd=workdir, stdout=subprocess.PIPE, text=True,
+                                   timeout=timeout)
+    if completed.returncode != 0:
+        return {'stage': stage, 'size': size, 'error': f"exit code {completed.returncode}"}
+    return dict({'stage': stage, 'size': size}, **json.loads(completed.stdout.strip().splitlines()[-1]))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, stdout=subprocess.PIPE,
+                              stderr=subprocess.DEVNULL, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def summary_line(result):
+    if 'error' in result:
+        return result['error']
+    if result['stage'] == 'api':
+        return ', '.join(
+            f"{name} cold {result[name]['cold']['p50_ms']} ms / warm {result[name]['warm']['p50_ms']} ms"
+            for name in ('json', 'compact', 'summary', 'article', 'authors')
+        )
+    if result['stage'] == 'store':
+        return f"save {result['save_seconds']} s, load {result['load_seconds']} s"
+    return f"{result['seconds']} s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run benchmark suite on synthetic corpora')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='seconds per stage')
+    parser.add_argument('--verbose', action='store_true', help='show application output')
+    parser.add_argument('--worker', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.size, args.verbose)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='bench_shared_') as shared_dir:
+        for size in args.sizes:
+            for stage in args.stages:
+                try:
+                    result = run_stage(stage, size, shared_dir, args.verbose, args.timeout)
+                except subprocess.TimeoutExpired:
+                    result = {'stage': stage, 'size': size, 'error': f"timeout after {args.timeout} s"}
+                results.append(result)
+                peak = f", peak {result['peak_rss_mb']} MB" if 'peak_rss_mb' in result else ''
+                print(f"{stage:>8} {size:>7}: {summary_line(result)}{peak}", flush=True)
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
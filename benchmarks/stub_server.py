@@ -0,0 +1,216 @@
+"""Локальная заглушка Crossref и Semantic Scholar для бенчмарков сбора статей
+
+Отдает синтетический корпус (benchmarks/corpus.py) в форме ответов настоящих API:
+- /crossref/works - фильтры container-title, member, from-pub-date, until-pub-date,
+  query, sort/order, rows и курсорная выборка;
+- /s2/graph/v1/paper/search - query, year, offset, limit, fields;
+- /s2/graph/v1/paper/batch (POST) - списки литературы по DOI:... или paperId.
+
+С --replay отдает записанные ответы из кэша HTTP-клиента (data/http_cache.sqlite),
+сопоставляя запрос с исходным URL api.crossref.org или api.semanticscholar.org.
+
+Приложение направляется на заглушку через переменные окружения:
+  CROSSREF_API_URL=http://127.0.0.1:8765/crossref
+  SEMANTIC_SCHOLAR_API_URL=http://127.0.0.1:8765/s2
+
+Запуск: python benchmarks/stub_server.py [--size 10000] [--port 8765] [--replay data/http_cache.sqlite]
+"""
+import argparse
+import bisect
+import json
+import os
+import sys
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import crossref_item, semantic_scholar_paper, synthetic_corpus
+from http_cache import HTTP_CACHE_MAX_BYTES, ResponseCache, normalize_url
+
+# Префиксы путей заглушки -> исходные адреса API (для --replay)
+UPSTREAMS = {
+    '/crossref': 'https://api.crossref.org',
+    '/s2': 'https://api.semanticscholar.org'
+}
+
+
+def parse_filter(value):
+    """'name:value,name:value' -> {name: value}; значение может содержать ':'"""
+    filters = {}
+    for part in (value or '').split(','):
+        name, _, item = part.partition(':')
+        if name:
+            filters[name] = item
+    return filters
+
+
+class Corpus:
+    """Синтетический корпус с индексами под запросы API"""
+
+    def __init__(self, articles):
+        self.articles = articles
+        self.by_journal = {}
+        self.by_query = {}
+        self.by_paper_id = {}
+        self.by_doi = {}
+        for article in articles:
+            # Статьи уже отсортированы по дате
+            self.by_journal.setdefault(article['journal'], []).append(article)
+            self.by_query.setdefault(article['search_keywords'][0], []).append(article)
+            if article['doi']:
+                self.by_doi.setdefault(article['doi'].lower(), article)
+            if article['id'].startswith('semantic_adv_'):
+                self.by_paper_id[article['id'].rsplit('_', 1)[-1]] = article
+        self.dates = {journal: [article['date'] for article in items] for journal, items in self.by_journal.items()}
+
+    def crossref_works(self, params):
+        filters = parse_filter(params.get('filter'))
+        date_from = filters.get('from-pub-date', '0000')
+        date_until = filters.get('until-pub-date', '9999') + '~'
+        rows = int(params.get('rows', 20))
+        if 'container-title' in filters:
+            journal = filters['container-title']
+            items = self.by_journal.get(journal, [])
+            dates = self.dates.get(journal, [])
+            selected = items[bisect.bisect_left(dates, date_from):bisect.bisect_right(dates, date_until)]
+        else:
+            selected = [
+                article for article in self.by_query.get(params.get('query'), [])
+                if date_from <= article['date'] <= date_until
+                and not article['id'].startswith('semantic_adv_')
+                and ('member' not in filters or crossref_item(article)['member'] == filters['member'])
+            ]
+            if params.get('sort', 'relevance') == 'relevance':
+                selected.sort(key=lambda article: -article['citation_count'])
+        if params.get('sort') == 'published' and params.get('order') == 'desc':
+            selected = selected[::-1]
+
+        cursor = params.get('cursor')
+        offset = int(cursor[1:]) if cursor and cursor.startswith('o') else 0
+        page = selected[offset:offset + rows]
+        message = {'total-results': len(selected), 'items': [crossref_item(article) for article in page]}
+        if cursor is not None:
+            message['next-cursor'] = f"o{offset + rows}"
+        return 200, {'status': 'ok', 'message-type': 'work-list', 'message': message}
+
+    def semantic_scholar_search(self, params):
+        first_year, _, last_year = params.get('year', '0-9999').partition('-')
+        years = range(int(first_year), int(last_year or first_year) + 1)
+        fields = tuple(params.get('fields', 'title').split(','))
+        selected = [
+            article for article in self.by_query.get(params.get('query'), [])
+            if article['year'] in years and article['id'].startswith('semantic_adv_')
+        ]
+        selected.sort(key=lambda article: -article['citation_count'])
+        limit = int(params.get('limit', 10))
+        offset = int(params.get('offset', 0))
+        payload = {
+            'total': len(selected),
+            'offset': offset,
+            'data': [semantic_scholar_paper(article, fields) for article in selected[offset:offset + limit]]
+        }
+        if offset + limit < len(selected):
+            payload['next'] = offset + limit
+        return 200, payload
+
+    def semantic_scholar_batch(self, payload):
+        papers = []
+        for paper_id in payload.get('ids', []):
+            if paper_id.startswith('DOI:'):
+                article = self.by_doi.get(paper_id[4:].lower())
+            else:
+                article = self.by_paper_id.get(paper_id)
+            if article is None:
+                papers.append(None)
+                continue
+            papers.append({
+                'paperId': paper_id,
+                'references': [{'paperId': None, 'externalIds': {'DOI': doi}} for doi in article['references']]
+            })
+        return 200, papers
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    corpus = None
+    replay = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_replay(self):
+        for prefix, upstream in UPSTREAMS.items():
+            if self.path.startswith(prefix + '/'):
+                entry = self.replay.get(normalize_url(upstream + self.path[len(prefix):]))
+                if entry is not None:
+                    self.send_response(entry.status)
+                    self.send_header('Content-Type', entry.headers.get('Content-Type', 'application/json'))
+                    self.send_header('Content-Length', str(len(entry.body)))
+                    self.end_headers()
+                    self.wfile.write(entry.body)
+                    return
+        self.send_json(404, {'error': 'not recorded'})
+
+    def do_GET(self):
+        if self.replay is not None:
+            self.send_replay()
+            return
+        parts = urllib.parse.urlsplit(self.path)
+        params = dict(urllib.parse.parse_qsl(parts.query, keep_blank_values=True))
+        if parts.path == '/crossref/works':
+            self.send_json(*self.corpus.crossref_works(params))
+        elif parts.path == '/s2/graph/v1/paper/search':
+            self.send_json(*self.corpus.semantic_scholar_search(params))
+        else:
+            self.send_json(404, {'error': 'unknown path'})
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if urllib.parse.urlsplit(self.path).path == '/s2/graph/v1/paper/batch' and self.corpus is not None:
+            self.send_json(*self.corpus.semantic_scholar_batch(payload))
+        else:
+            self.send_json(404, {'error': 'unknown path'})
+
+
+def start_server(size=1000, port=0, seed=42, replay=None):
+    """Запускает заглушку в фоновом потоке; возвращает (server, base_url)"""
+    handler = type('Handler', (StubHandler,), {})
+    if replay:
+        handler.replay = ResponseCache(replay, ttl=0, max_bytes=HTTP_CACHE_MAX_BYTES)
+    else:
+        handler.corpus = Corpus(synthetic_corpus(size, seed=seed))
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Crossref / Semantic Scholar stub')
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--replay', help='http_cache.sqlite with recorded responses')
+    args = parser.parse_args()
+    server, base_url = start_server(args.size, args.port, args.seed, args.replay)
+    print(f"CROSSREF_API_URL={base_url}/crossref")
+    print(f"SEMANTIC_SCHOLAR_API_URL={base_url}/s2")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""Связи цитирования: списки литературы из Crossref и пакетного API Semantic Scholar,
+сопоставленные со статьями корпуса по индексу DOI"""
+import logging
+import os
+
+import metrics
+import storage
+from harvest import SEMANTIC_SCHOLAR_API_URL
+from http_client import http_post
+from identity import normalize_doi
+from jobs import JobCancelled, raise_if_cancelled
+
+# Этап цитирований при обновлении статей (0 - выключен)
+CITATIONS = os.environ.get('CITATIONS', '1') != '0'
+SEMANTIC_SCHOLAR_BATCH_URL = f"{SEMANTIC_SCHOLAR_API_URL}/graph/v1/paper/batch?fields=references.externalIds"
+# Ограничение пакетного API Semantic Scholar на число статей в одном запросе
+REFERENCE_BATCH_SIZE = int(os.environ.get('REFERENCE_BATCH_SIZE', 500))
+
+SEMANTIC_SCHOLAR_PREFIX = 'semantic_adv_'
+
+logger = logging.getLogger(__name__)
+
+
+def crossref_references(item):
+    """DOI из списка литературы записи Crossref; None, если издатель список не передал"""
+    if 'reference' not in item:
+        return None
+    dois = (normalize_doi(reference.get('DOI')) for reference in item['reference'])
+    return list(dict.fromkeys(doi for doi in dois if doi))
+
+
+def semantic_scholar_id(article_id, doi):
+    """Идентификатор статьи для пакетного API: DOI или paperId Semantic Scholar"""
+    if doi:
+        return f"DOI:{normalize_doi(doi)}"
+    if article_id.startswith(SEMANTIC_SCHOLAR_PREFIX):
+        return article_id[len(SEMANTIC_SCHOLAR_PREFIX):]
+    return None
+
+
+def fetch_references(articles):
+    """Списки литературы пакетами по REFERENCE_BATCH_SIZE: {id: [DOI]}.
+
+    articles - список (id, doi). Статья, которую API не знает, получает пустой список,
+    чтобы не запрашивать ее снова.
+    """
+    resolved = {}
+    queryable = []
+    for article_id, doi in articles:
+        paper_id = semantic_scholar_id(article_id, doi)
+        if paper_id is None:
+            resolved[article_id] = []
+        else:
+            queryable.append((article_id, paper_id))
+
+    for start in range(0, len(queryable), REFERENCE_BATCH_SIZE):
+        raise_if_cancelled()
+        batch = queryable[start:start + REFERENCE_BATCH_SIZE]
+        # Непрошедший пакет останется неразрешенным и будет запрошен при следующем обновлении
+        try:
+            response = http_post(SEMANTIC_SCHOLAR_BATCH_URL, {'ids': [paper_id for _, paper_id in batch]})
+        except JobCancelled:
+            raise
+        except Exception as e:
+            logger.error("Error fetching Semantic Scholar references: %s", e)
+            continue
+        if response.status_code != 200:
+            logger.warning("Semantic Scholar batch failed with status %d", response.status_code)
+            continue
+        for (article_id, _), paper in zip(batch, response.json()):
+            references = (paper or {}).get('references') or []
+            dois = (normalize_doi((reference.get('externalIds') or {}).get('DOI')) for reference in references)
+            resolved[article_id] = list(dict.fromkeys(doi for doi in dois if doi))
+    return resolved
+
+
+def resolve_references(new_articles):
+    """Сохраняет списки литературы новых статей и запрашивает недостающие пакетами,
+    вместе со всеми сохраненными статьями, которые еще не разрешались.
+
+    Выполняется до записи графа, чтобы отмена не оставила граф без раскладки.
+    Возвращает ID статей, разрешенных в этот раз.
+    """
+    storage.save_references({
+        article['id']: article['references'] for article in new_articles if article.get('references') is not None
+    }, 'crossref')
+    pending = [(article['id'], article.get('doi')) for article in new_articles if article.get('references') is None]
+    pending += storage.unresolved_references()
+    if pending:
+        logger.info("Resolving references for %d articles...", len(pending))
+        with metrics.source_context('references'):
+            storage.save_references(fetch_references(pending), 'semantic_scholar')
+    return [article['id'] for article in new_articles] + [article_id for article_id, _ in pending]
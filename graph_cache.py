@@ -0,0 +1,65 @@
+"""Кэш графа в памяти процесса с инвалидацией по версии хранилища"""
+import threading
+from collections import OrderedDict
+
+# Сколько разных комбинаций фильтров держать готовыми
+FILTER_CACHE_SIZE = 256
+
+
+class GraphCache:
+    """Держит разобранный граф и готовые ответы по фильтрам для текущей версии графа.
+
+    load() загружает граф целиком, version() дешево возвращает номер версии;
+    при смене версии (запись в этом или другом процессе) кэш сбрасывается.
+    """
+
+    def __init__(self, load, version, max_entries=FILTER_CACHE_SIZE):
+        self._load = load
+        self._version = version
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # Граф новой версии загружает один поток, остальные ждут его
+        self._load_lock = threading.Lock()
+        self._graph = None
+        self._graph_version = None
+        self._entries = OrderedDict()
+
+    def graph(self):
+        """Граф текущей версии; перечитывается только после изменения"""
+        version = self._version()
+        with self._lock:
+            if self._graph is not None and self._graph_version == version:
+                return self._graph
+        with self._load_lock:
+            with self._lock:
+                if self._graph is not None and self._graph_version == version:
+                    return self._graph
+            graph = self._load()
+            with self._lock:
+                self._graph = graph
+                self._graph_version = version
+                self._entries.clear()
+        return graph
+
+    def cached(self, key, compute):
+        """Результат compute(graph) для ключа фильтра, вычисленный не чаще раза на версию"""
+        graph = self.graph()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] is graph:
+                self._entries.move_to_end(key)
+                return entry[1]
+        value = compute(graph)
+        with self._lock:
+            if self._graph is graph:
+                self._entries[key] = (graph, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._graph = None
+            self._graph_version = None
+            self._entries.clear()
@@ -0,0 +1,93 @@
+"""Индексы графа в памяти для быстрой фильтрации /api/articles"""
+import bisect
+
+
+class GraphIndex:
+    """Граф с индексами: узлы, отсортированные по году, темы и смежность узел -> связи.
+
+    Стоимость filter() пропорциональна размеру результата, а не всего графа.
+    """
+
+    def __init__(self, graph, topic_members, layout=None, communities=None):
+        self.nodes = graph.get('nodes', [])
+        self.links = graph.get('links', [])
+        self.topic_members = topic_members
+        # Сохраненная раскладка всего графа {id: (x, y)}
+        self.layout = layout or {}
+        self.position = {node['id']: k for k, node in enumerate(self.nodes)}
+        # Описания сообществ из аналитики графа {номер: описание} и их узлы
+        self.communities = {community['id']: community for community in communities or ()}
+        self.community_members = {}
+        for k, node in enumerate(self.nodes):
+            if node.get('community') is not None:
+                self.community_members.setdefault(node['community'], []).append(k)
+
+        # Узлы без года не попадают ни в какой диапазон, как и при фильтре по годам
+        by_year = sorted(
+            (node['year'], k) for k, node in enumerate(self.nodes) if isinstance(node.get('year'), int)
+        )
+        self.years = [year for year, _ in by_year]
+        self.year_order = [k for _, k in by_year]
+
+        # Связи, исходящие из узла (по номеру связи в исходном порядке)
+        self.outgoing = {}
+        for k, link in enumerate(self.links):
+            self.outgoing.setdefault(link['source'], []).append(k)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def year_range(self, start_year=None, end_year=None):
+        """Номера узлов с годом в [start_year, end_year] через бинарный поиск"""
+        lo = 0 if start_year is None else bisect.bisect_left(self.years, start_year)
+        hi = len(self.years) if end_year is None else bisect.bisect_right(self.years, end_year)
+        return self.year_order[lo:hi]
+
+    @staticmethod
+    def _in_range(node, start_year, end_year):
+        year = node.get('year')
+        if start_year is None and end_year is None:
+            return True
+        if not isinstance(year, int):
+            return False
+        return (start_year is None or year >= start_year) and (end_year is None or year <= end_year)
+
+    def filter(self, topic, start_year, end_year):
+        """Узлы по теме и диапазону лет и связи между ними, в исходном порядке"""
+        return self.subgraph(self.select(topic, start_year, end_year))
+
+    def select(self, topic, start_year, end_year):
+        """Номера узлов по теме и диапазону лет"""
+        if start_year is None and end_year is None:
+            positions = range(len(self.nodes))
+        else:
+            positions = self.year_range(start_year, end_year)
+
+        # Неизвестная тема, как и 'all', не ограничивает выборку
+        members = self.topic_members.get(topic) if topic != 'all' else None
+        if members is not None:
+            if len(members) < len(positions):
+                positions = [
+                    self.position[article_id] for article_id in members
+                    if article_id in self.position and self._in_range(self.nodes[self.position[article_id]], start_year, end_year)
+                ]
+            else:
+                positions = [k for k in positions if self.nodes[k]['id'] in members]
+        return positions
+
+    def community(self, number):
+        """Узлы сообщества и связи между ними"""
+        return self.subgraph(self.community_members.get(number, []))
+
+    def subgraph(self, positions):
+        """Узлы с номерами positions и связи между ними, в исходном порядке"""
+        nodes = [self.nodes[k] for k in sorted(positions)]
+
+        node_ids = {node['id'] for node in nodes}
+        link_positions = [
+            k for node in nodes for k in self.outgoing.get(node['id'], ())
+            if self.links[k]['target'] in node_ids
+        ]
+        links = [self.links[k] for k in sorted(link_positions)]
+
+        return {'nodes': nodes, 'links': links}
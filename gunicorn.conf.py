@@ -0,0 +1,35 @@
+"""Настройки gunicorn для нескольких рабочих процессов: gunicorn -c gunicorn.conf.py app:app
+
+Приложение и граф текущей версии загружаются в главном процессе до fork, поэтому
+рабочие процессы делят одну копию графа (copy-on-write). Новую версию графа процессы
+подхватывают без перезапуска: первый строит снимок (snapshot.py), остальные его загружают.
+"""
+import gc
+import os
+
+# Снимки графа нужны, когда рабочих процессов несколько; читается при импорте snapshot
+os.environ.setdefault('GRAPH_SNAPSHOTS', '1')
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2 * (os.cpu_count() or 1)))
+# Потоки внутри процесса делят граф и кэш ответов
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+preload_app = True
+# Первая загрузка новой версии графа в процессе может занимать десятки секунд
+timeout = 120
+
+
+def when_ready(server):
+    """Загружает граф до fork и замораживает объекты, чтобы сборщик мусора их не трогал"""
+    import app
+    import storage
+
+    try:
+        app.graph_cache.graph()
+    except Exception as e:
+        server.log.warning("Could not preload graph: %s", e)
+    # Соединение SQLite нельзя использовать в дочерних процессах
+    storage.close_connection()
+    # Обход сборщиком мусора пишет в заголовки объектов и размножал бы страницы графа
+    gc.freeze()
@@ -0,0 +1,261 @@
+"""Инкрементальный сбор: водяные знаки по источникам и запросам и запросы к API с фильтром по датам"""
+import contextlib
+import contextvars
+import os
+import urllib.parse
+from datetime import date, datetime, timedelta
+
+import storage
+from http_client import http_get
+from jobs import raise_if_cancelled
+
+# Последние дни перед сегодняшним считаются неполными: Crossref индексирует с задержкой
+HARVEST_LAG_DAYS = int(os.environ.get('HARVEST_LAG_DAYS', 7))
+# Диапазон по умолчанию, если даты не заданы
+DEFAULT_HARVEST_DAYS = 30
+# Постраничная выборка: записей на страницу и страниц на один промежуток за сбор
+CROSSREF_PAGE_ROWS = int(os.environ.get('CROSSREF_PAGE_ROWS', 100))
+SEMANTIC_SCHOLAR_PAGE_LIMIT = int(os.environ.get('SEMANTIC_SCHOLAR_PAGE_LIMIT', 100))
+HARVEST_MAX_PAGES = int(os.environ.get('HARVEST_MAX_PAGES', 10))
+
+# Адреса API можно переопределить, например, на локальную заглушку из benchmarks/stub_server.py
+CROSSREF_API_URL = os.environ.get('CROSSREF_API_URL', 'https://api.crossref.org')
+SEMANTIC_SCHOLAR_API_URL = os.environ.get('SEMANTIC_SCHOLAR_API_URL', 'https://api.semanticscholar.org')
+CROSSREF_WORKS_URL = f"{CROSSREF_API_URL}/works"
+SEMANTIC_SCHOLAR_SEARCH_URL = f"{SEMANTIC_SCHOLAR_API_URL}/graph/v1/paper/search"
+
+ONE_DAY = timedelta(days=1)
+# Меняется, когда сохраненные водяные знаки запросов по ключевым словам становятся
+# неверными: до версии 2 они отмечали весь диапазон, хотя выбиралась только первая страница
+QUERY_WATERMARKS_VERSION = '2'
+
+
+class RateLimited(Exception):
+    """API ответил 429; запрос не считается выполненным"""
+
+
+class WatermarkBatch:
+    """Новые водяные знаки сбора; сохраняются только после записи статей в граф"""
+
+    def __init__(self, use_watermarks=True):
+        self.use_watermarks = use_watermarks
+        self.updates = {}
+
+    def record(self, source, query, covered_from, covered_until):
+        self.updates[(source, query)] = (covered_from, covered_until)
+
+    def save(self):
+        storage.save_watermarks([
+            (source, query, covered_from.isoformat(), covered_until.isoformat())
+            for (source, query), (covered_from, covered_until) in self.updates.items()
+        ])
+
+
+_batch = contextvars.ContextVar('watermark_batch', default=None)
+
+
+@contextlib.contextmanager
+def collecting(batch):
+    """Собирает водяные знаки всех запросов внутри блока в batch"""
+    token = _batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _batch.reset(token)
+
+
+def parse_date(value):
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def requested_range(start_date, end_date):
+    """Диапазон дат сбора; по умолчанию последние DEFAULT_HARVEST_DAYS дней"""
+    end = parse_date(end_date) if end_date else date.today()
+    start = parse_date(start_date) if start_date else end - timedelta(days=DEFAULT_HARVEST_DAYS)
+    return start, end
+
+
+def plan_gaps(coverage, start, end):
+    """Части диапазона [start, end], еще не покрытые сохраненным водяным знаком.
+
+    Возвращает список (from, until, direction): 'backfill' идет от границы покрытия
+    назад, 'forward' - вперед. Граничный день покрытия запрашивается повторно:
+    дубликаты отсеиваются по ID, зато статьи этого дня не теряются.
+    """
+    if coverage is None:
+        return [(start, end, 'forward')]
+    covered_from, covered_until = coverage
+    if covered_until + ONE_DAY < start or end + ONE_DAY < covered_from:
+        # Покрытие не примыкает к запрошенному диапазону: собираем его целиком
+        return [(start, end, 'forward')]
+    gaps = []
+    if start < covered_from:
+        gaps.append((start, covered_from, 'backfill'))
+    if end > covered_until:
+        gaps.append((covered_until, end, 'forward'))
+    return gaps
+
+
+def reset_query_watermarks(sources):
+    """Сбрасывает устаревшие водяные знаки источников sources (имена) один раз на версию"""
+    storage.reset_watermarks(QUERY_WATERMARKS_VERSION, sources)
+
+
+def current_coverage(source, query):
+    batch = _batch.get()
+    if batch is not None and not batch.use_watermarks:
+        return None
+    watermark = storage.get_watermark(source, query)
+    if watermark is None:
+        return None
+    return parse_date(watermark[0]), parse_date(watermark[1])
+
+
+def merge_coverage(source, query, coverage, start, end, reached):
+    """Записывает новое покрытие в текущий batch.
+
+    reached - {'forward': день, до которого дошли, 'backfill': день, от которого дошли},
+    если выборка оборвалась на лимите страниц.
+    """
+    batch = _batch.get()
+    if batch is None:
+        return
+    # Последние дни всегда пересобираются, поэтому в покрытие не входят
+    end = min(end, date.today() - timedelta(days=HARVEST_LAG_DAYS))
+    if coverage is None or coverage[1] + ONE_DAY < start or end + ONE_DAY < coverage[0]:
+        covered_from, covered_until = start, end
+    else:
+        covered_from, covered_until = min(start, coverage[0]), max(end, coverage[1])
+    if 'forward' in reached:
+        covered_until = min(covered_until, reached['forward'] - ONE_DAY)
+    if 'backfill' in reached:
+        covered_from = max(covered_from, reached['backfill'] + ONE_DAY)
+    if covered_from <= covered_until:
+        batch.record(source, query, covered_from, covered_until)
+
+
+def item_date(item):
+    """Дата публикации записи Crossref (первая из известных), None если неизвестна"""
+    for field in ('published', 'published-online', 'published-print', 'issued', 'created'):
+        parts = (item.get(field) or {}).get('date-parts') or [[]]
+        parts = [part for part in parts[0] if part] if parts[0] else []
+        if parts:
+            year, month, day = (parts + [1, 1])[:3]
+            try:
+                return date(year, month, day)
+            except ValueError:
+                return date(year, 1, 1)
+    return None
+
+
+def crossref_url(params):
+    return f"{CROSSREF_WORKS_URL}?{urllib.parse.urlencode(params, quote_via=urllib.parse.quote, safe=':,*')}"
+
+
+def date_filter(date_from, date_until):
+    return f"from-pub-date:{date_from.isoformat()},until-pub-date:{date_until.isoformat()}"
+
+
+def crossref_pages(params, direction, what):
+    """Курсорная выборка Crossref по дате публикации: (записи, день, до которого дошли, или None).
+
+    День возвращается, если выборка оборвалась на HARVEST_MAX_PAGES: покрытие тогда
+    доходит только до даты последней полученной записи.
+    """
+    params = dict(params, rows=CROSSREF_PAGE_ROWS, sort='published',
+                  order='asc' if direction == 'forward' else 'desc', cursor='*')
+    items = []
+    for page in range(HARVEST_MAX_PAGES):
+        raise_if_cancelled()
+        response = http_get(crossref_url(params))
+        if response.status_code == 429:
+            raise RateLimited(f"Crossref rate limit for {what}")
+        message = response.json().get('message', {})
+        page_items = message.get('items', [])
+        items.extend(page_items)
+        if len(page_items) < CROSSREF_PAGE_ROWS or not message.get('next-cursor'):
+            return items, None
+        params['cursor'] = message['next-cursor']
+    return items, item_date(items[-1]) if items else None
+
+
+def crossref_journal(source, journal, start_date=None, end_date=None):
+    """Все записи журнала за непокрытую часть диапазона: курсорная выборка Crossref"""
+    start, end = requested_range(start_date, end_date)
+    coverage = current_coverage(source, journal)
+    items = []
+    reached = {}
+    for date_from, date_until, direction in plan_gaps(coverage, start, end):
+        filters = f"container-title:{journal},{date_filter(date_from, date_until)}"
+        gap_items, last_date = crossref_pages({'filter': filters}, direction, journal)
+        items.extend(gap_items)
+        if last_date:
+            reached[direction] = last_date
+    merge_coverage(source, journal, coverage, start, end, reached)
+    return items
+
+
+def crossref_query(source, query, start_date=None, end_date=None, extra_filter=None):
+    """Все записи по запросу за непокрытую часть диапазона: курсорная выборка Crossref.
+
+    Выборка идет по дате, а не по релевантности: иначе оборванную на лимите страниц
+    выборку нельзя было бы продолжить со следующего сбора.
+    """
+    start, end = requested_range(start_date, end_date)
+    coverage = current_coverage(source, query)
+    items = []
+    reached = {}
+    for date_from, date_until, direction in plan_gaps(coverage, start, end):
+        filters = date_filter(date_from, date_until)
+        if extra_filter:
+            filters = f"{extra_filter},{filters}"
+        gap_items, last_date = crossref_pages({'query': query, 'filter': filters}, direction, f"'{query}'")
+        items.extend(gap_items)
+        if last_date:
+            reached[direction] = last_date
+    merge_coverage(source, query, coverage, start, end, reached)
+    return items
+
+
+def semantic_scholar_query(source, query, fields, start_date=None, end_date=None):
+    """Статьи Semantic Scholar по запросу за непокрытую часть диапазона.
+
+    Поиск Semantic Scholar упорядочен только по релевантности и фильтрует по годам,
+    поэтому промежуток выбирается по одному году, по порядку дат, до конца выдачи.
+    Если на году закончились HARVEST_MAX_PAGES страниц, покрытие доходит только до
+    предыдущего полного года; следующий сбор продолжает с него.
+    """
+    start, end = requested_range(start_date, end_date)
+    coverage = current_coverage(source, query)
+    papers = []
+    reached = {}
+    for date_from, date_until, direction in plan_gaps(coverage, start, end):
+        years = range(date_from.year, date_until.year + 1)
+        pages = 0
+        for year in years if direction == 'forward' else reversed(years):
+            offset = 0
+            while pages < HARVEST_MAX_PAGES:
+                raise_if_cancelled()
+                pages += 1
+                response = http_get(
+                    f"{SEMANTIC_SCHOLAR_SEARCH_URL}?query={urllib.parse.quote(query)}"
+                    f"&year={year}&offset={offset}&limit={SEMANTIC_SCHOLAR_PAGE_LIMIT}&fields={fields}"
+                )
+                if response.status_code == 429:
+                    raise RateLimited(f"Semantic Scholar rate limit for '{query}'")
+                payload = response.json()
+                papers.extend(payload.get('data', []))
+                if 'next' not in payload:
+                    break
+                offset = payload['next']
+            else:
+                # Год выбран не полностью: покрытие заканчивается на предыдущем
+                if direction == 'forward':
+                    reached[direction] = max(date(year, 1, 1), date_from)
+                else:
+                    reached[direction] = min(date(year, 12, 31), date_until)
+                break
+    merge_coverage(source, query, coverage, start, end, reached)
+    return papers
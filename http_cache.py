@@ -0,0 +1,163 @@
+"""Дисковый кэш HTTP-ответов внешних API (Crossref, Semantic Scholar)"""
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Режим кэша: on - обычный, off - не использовать, offline - отвечать только из кэша
+HTTP_CACHE_MODE = os.environ.get('HTTP_CACHE_MODE', 'on').lower()
+HTTP_CACHE_FILE = os.environ.get('HTTP_CACHE_FILE', 'data/http_cache.sqlite')
+# Время жизни записи без повторной проверки, в секундах
+HTTP_CACHE_TTL = int(os.environ.get('HTTP_CACHE_TTL', 12 * 3600))
+# Предельный суммарный размер тел ответов в кэше
+HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# Заголовки, которые имеет смысл хранить вместе с телом
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class OfflineCacheMiss(Exception):
+    """Запрошенного URL нет в кэше, а сеть в офлайн-режиме не используется"""
+
+
+def normalize_url(url):
+    """Ключ кэша: схема и хост в нижнем регистре, параметры отсортированы, без фрагмента"""
+    parts = urllib.parse.urlsplit(url)
+    netloc = parts.hostname or ''
+    if parts.port and (parts.scheme, parts.port) not in (('http', 80), ('https', 443)):
+        netloc = f"{netloc}:{parts.port}"
+    query = urllib.parse.urlencode(
+        sorted(urllib.parse.parse_qsl(parts.query, keep_blank_values=True)),
+        quote_via=urllib.parse.quote
+    )
+    return urllib.parse.urlunsplit((parts.scheme.lower(), netloc.lower(), parts.path or '/', query, ''))
+
+
+class CachedEntry:
+    """Запись кэша с тем, что нужно для повторной проверки"""
+
+    def __init__(self, url, status, headers, body, fetched_at):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.fetched_at = fetched_at
+
+    def is_fresh(self, ttl):
+        return time.time() - self.fetched_at < ttl
+
+    def conditional_headers(self):
+        """Заголовки условного запроса, если API прислал валидаторы"""
+        headers = {}
+        if self.headers.get('ETag'):
+            headers['If-None-Match'] = self.headers['ETag']
+        if self.headers.get('Last-Modified'):
+            headers['If-Modified-Since'] = self.headers['Last-Modified']
+        return headers
+
+    def to_response(self):
+        """Восстанавливает requests.Response из записи"""
+        response = requests.Response()
+        response.status_code = self.status
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.headers['X-Cache'] = 'HIT'
+        response._content = self.body
+        response.encoding = 'utf-8'
+        return response
+
+
+class ResponseCache:
+    """Кэш на SQLite с TTL и вытеснением давно не использованных записей по размеру"""
+
+    def __init__(self, path, ttl, max_bytes):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    headers TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                'SELECT url, status, headers, body, fetched_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            conn.commit()
+        url, status, headers, body, fetched_at = row
+        return CachedEntry(url, status, _decode_headers(headers), body, fetched_at)
+
+    def put(self, key, response):
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        body = response.content
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, response.url or key, response.status_code, _encode_headers(headers), body, len(body), now, now)
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def touch(self, key):
+        """Продлевает свежесть записи после ответа 304"""
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            conn.execute('UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?', (now, now, key))
+            conn.commit()
+
+    def _evict(self, conn):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Освобождаем место с запасом, чтобы не чистить кэш на каждой записи
+        target = self.max_bytes * 0.9
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall():
+            if total <= target:
+                break
+            conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+
+
+def _encode_headers(headers):
+    return '\n'.join(f"{name}: {value}" for name, value in headers.items())
+
+
+def _decode_headers(text):
+    headers = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(': ')
+        headers[name] = value
+    return headers
+
+
+response_cache = ResponseCache(HTTP_CACHE_FILE, HTTP_CACHE_TTL, HTTP_CACHE_MAX_BYTES)
@@ -0,0 +1,306 @@
+"""Общий HTTP-клиент для сбора статей: пул keep-alive соединений и ограничение частоты запросов по хостам"""
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import http_cache
+import jobs
+import metrics
+from jobs import raise_if_cancelled, run_in_context
+
+# Число одновременных запросов при сборе статей (1 - последовательный режим)
+HARVEST_WORKERS = int(os.environ.get('HARVEST_WORKERS', 8))
+
+USER_AGENT = 'ScientificArticlesGraph/1.0'
+# Ключ Semantic Scholar: запросы идут с ним в выделенной квоте, а не в общей
+SEMANTIC_SCHOLAR_API_KEY = os.environ.get('SEMANTIC_SCHOLAR_API_KEY', '')
+# Адрес для "вежливого" пула Crossref и токен Crossref Plus
+CROSSREF_MAILTO = os.environ.get('CROSSREF_MAILTO', '')
+CROSSREF_PLUS_TOKEN = os.environ.get('CROSSREF_PLUS_TOKEN', '')
+
+# Начальный предел запросов в секунду и допустимая пачка запросов подряд по хостам;
+# предел Crossref дальше подстраивается под его заголовки X-Rate-Limit-*
+HOST_RATE_LIMITS = {
+    'api.crossref.org': (float(os.environ.get('CROSSREF_RATE_LIMIT', 5)), 5),
+    'api.semanticscholar.org': (
+        float(os.environ.get('SEMANTIC_SCHOLAR_RATE_LIMIT', 1.0 if SEMANTIC_SCHOLAR_API_KEY else 0.5)), 1
+    ),
+}
+DEFAULT_RATE_LIMIT = (2.0, 1)
+
+# Повторы при 429, 5xx и сетевых ошибках: экспоненциальная пауза со случайным разбросом
+HTTP_MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 4))
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 60.0
+# Retry-After длиннее этого не ждем: запрос считается неудачным, а диапазон соберется в следующий раз
+MAX_RETRY_AFTER = 300.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# После 429 предел хоста делится пополам, затем с каждым успешным ответом
+# растет на эту долю потолка, но не опускается ниже MIN_RATE_FRACTION потолка
+RATE_RECOVERY_STEP = 0.05
+MIN_RATE_FRACTION = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+class HostLimit:
+    """Состояние ограничителя одного хоста (алгоритм GCRA - эквивалент token bucket)"""
+
+    def __init__(self, rate, burst):
+        self.ceiling = rate
+        self.rate = rate
+        self.burst = burst
+        self.theoretical_arrival = 0.0
+        self.blocked_until = 0.0
+
+
+class HostThrottle:
+    """Token bucket на каждый хост с адаптацией предела по ответам API.
+
+    rate - запросов в секунду (0 - без ограничения), burst - сколько запросов
+    можно отправить подряд после простоя.
+    """
+
+    def __init__(self, limits, default_limit):
+        self.limits = limits
+        self.default_limit = default_limit
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _host(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostLimit(*self.limits.get(host, self.default_limit))
+        return state
+
+    def set_limit(self, host, rate, burst=1):
+        with self._lock:
+            self._hosts[host] = HostLimit(rate, burst)
+
+    def wait(self, host):
+        """Блокирует поток до своего слота для хоста"""
+        with self._lock:
+            state = self._host(host)
+            now = time.monotonic()
+            if state.rate <= 0:
+                slot = max(now, state.blocked_until)
+            else:
+                interval = 1 / state.rate
+                arrival = max(now, state.theoretical_arrival, state.blocked_until)
+                slot = max(now, state.blocked_until, arrival - (state.burst - 1) * interval)
+                state.theoretical_arrival = arrival + interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            metrics.throttle_wait_seconds.inc(delay, host=host)
+            jobs.sleep(delay)
+
+    def penalize(self, host, seconds):
+        """Откладывает все следующие запросы к хосту и вдвое снижает его предел"""
+        with self._lock:
+            state = self._host(host)
+            state.blocked_until = max(state.blocked_until, time.monotonic() + seconds)
+            if state.rate > 0:
+                state.rate = max(state.ceiling * MIN_RATE_FRACTION, state.rate / 2)
+
+    def observe(self, host, response):
+        """Поднимает предел после успешного ответа; учитывает объявленный API предел"""
+        advertised = advertised_rate(response.headers)
+        with self._lock:
+            state = self._host(host)
+            if state.rate <= 0:
+                return
+            if advertised:
+                state.ceiling = advertised
+                state.rate = min(state.rate, advertised)
+            state.rate = min(state.ceiling, state.rate + state.ceiling * RATE_RECOVERY_STEP)
+
+
+def advertised_rate(headers):
+    """Предел из X-Rate-Limit-Limit / X-Rate-Limit-Interval (Crossref), запросов в секунду"""
+    limit = headers.get('X-Rate-Limit-Limit')
+    interval = headers.get('X-Rate-Limit-Interval', '1s')
+    try:
+        seconds = float(interval[:-1]) if interval.endswith('s') else float(interval)
+        return float(limit) / seconds if limit and seconds > 0 else None
+    except ValueError:
+        return None
+
+
+def retry_after(headers):
+    """Пауза из Retry-After (секунды или HTTP-дата), None если заголовка нет"""
+    value = headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff(attempt):
+    """Экспоненциальная пауза перед повтором attempt (с 0) с полным случайным разбросом"""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+
+
+def identification_headers(host):
+    """Заголовки, по которым API относит запросы к ключу или вежливому пулу"""
+    headers = {}
+    if host == 'api.semanticscholar.org' and SEMANTIC_SCHOLAR_API_KEY:
+        headers['x-api-key'] = SEMANTIC_SCHOLAR_API_KEY
+    if host == 'api.crossref.org':
+        if CROSSREF_MAILTO:
+            headers['User-Agent'] = f"{USER_AGENT} (mailto:{CROSSREF_MAILTO})"
+        if CROSSREF_PLUS_TOKEN:
+            headers['Crossref-Plus-API-Token'] = f"Bearer {CROSSREF_PLUS_TOKEN}"
+    return headers
+
+
+throttle = HostThrottle(HOST_RATE_LIMITS, DEFAULT_RATE_LIMIT)
+
+session = requests.Session()
+session.headers['User-Agent'] = USER_AGENT
+_adapter = HTTPAdapter(pool_connections=len(HOST_RATE_LIMITS) + 2, pool_maxsize=max(HARVEST_WORKERS, 1))
+session.mount('https://', _adapter)
+session.mount('http://', _adapter)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def is_parallel():
+    """Включен ли параллельный режим сбора"""
+    return HARVEST_WORKERS > 1
+
+
+def get_executor():
+    """Общий пул потоков для запросов к API"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=HARVEST_WORKERS, thread_name_prefix='harvest')
+        return _executor
+
+
+def http_get(url, timeout=30):
+    """GET-запрос через общую сессию с учетом лимита хоста и дискового кэша"""
+    mode = http_cache.HTTP_CACHE_MODE
+    cache = http_cache.response_cache
+    key = http_cache.normalize_url(url)
+    entry = cache.get(key) if mode != 'off' else None
+
+    if mode == 'offline':
+        if entry is None:
+            raise http_cache.OfflineCacheMiss(f"Not in cache: {url}")
+        metrics.http_cache_lookups.inc(result='hit')
+        return entry.to_response()
+    if entry is not None and entry.is_fresh(cache.ttl):
+        metrics.http_cache_lookups.inc(result='hit')
+        return entry.to_response()
+
+    host = urllib.parse.urlsplit(url).hostname
+    headers = entry.conditional_headers() if entry is not None else {}
+    response = _send('GET', host, url, headers=headers, timeout=timeout)
+
+    if response.status_code == 304 and entry is not None:
+        metrics.http_cache_lookups.inc(result='revalidated')
+        cache.touch(key)
+        return entry.to_response()
+    if mode != 'off':
+        metrics.http_cache_lookups.inc(result='miss')
+    if response.status_code == 200 and mode != 'off':
+        cache.put(key, response)
+    return response
+
+
+def http_post(url, payload, timeout=60):
+    """POST-запрос с JSON через общую сессию с учетом лимита хоста; ответы не кэшируются"""
+    if http_cache.HTTP_CACHE_MODE == 'offline':
+        raise http_cache.OfflineCacheMiss(f"POST is not available offline: {url}")
+    return _send('POST', urllib.parse.urlsplit(url).hostname, url, json=payload, timeout=timeout)
+
+
+def _send(method, host, url, headers=None, **kwargs):
+    """Запрос через общую сессию в свой слот хоста с повторами при 429, 5xx и сетевых ошибках.
+
+    Возвращает последний ответ, если повторы не помогли; сетевая ошибка после
+    последней попытки пробрасывается.
+    """
+    headers = dict(identification_headers(host), **(headers or {}))
+    source = metrics.source_label()
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        raise_if_cancelled()
+        throttle.wait(host)
+        raise_if_cancelled()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, url, headers=headers, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.http_requests.inc(host=host, source=source, method=method, status='error')
+            if attempt == HTTP_MAX_RETRIES:
+                raise
+            delay = backoff(attempt)
+            logger.warning("%s %s failed (%s), retrying in %.1f s", method, url, e, delay)
+            metrics.http_retries.inc(host=host, reason='error')
+            jobs.sleep(delay)
+            continue
+        metrics.http_request_seconds.observe(time.perf_counter() - started, host=host)
+        metrics.http_requests.inc(host=host, source=source, method=method, status=response.status_code)
+        metrics.http_response_bytes.inc(len(response.content), host=host, source=source)
+        if response.status_code not in RETRY_STATUSES:
+            throttle.observe(host, response)
+            return response
+
+        delay = retry_after(response.headers)
+        if response.status_code == 429:
+            metrics.rate_limited.inc(host=host)
+        if delay is None:
+            delay = backoff(attempt)
+        if attempt == HTTP_MAX_RETRIES or delay > MAX_RETRY_AFTER:
+            logger.warning("%s %s failed with status %d after %d attempts", method, url, response.status_code,
+                           attempt + 1)
+            return response
+        logger.info("%s %s returned %d, retrying in %.1f s", method, url, response.status_code, delay)
+        metrics.http_retries.inc(host=host, reason=str(response.status_code))
+        if response.status_code == 429:
+            # Пауза действует на все потоки, обращающиеся к хосту
+            throttle.penalize(host, delay)
+        else:
+            jobs.sleep(delay)
+    return response
+
+
+def _call_or_error(func, item):
+    try:
+        return func(item)
+    except Exception as e:
+        return e
+
+
+def map_parallel(func, items):
+    """Вызывает func для каждого элемента в общем пуле; результаты (значение или исключение) идут в порядке items"""
+    call = lambda item: _call_or_error(func, item)
+    if not is_parallel():
+        return [call(item) for item in items]
+    return list(run_in_context(get_executor(), call, items))
+
+
+def get_many(urls):
+    """Загружает список URL; результаты (ответ или исключение) идут в порядке URL"""
+    return map_parallel(http_get, urls)
@@ -0,0 +1,182 @@
+"""Каноническая идентичность статей: нормализованный DOI и отпечаток заголовка с MinHash/LSH"""
+import hashlib
+import html
+import os
+import random
+import re
+import zlib
+
+import numpy as np
+
+# Минимальное сходство (Жаккар по 4-граммам символов) заголовков дубликатов
+TITLE_SIMILARITY = float(os.environ.get('TITLE_SIMILARITY', 0.9))
+# Заголовки короче этого слишком общие для сравнения ("Editorial", "Introduction")
+MIN_TITLE_LENGTH = 20
+
+SHINGLE_SIZE = 4
+# MinHash из BANDS * ROWS хэшей; кандидаты - совпадение хотя бы одной полосы
+BANDS = 8
+ROWS = 4
+# Хэши 32-битные, поэтому a * x + b помещается в uint64
+_PRIME = (1 << 31) - 1
+_rng = random.Random(20240601)
+_A = np.array([_rng.randrange(1, _PRIME) for _ in range(BANDS * ROWS)], dtype=np.uint64)
+_B = np.array([_rng.randrange(0, _PRIME) for _ in range(BANDS * ROWS)], dtype=np.uint64)
+
+_DOI_PREFIX = re.compile(r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)', re.IGNORECASE)
+_TAG = re.compile(r'<[^>]+>')
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def normalize_doi(doi):
+    """DOI без префиксов resolver-а, в нижнем регистре; '' если DOI нет"""
+    return _DOI_PREFIX.sub('', (doi or '').strip()).strip().lower()
+
+
+def normalize_title(title):
+    """Заголовок без разметки, пунктуации и регистра"""
+    text = html.unescape(_TAG.sub(' ', title or ''))
+    return ' '.join(_NON_WORD.sub(' ', text.lower()).split())
+
+
+def title_fingerprint(title):
+    """Стабильный между запусками отпечаток заголовка (вместо hash(title))"""
+    return hashlib.sha1(normalize_title(title).encode('utf-8')).hexdigest()[:16]
+
+
+def shingles(title):
+    """Множество хэшей 4-грамм символов нормализованного заголовка"""
+    text = normalize_title(title)
+    if len(text) < MIN_TITLE_LENGTH:
+        return set()
+    return {zlib.crc32(text[k:k + SHINGLE_SIZE].encode('utf-8')) for k in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def similarity(shingles1, shingles2):
+    if not shingles1 or not shingles2:
+        return 0.0
+    return len(shingles1 & shingles2) / len(shingles1 | shingles2)
+
+
+def lsh_keys(title_shingles):
+    """Ключи LSH-корзин заголовка: по одному на полосу MinHash-сигнатуры"""
+    if not title_shingles:
+        return []
+    values = np.fromiter(title_shingles, dtype=np.uint64, count=len(title_shingles)) % _PRIME
+    signature = ((_A[:, None] * values[None, :] + _B[:, None]) % _PRIME).min(axis=1)
+    return [
+        f"{band}:{hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(), digest_size=8).hexdigest()}"
+        for band in range(BANDS)
+    ]
+
+
+def identity_keys(article):
+    """Ключи для поиска дубликатов: ('doi', DOI) и ('lsh', корзина заголовка)"""
+    keys = []
+    doi = normalize_doi(article.get('doi'))
+    if doi:
+        keys.append(('doi', doi))
+    keys.extend(('lsh', key) for key in lsh_keys(shingles(article.get('title'))))
+    return keys
+
+
+def provenance(article):
+    """Откуда пришла статья: источник, исходный ID и поисковые запросы"""
+    return {
+        'source': article.get('source', 'Unknown'),
+        'id': article['id'],
+        'search_keywords': list(article.get('search_keywords', []))
+    }
+
+
+def add_provenance(article, entries):
+    """Добавляет записи происхождения, которых у статьи еще нет; возвращает True, если что-то добавлено"""
+    existing = article.setdefault('provenance', [provenance(article)])
+    known = {entry['id'] for entry in existing}
+    added = False
+    for entry in entries:
+        if entry['id'] not in known:
+            existing.append(entry)
+            known.add(entry['id'])
+            added = True
+    return added
+
+
+class Resolver:
+    """Сопоставляет статьи с уже известными: по ID, нормализованному DOI, затем по похожему заголовку.
+
+    store - модуль storage для поиска среди сохраненных статей (None - только среди
+    зарегистрированных в этом объекте). Происхождение дубликатов копится в merged.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self.known_ids = store.article_ids() if store is not None else set()
+        self.articles = {}
+        self.by_key = {}
+        self.merged = {}
+
+    def _candidates(self, keys):
+        """(id, title, doi) статей с общими ключами: сначала этого прогона, потом из базы"""
+        seen = set()
+        for key in keys:
+            for article_id in self.by_key.get(key, ()):
+                if article_id not in seen:
+                    seen.add(article_id)
+                    article = self.articles[article_id]
+                    yield article_id, article.get('title'), article.get('doi')
+        if self.store is not None:
+            for article_id, title, doi in self.store.find_identities(keys):
+                if article_id not in seen:
+                    seen.add(article_id)
+                    yield article_id, title, doi
+
+    def find(self, article):
+        """ID уже известной статьи, дубликатом которой является article, или None"""
+        if article['id'] in self.known_ids or article['id'] in self.articles:
+            return article['id']
+        keys = identity_keys(article)
+        doi = normalize_doi(article.get('doi'))
+        title_shingles = None
+        for candidate_id, title, candidate_doi in self._candidates(keys):
+            candidate_doi = normalize_doi(candidate_doi)
+            if doi and candidate_doi:
+                # Разные DOI - разные работы, даже при одинаковом заголовке (исправления, ответы)
+                if doi == candidate_doi:
+                    return candidate_id
+                continue
+            if title_shingles is None:
+                title_shingles = shingles(article.get('title'))
+            if similarity(title_shingles, shingles(title)) >= TITLE_SIMILARITY:
+                return candidate_id
+        return None
+
+    def register(self, article):
+        """Запоминает новую статью как каноническую; происхождение появляется у нее при первом слиянии"""
+        self.articles[article['id']] = article
+        for key in identity_keys(article):
+            self.by_key.setdefault(key, []).append(article['id'])
+
+    def merge(self, canonical_id, article):
+        """Дубликат article сливается в canonical_id: переносится только происхождение"""
+        if canonical_id == article['id']:
+            return
+        entries = article.get('provenance') or [provenance(article)]
+        if canonical_id in self.articles:
+            add_provenance(self.articles[canonical_id], entries)
+        self.merged.setdefault(canonical_id, []).extend(entries)
+
+    def resolve(self, article):
+        """True, если статья новая (и зарегистрирована), False - если это дубликат"""
+        canonical_id = self.find(article)
+        if canonical_id is None:
+            self.register(article)
+            return True
+        self.merge(canonical_id, article)
+        return False
+
+
+def deduplicate(articles):
+    """Сливает дубликаты в списке статей, сохраняя первую из каждой группы"""
+    resolver = Resolver()
+    return [article for article in articles if resolver.resolve(article)]
@@ -0,0 +1,263 @@
+"""Фоновые задачи (обновление статей) с прогрессом, отменой и защитой от повторного запуска.
+
+С хранилищем задач (store) состояние задачи записывается в базу, чтобы его видели и
+отменяли другие рабочие процессы сервера.
+"""
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Сколько завершенных задач помнить для /api/jobs
+JOB_HISTORY_SIZE = 50
+# Не чаще, чем раз в столько секунд, прогресс записывается в хранилище и проверяется
+# отмена из другого процесса; смена статуса и этапа записывается сразу
+JOB_SYNC_INTERVAL = 1.0
+# Активная задача записывает состояние не реже этого, даже на долгих этапах без прогресса;
+# задача, молчащая дольше JOB_STALE_SECONDS, считается оборвавшейся вместе со своим процессом
+JOB_HEARTBEAT_INTERVAL = 5.0
+JOB_STALE_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+_current_job = contextvars.ContextVar('current_job', default=None)
+
+
+class JobCancelled(Exception):
+    """Задача отменена пользователем"""
+
+
+class Job:
+    """Состояние одной фоновой задачи"""
+
+    def __init__(self, kind, key, params, store=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.params = params
+        self.status = 'queued'
+        self.stage = None
+        self.sources = OrderedDict()
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._store = store
+        self._synced_at = 0.0
+
+    @property
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def report_source(self, name, **fields):
+        with self._lock:
+            self.sources.setdefault(name, {}).update(fields)
+        self.sync()
+
+    def sync(self, force=False):
+        """Записывает состояние в хранилище задач и подхватывает отмену, запрошенную
+        через другой процесс"""
+        if self._store is None:
+            return
+        now = time.time()
+        if not force and now - self._synced_at < JOB_SYNC_INTERVAL:
+            return
+        self._synced_at = now
+        try:
+            if self._store.job_cancel_requested(self.id):
+                self.cancel_event.set()
+            self._store.save_job(self.snapshot())
+        except Exception as e:
+            # Задача не должна падать из-за записи прогресса
+            logger.warning("Could not sync job %s: %s", self.id, e)
+
+    def cancelled(self):
+        self.sync()
+        return self.cancel_event.is_set()
+
+    def snapshot(self):
+        """Состояние задачи для ответа API"""
+        with self._lock:
+            elapsed_end = self.finished_at or time.time()
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'key': self.key,
+                'params': self.params,
+                'status': self.status,
+                'stage': self.stage,
+                'sources': {name: dict(fields) for name, fields in self.sources.items()},
+                'result': self.result,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'elapsed': round(elapsed_end - self.started_at, 2) if self.started_at else None,
+                'cancel_requested': self.cancel_event.is_set()
+            }
+
+
+class JobRunner:
+    """Выполняет задачи в фоновых потоках; одна активная задача на ключ"""
+
+    def __init__(self, max_workers=2, history_size=JOB_HISTORY_SIZE, store=None):
+        """store - хранилище задач, общее для процессов (модуль storage): save_job,
+        load_job, list_jobs, request_job_cancel, job_cancel_requested"""
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.store = store
+        self._jobs = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+        self.history_size = history_size
+
+    def submit(self, kind, key, params, func):
+        """Запускает func(**params) или возвращает уже активную задачу с тем же ключом,
+        в том числе задачу другого процесса (через хранилище).
+
+        Возвращает (состояние задачи, created).
+        """
+        with self._lock:
+            existing = self._active.get(key)
+            if existing is not None and existing.active:
+                return existing.snapshot(), False
+            job = Job(kind, key, params, self.store)
+            if self.store is not None:
+                other = self.store.claim_job(job.snapshot(), JOB_STALE_SECONDS)
+                if other is not None:
+                    return other, False
+                job._synced_at = time.time()
+            self._jobs[job.id] = job
+            self._active[key] = job
+            self._trim()
+        self._executor.submit(self._run, job, func)
+        return job.snapshot(), True
+
+    def _heartbeat(self, job, stopped):
+        """Записывает состояние задачи, пока она выполняется: по записям другие процессы
+        отличают ее от задачи оборвавшегося процесса"""
+        while not stopped.wait(JOB_HEARTBEAT_INTERVAL):
+            job.sync(force=True)
+
+    def _run(self, job, func):
+        token = _current_job.set(job)
+        stopped = threading.Event()
+        if self.store is not None:
+            threading.Thread(target=self._heartbeat, args=(job, stopped), name=f'job-heartbeat-{job.id[:8]}',
+                             daemon=True).start()
+        try:
+            if job.cancelled():
+                raise JobCancelled()
+            job.status = 'running'
+            job.started_at = time.time()
+            job.sync(force=True)
+            job.result = func(**job.params)
+            job.status = 'succeeded'
+        except JobCancelled:
+            job.status = 'cancelled'
+        except Exception as e:
+            logger.exception("Job %s (%s) failed: %s", job.id, job.kind, e)
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            stopped.set()
+            job.finished_at = time.time()
+            job.sync(force=True)
+            _current_job.reset(token)
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    del self._active[job.key]
+
+    def _trim(self):
+        finished = [job_id for job_id, job in self._jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(self._jobs) - self.history_size)]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return list(self._jobs.values())
+
+    def snapshot(self, job_id):
+        """Состояние задачи этого или (через хранилище) другого процесса; None - задачи нет"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job.snapshot()
+        return self.store.load_job(job_id) if self.store is not None else None
+
+    def snapshots(self):
+        """Последние задачи всех процессов, новые первыми; задачи этого процесса - в текущем состоянии"""
+        local = {job.id: job.snapshot() for job in self.list()}
+        stored = self.store.list_jobs(self.history_size) if self.store is not None else []
+        snapshots = {snapshot['id']: snapshot for snapshot in stored}
+        snapshots.update(local)
+        return sorted(snapshots.values(), key=lambda snapshot: -snapshot['created_at'])[:self.history_size]
+
+    def cancel(self, job_id):
+        """Просит задачу остановиться; она завершится на ближайшей проверке.
+
+        Задача другого процесса отменяется через хранилище. Возвращает состояние задачи или None.
+        """
+        job = self._jobs.get(job_id)
+        if job is not None:
+            if job.active:
+                job.cancel_event.set()
+                job.sync(force=True)
+            return job.snapshot()
+        if self.store is not None and self.store.request_job_cancel(job_id):
+            return self.store.load_job(job_id)
+        return None
+
+
+def current_job():
+    """Задача, в контексте которой выполняется код, или None"""
+    return _current_job.get()
+
+
+def raise_if_cancelled():
+    """Прерывает работу, если текущую задачу отменили"""
+    job = _current_job.get()
+    if job is not None and job.cancelled():
+        raise JobCancelled()
+
+
+def sleep(seconds):
+    """Пауза, которую прерывает отмена текущей задачи"""
+    job = _current_job.get()
+    if job is None:
+        time.sleep(seconds)
+        return
+    deadline = time.monotonic() + seconds
+    while not job.cancelled():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        # Отмену из другого процесса видно только при синхронизации с хранилищем
+        job.cancel_event.wait(min(remaining, JOB_SYNC_INTERVAL) if job._store is not None else remaining)
+    raise JobCancelled()
+
+
+def set_stage(stage):
+    job = _current_job.get()
+    if job is not None:
+        job.stage = stage
+        job.sync(force=True)
+
+
+def report_source(name, **fields):
+    """Обновляет счетчики источника в прогрессе текущей задачи"""
+    job = _current_job.get()
+    if job is not None:
+        job.report_source(name, **fields)
+
+
+def run_in_context(executor, func, items):
+    """executor.map, передающий потокам контекст текущей задачи"""
+    context = contextvars.copy_context()
+    return executor.map(lambda item: context.copy().run(func, item), items)
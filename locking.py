@@ -0,0 +1,66 @@
+"""Межпроцессные блокировки на файлах (flock): одно обновление графа и одна сборка
+снимка графа на все рабочие процессы сервера"""
+import contextlib
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Без fcntl (Windows) блокировки действуют только внутри процесса
+    fcntl = None
+
+LOCK_DIR = os.environ.get('LOCK_DIR', 'data/locks')
+# Как часто повторять попытку, пока блокировку держит другой процесс
+LOCK_POLL_INTERVAL = 0.5
+
+logger = logging.getLogger(__name__)
+
+_process_locks = {}
+_process_locks_guard = threading.Lock()
+
+
+def _process_lock(name):
+    with _process_locks_guard:
+        return _process_locks.setdefault(name, threading.Lock())
+
+
+def _try_lock(lock_file):
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        return False
+
+
+@contextlib.contextmanager
+def exclusive(name, wait=time.sleep, poll_interval=LOCK_POLL_INTERVAL):
+    """Блокировка name, исключительная для всех процессов и потоков.
+
+    Пока она занята, вызывается wait(poll_interval): jobs.sleep позволяет отменить
+    ожидание вместе с задачей. Блокировка процесса, завершившегося аварийно,
+    снимается операционной системой.
+    """
+    if fcntl is None:
+        lock = _process_lock(name)
+        while not lock.acquire(blocking=False):
+            wait(poll_interval)
+        try:
+            yield
+        finally:
+            lock.release()
+        return
+
+    os.makedirs(LOCK_DIR, exist_ok=True)
+    # Каждое открытие файла - отдельная блокировка flock, в том числе для потоков одного процесса
+    with open(os.path.join(LOCK_DIR, f'{name}.lock'), 'a+') as lock_file:
+        if not _try_lock(lock_file):
+            logger.info("Waiting for lock %s...", name)
+            while not _try_lock(lock_file):
+                wait(poll_interval)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
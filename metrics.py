@@ -0,0 +1,223 @@
+"""Метрики сбора статей и API в текстовом формате Prometheus и замеры этапов запроса для Server-Timing"""
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+# Заголовок Server-Timing с этапами каждого ответа API (1 - включен)
+SERVER_TIMING = os.environ.get('SERVER_TIMING', '0') == '1'
+
+# Границы корзин гистограмм длительности, в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Источник (из sources.json), от имени которого идут запросы в текущем потоке
+current_source = contextvars.ContextVar('metrics_source', default='')
+_timings = contextvars.ContextVar('metrics_timings', default=None)
+
+
+def _label_text(names, values):
+    if not names:
+        return ''
+    pairs = (f'{name}="{_escape(str(value))}"' for name, value in zip(names, values))
+    return '{' + ','.join(pairs) + '}'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+class Metric:
+    """Семейство значений с одинаковыми именами меток"""
+
+    kind = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_label_text(self.label_names, key)} {value:g}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for k, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][k] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _render_value(self, key, state):
+        counts, total, count = state
+        names = self.label_names + ('le',)
+        lines = [
+            f"{self.name}_bucket{_label_text(names, key + (f'{bound:g}',))} {counts[k]}"
+            for k, bound in enumerate(self.buckets)
+        ]
+        lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {count}")
+        lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {total:g}")
+        lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus 0.0.4"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+# Внешние API
+http_requests = registry.add(Counter(
+    'harvest_http_requests_total', 'Requests to external APIs by host, source and status',
+    ('host', 'source', 'method', 'status')))
+http_request_seconds = registry.add(Histogram(
+    'harvest_http_request_seconds', 'Latency of requests to external APIs', ('host',)))
+http_response_bytes = registry.add(Counter(
+    'harvest_http_response_bytes_total', 'Response body bytes received from external APIs', ('host', 'source')))
+http_cache_lookups = registry.add(Counter(
+    'harvest_http_cache_total', 'HTTP cache lookups by result (hit, revalidated, miss)', ('result',)))
+throttle_wait_seconds = registry.add(Counter(
+    'harvest_throttle_wait_seconds_total', 'Time spent waiting for a per-host request slot', ('host',)))
+http_retries = registry.add(Counter(
+    'harvest_http_retries_total', 'Retried requests to external APIs by host and reason (status or error)',
+    ('host', 'reason')))
+rate_limited = registry.add(Counter(
+    'harvest_rate_limited_total', 'Responses with status 429 by host', ('host',)))
+
+# Статьи
+articles_parsed = registry.add(Counter(
+    'harvest_articles_parsed_total', 'Articles parsed from API records', ('source',)))
+articles_failed = registry.add(Counter(
+    'harvest_articles_failed_total', 'API records that could not be parsed', ('source',)))
+articles_deduplicated = registry.add(Counter(
+    'harvest_articles_deduplicated_total', 'Harvested articles by deduplication result (new, duplicate)',
+    ('source', 'result')))
+query_errors = registry.add(Counter(
+    'harvest_query_errors_total', 'Source queries skipped because of an error', ('source', 'reason')))
+
+# Граф
+graph_build_seconds = registry.add(Histogram(
+    'graph_build_seconds', 'Duration of graph construction', ('mode',)))
+graph_build_links = registry.add(Gauge(
+    'graph_build_links', 'Links produced by the last graph construction, by type', ('mode', 'type')))
+graph_build_nodes = registry.add(Gauge(
+    'graph_build_nodes', 'Nodes in the last graph construction', ('mode',)))
+graph_analytics_seconds = registry.add(Histogram(
+    'graph_analytics_seconds', 'Duration of PageRank, betweenness and community computation'))
+
+# HTTP API приложения
+api_request_seconds = registry.add(Histogram(
+    'api_request_seconds', 'Latency of API responses by endpoint and status', ('endpoint', 'status')))
+articles_request_seconds = registry.add(Histogram(
+    'api_articles_request_seconds', 'Latency of /api/articles by topic, wire format and response cache',
+    ('topic', 'format', 'cache')))
+
+
+def source_label():
+    return current_source.get() or 'none'
+
+
+@contextlib.contextmanager
+def source_context(name):
+    """Запросы внутри блока учитываются в метриках от имени источника name"""
+    token = current_source.set(name)
+    try:
+        yield
+    finally:
+        current_source.reset(token)
+
+
+def start_timings():
+    """Начинает сбор длительностей этапов для текущего запроса"""
+    _timings.set([])
+
+
+def finish_timings():
+    """Длительности этапов текущего запроса: [(name, seconds)]"""
+    timings = _timings.get()
+    _timings.set(None)
+    return timings or []
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Замеряет этап запроса для Server-Timing; вне запроса ничего не делает"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((name, time.perf_counter() - started))
+
+
+def server_timing(timings, total):
+    """Значение заголовка Server-Timing"""
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ', '.join(parts)
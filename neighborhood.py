@@ -0,0 +1,48 @@
+"""Окрестность статьи или автора: обход графа по сохраненному индексу смежности с бюджетом узлов"""
+import os
+
+# Ограничения запроса окрестности
+MAX_NEIGHBORHOOD_NODES = int(os.environ.get('MAX_NEIGHBORHOOD_NODES', 500))
+MAX_NEIGHBORHOOD_DEPTH = 3
+
+ORDERS = ('strength', 'citation_count')
+
+
+def ego_network(store, seeds, depth=1, limit=100, order='strength', types=None):
+    """Подграф из seeds и их соседей на расстоянии до depth шагов, не больше limit узлов.
+
+    На каждом шаге соседи уже выбранных узлов упорядочиваются по самой сильной связи
+    с выбранными (order='strength') или по citation_count и добираются до бюджета.
+    Узлы получают поле hop - расстояние от ближайшего seed. truncated - бюджет
+    не вместил всех кандидатов.
+    """
+    hops = {seed: 0 for seed in seeds[:limit]}
+    truncated = len(seeds) > limit
+    frontier = list(hops)
+    for hop in range(1, depth + 1):
+        if not frontier or len(hops) >= limit:
+            break
+        best = {}
+        for _, neighbor_id, _, strength in store.neighbors(frontier, types):
+            if neighbor_id not in hops:
+                best[neighbor_id] = max(best.get(neighbor_id, 0), strength or 0)
+        if order == 'citation_count':
+            counts = store.citation_counts(best)
+            ranked = sorted(best, key=lambda node_id: (-(counts.get(node_id) or 0), -best[node_id], node_id))
+        else:
+            ranked = sorted(best, key=lambda node_id: (-best[node_id], node_id))
+        room = limit - len(hops)
+        truncated = truncated or len(ranked) > room
+        frontier = ranked[:room]
+        hops.update((node_id, hop) for node_id in frontier)
+
+    nodes = [dict(node, hop=hops[node['id']]) for node in store.load_nodes(hops)]
+    links = store.links_among(hops)
+    if types:
+        links = [link for link in links if link['type'] in types]
+    return {
+        'nodes': nodes,
+        'links': links,
+        'seeds': [seed for seed in hops if hops[seed] == 0],
+        'truncated': truncated
+    }
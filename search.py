@@ -0,0 +1,94 @@
+"""Полнотекстовый поиск статей: индекс SQLite FTS5 по заголовку, аннотации, авторам и журналу.
+
+Индекс хранится в той же базе (таблица article_search, см. storage.py) и обновляется
+в одной транзакции с записью статей. Ранжирование - BM25 с весами полей, последнее
+слово запроса ищется как префикс, совпадения в фрагментах выделяются <mark>.
+
+Целые слова ищутся по индексу со стеммингом ("simulations" находит "simulation"),
+префиксы - по второму индексу без стемминга (article_prefix): в стеммированном индексе
+лежит "diffus", и префикс "diffusi" в нем ничего не нашел бы.
+"""
+import html
+import os
+import re
+
+# Поля индекса в порядке колонок таблицы и их веса в BM25
+SEARCH_FIELDS = ('title', 'abstract', 'authors', 'journal')
+SEARCH_WEIGHTS = {
+    'title': float(os.environ.get('SEARCH_TITLE_WEIGHT', 10.0)),
+    'abstract': 1.0,
+    'authors': float(os.environ.get('SEARCH_AUTHORS_WEIGHT', 5.0)),
+    'journal': 2.0
+}
+# Токенизатор со стеммингом английских слов для целых слов и токенизатор без стемминга
+# с префиксными индексами для 2 и 3 первых букв - для префиксов
+SEARCH_TOKENIZER = "porter unicode61 remove_diacritics 2"
+PREFIX_TOKENIZER = "unicode61 remove_diacritics 2"
+SEARCH_PREFIXES = '2 3'
+# Меняется вместе с полями или токенизаторами: индекс тогда перестраивается
+SEARCH_VERSION = f"2-{SEARCH_TOKENIZER}-{PREFIX_TOKENIZER}-{SEARCH_PREFIXES}"
+# Слов во фрагменте аннотации
+SNIPPET_TOKENS = 24
+# Последнее слово короче этого ищется целиком, а не как префикс
+MIN_PREFIX = 2
+
+# Маркеры совпадений из символов частной области Unicode: в тексте статей их нет,
+# поэтому фрагмент можно экранировать, а потом заменить маркеры на теги
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+_TAG = re.compile(r'<[^>]+>')
+_SPACE = re.compile(r'\s+')
+_WORD = re.compile(r'\w+')
+
+
+def plain_text(text):
+    """Текст без разметки (JATS, HTML) и повторных пробелов"""
+    return _SPACE.sub(' ', html.unescape(_TAG.sub(' ', text or ''))).strip()
+
+
+def document(node):
+    """Значения полей индекса для узла, в порядке SEARCH_FIELDS"""
+    return (
+        plain_text(node.get('title')),
+        plain_text(node.get('full_abstract') or node.get('abstract')),
+        '; '.join(node.get('authors', [])),
+        plain_text(node.get('journal'))
+    )
+
+
+def match_expression(query, prefix=True):
+    """Запрос пользователя -> (выражение FTS5 MATCH целых слов, выражение префиксов)
+    или None, если слов нет; части без слов - None.
+
+    Слова запроса обязательны все; слово с дефисом или апострофом ищется фразой,
+    слово со * на конце - как префикс. prefix=True делает префиксом и последнее
+    слово, чтобы искать по мере набора. Целые слова ищутся в article_search,
+    префиксы - в article_prefix.
+    """
+    words = (query or '').split()
+    parts, prefixes = [], []
+    for k, word in enumerate(words):
+        terms = _WORD.findall(word.lower())
+        if not terms:
+            continue
+        last = k == len(words) - 1
+        is_prefix = word.endswith('*') or (prefix and last and len(terms[-1]) >= MIN_PREFIX)
+        # Кавычки делают операторы (AND, OR, NEAR) и спецсимволы обычными словами
+        phrase = '"' + ' '.join(terms) + '"'
+        if is_prefix:
+            prefixes.append(phrase + '*')
+        else:
+            parts.append(phrase)
+    if not parts and not prefixes:
+        return None
+    return ' '.join(parts) or None, ' '.join(prefixes) or None
+
+
+def rank_function(table='article_search'):
+    """Вызов bm25() с весами полей; FTS5 возвращает ее со знаком минус (лучше - меньше)"""
+    return f'bm25({table}, ' + ', '.join(str(SEARCH_WEIGHTS[field]) for field in SEARCH_FIELDS) + ')'
+
+
+def highlighted(text):
+    """Фрагмент с маркерами совпадений -> безопасный HTML с <mark>"""
+    return html.escape(text or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
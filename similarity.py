@@ -0,0 +1,154 @@
+"""Связи по сходству заголовков и аннотаций: косинус TF-IDF векторов хэшированных слов.
+
+Вектор статьи - частоты слов, хэшированных в HASH_FEATURES признаков; он не зависит
+от остального корпуса и кэшируется в базе. IDF считается по всем векторам при
+построении связей, сходство - разреженным матричным произведением по блокам строк.
+"""
+import hashlib
+import html
+import os
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+from scipy import sparse
+
+# Связи 'similar' при построении графа (0 - выключены)
+SIMILARITY_LINKS = os.environ.get('SIMILARITY_LINKS', '1') != '0'
+# threshold - минимальный косинус, top_k - сколько самых похожих оставлять у статьи,
+# max_df - доля статей, начиная с которой слово не учитывается,
+# max_terms - сколько самых весомых слов статьи участвует в сравнении
+SIMILARITY_SETTINGS = {
+    'threshold': float(os.environ.get('SIMILARITY_THRESHOLD', 0.2)),
+    'top_k': int(os.environ.get('SIMILARITY_TOP_K', 5)),
+    'max_df': float(os.environ.get('SIMILARITY_MAX_DF', 0.5)),
+    'max_terms': int(os.environ.get('SIMILARITY_MAX_TERMS', 40))
+}
+
+HASH_FEATURES = 1 << 20
+# Строк в одном блоке произведения: ограничивает память промежуточной матрицы
+BLOCK_ROWS = 1000
+# Меняется вместе с токенизацией или хэшированием: сохраненные векторы тогда пересчитываются
+VECTORIZER_VERSION = f"1-{HASH_FEATURES}"
+
+_TAG = re.compile(r'<[^>]+>')
+_WORD = re.compile(r'[a-z][a-z0-9-]*[a-z0-9]')
+STOP_WORDS = frozenset('''
+a about above after again against all also an and any are as at be because been before being below between both
+but by can could did do does doing down during each few for from further had has have having here how however
+i if in into is it its itself just may more most no nor not of off on once only or other our out over own same
+should so some such than that the their them then there these they this those through thus to too under until
+up upon very was we were what when where which while who whom why will with within without would you
+abstract available article paper study studies results result show shows shown using used use based new
+'''.split())
+
+
+def text_fingerprint(article):
+    """Отпечаток текста, по которому строится вектор: при его изменении вектор пересчитывается"""
+    text = f"{article.get('title') or ''}\n{article.get('full_abstract') or article.get('abstract') or ''}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def tokens(text):
+    """Слова текста без разметки (JATS, HTML) и стоп-слов"""
+    text = html.unescape(_TAG.sub(' ', text or '')).lower()
+    return [word for word in _WORD.findall(text) if word not in STOP_WORDS]
+
+
+@lru_cache(maxsize=1 << 18)
+def feature(word):
+    return zlib.crc32(word.encode('utf-8')) % HASH_FEATURES
+
+
+def vectorize(article):
+    """(признаки, частоты) статьи; слова заголовка считаются дважды"""
+    title = tokens(article.get('title'))
+    counts = Counter(feature(word) for word in title * 2 + tokens(article.get('full_abstract') or article.get('abstract')))
+    features = np.fromiter(sorted(counts), dtype=np.int32, count=len(counts))
+    return features, np.array([counts[int(f)] for f in features], dtype=np.uint16)
+
+
+def vectors_for(articles, cached=None):
+    """Векторы статей по порядку и {id: (отпечаток, признаки, частоты)} для векторов,
+    которых не было в кэше cached"""
+    cached = cached or {}
+    vectors = []
+    computed = {}
+    for article in articles:
+        fingerprint = text_fingerprint(article)
+        entry = cached.get(article['id'])
+        if entry is None or entry[0] != fingerprint:
+            entry = (fingerprint,) + vectorize(article)
+            computed[article['id']] = entry
+        vectors.append(entry[1:])
+    return vectors, computed
+
+
+def tfidf_matrix(vectors, settings):
+    """Строки - L2-нормированные TF-IDF векторы, в каждой не больше max_terms слов"""
+    lengths = np.fromiter((len(features) for features, _ in vectors), dtype=np.int64, count=len(vectors))
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    if not len(vectors) or not indptr[-1]:
+        return sparse.csr_matrix((len(vectors), HASH_FEATURES), dtype=np.float32)
+    indices = np.concatenate([features for features, _ in vectors])
+    counts = np.concatenate([counts for _, counts in vectors]).astype(np.float32)
+
+    total = len(vectors)
+    document_frequency = np.bincount(indices, minlength=HASH_FEATURES)
+    idf = np.log((1 + total) / (1 + document_frequency)).astype(np.float32) + 1
+    # Слишком частые слова не различают статьи, а слова одной статьи не связывают ее ни с чем
+    idf[document_frequency > settings['max_df'] * total] = 0
+    idf[document_frequency < 2] = 0
+    data = (1 + np.log(counts)) * idf[indices]
+
+    max_terms = settings['max_terms']
+    if max_terms:
+        for row in np.nonzero(lengths > max_terms)[0]:
+            weights = data[indptr[row]:indptr[row + 1]]
+            weights[np.argpartition(weights, -max_terms)[:-max_terms]] = 0
+
+    matrix = sparse.csr_matrix((data, indices, indptr), shape=(total, HASH_FEATURES))
+    matrix.eliminate_zeros()
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags((1 / norms).astype(np.float32)).dot(matrix).tocsr()
+
+
+def similar_pairs(matrix, start=0, settings=None):
+    """(i, j, косинус) с i < j для строк i >= start и их top_k самых похожих строк.
+
+    При start > 0 (добавление статей) строка сравнивается только с предыдущими;
+    иначе - со всеми, и пара остается, если входит в top_k хотя бы одной из строк.
+    """
+    settings = settings or SIMILARITY_SETTINGS
+    threshold, top_k = settings['threshold'], settings['top_k']
+    pairs = {}
+    transposed = matrix.T.tocsc()
+    for block_start in range(start, matrix.shape[0], BLOCK_ROWS):
+        block = matrix[block_start:block_start + BLOCK_ROWS].dot(transposed).tocsr()
+        block.data[block.data < threshold] = 0
+        block.eliminate_zeros()
+        for offset in range(block.shape[0]):
+            i = block_start + offset
+            columns = block.indices[block.indptr[offset]:block.indptr[offset + 1]]
+            scores = block.data[block.indptr[offset]:block.indptr[offset + 1]]
+            keep = columns < i if start else columns != i
+            columns, scores = columns[keep], scores[keep]
+            if top_k and len(columns) > top_k:
+                best = np.argpartition(scores, -top_k)[-top_k:]
+                columns, scores = columns[best], scores[best]
+            for j, score in zip(columns.tolist(), scores.tolist()):
+                pairs[(min(i, j), max(i, j))] = score
+    return [(i, j, score) for (i, j), score in sorted(pairs.items())]
+
+
+def similar_links(ids, vectors, start=0, settings=None):
+    """Связи 'similar' между статьями ids с векторами vectors (см. similar_pairs)"""
+    settings = settings or SIMILARITY_SETTINGS
+    pairs = similar_pairs(tfidf_matrix(vectors, settings), start, settings)
+    return [
+        {'source': ids[i], 'target': ids[j], 'strength': round(score, 3), 'type': 'similar'}
+        for i, j, score in pairs
+    ]
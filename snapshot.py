@@ -0,0 +1,83 @@
+"""Снимки разобранного графа для нескольких рабочих процессов сервера.
+
+Снимок - готовый GraphIndex одной версии графа в файле graph-<версия>.pickle. Первый
+процесс, увидевший новую версию, строит индекс (чтение базы, аналитика) под
+межпроцессной блокировкой и записывает снимок атомарно: во временный файл рядом,
+затем os.replace. Остальные процессы загружают готовый файл, а не повторяют работу.
+"""
+import logging
+import os
+import pickle
+import re
+import tempfile
+
+import locking
+
+# Снимки графа на диске (1 - включены; gunicorn.conf.py включает их по умолчанию)
+GRAPH_SNAPSHOTS = os.environ.get('GRAPH_SNAPSHOTS', '0') == '1'
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', 'data/snapshots')
+# Сколько последних версий держать: процесс может еще читать предыдущую
+KEEP_SNAPSHOTS = 2
+
+_SNAPSHOT_NAME = re.compile(r'^graph-(\d+)\.pickle$')
+
+logger = logging.getLogger(__name__)
+
+
+def snapshot_path(version):
+    return os.path.join(SNAPSHOT_DIR, f"graph-{version}.pickle")
+
+
+def load(version):
+    """Снимок версии version или None, если его нет"""
+    try:
+        with open(snapshot_path(version), 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save(version, value):
+    """Записывает снимок атомарно: читатели видят либо прежний файл, либо новый целиком"""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(prefix='.graph-', suffix='.tmp', dir=SNAPSHOT_DIR)
+    try:
+        with os.fdopen(descriptor, 'wb') as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, snapshot_path(version))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def prune(keep=KEEP_SNAPSHOTS):
+    """Удаляет снимки старше keep последних версий"""
+    versions = sorted(
+        int(match.group(1)) for match in map(_SNAPSHOT_NAME.match, os.listdir(SNAPSHOT_DIR)) if match
+    )
+    for version in versions[:-keep]:
+        try:
+            os.unlink(snapshot_path(version))
+        except FileNotFoundError:
+            pass
+
+
+def load_or_build(version, build):
+    """Снимок версии version; если его нет, build() строит значение и оно сохраняется.
+
+    Сборку выполняет один процесс: остальные ждут блокировку и загружают его снимок.
+    """
+    value = load(version)
+    if value is not None:
+        return value
+    with locking.exclusive('snapshot'):
+        value = load(version)
+        if value is not None:
+            return value
+        value = build()
+        save(version, value)
+        prune()
+        logger.info("Saved graph snapshot version %s", version)
+    return value
@@ -0,0 +1,262 @@
+"""Источники статей: описываются в sources.json и собираются общим конвейером
+fetch -> parse -> normalize -> dedup -> sink"""
+import itertools
+import json
+import logging
+import os
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import abstracts
+import authorship
+import citations
+import harvest
+import identity
+import jobs
+import metrics
+from http_client import is_parallel, map_parallel
+
+SOURCES_FILE = os.environ.get('SOURCES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sources.json'))
+# Сколько статей записывать в базу за одну транзакцию
+HARVEST_BATCH_SIZE = int(os.environ.get('HARVEST_BATCH_SIZE', 500))
+
+SEMANTIC_SCHOLAR_FIELDS = 'title,abstract,url,year,venue,externalIds,citationCount,authors'
+
+logger = logging.getLogger(__name__)
+
+_sources = None
+
+
+def load_sources():
+    """Список настроенных источников в порядке из файла"""
+    global _sources
+    if _sources is None:
+        with open(SOURCES_FILE, 'r', encoding='utf-8') as f:
+            _sources = json.load(f)
+    return _sources
+
+
+def ensure_url(article):
+    """Гарантирует что у статьи есть URL"""
+    if article.get('url'):
+        return article['url']
+
+    if article.get('doi'):
+        return f"https://doi.org/{article['doi']}"
+    elif 'pubmed_' in article.get('id', ''):
+        pmid = article['id'].replace('pubmed_', '')
+        return f"https://pubmed.ncbi.nlm.nih.gov/{pmid}/"
+    elif 'arxiv_' in article.get('id', ''):
+        arxiv_id = article['id'].replace('arxiv_', '')
+        return f"https://arxiv.org/abs/{arxiv_id}"
+    elif article.get('source') == 'Crossref' and article.get('doi'):
+        return f"https://doi.org/{article['doi']}"
+    elif article.get('source') == 'Semantic Scholar' and article.get('id', '').startswith('semantic_'):
+        paper_id = article['id'].replace('semantic_', '')
+        return f"https://www.semanticscholar.org/paper/{paper_id}"
+
+    title_encoded = urllib.parse.quote(article.get('title', ''))
+    return f"https://scholar.google.com/scholar?q={title_encoded}"
+
+
+def source_keywords(source, query):
+    """Ключевые слова статьи из шаблона источника; {query} заменяется запросом"""
+    separator = source.get('keyword_separator')
+    query_terms = query.split(separator) if separator else [query]
+    keywords = []
+    for keyword in source.get('keywords', []):
+        keywords.extend(query_terms if keyword == '{query}' else [keyword])
+    return keywords
+
+
+def crossref_article(source, query, item):
+    """Запись Crossref -> статья"""
+    title = item.get('title', ['No title'])[0]
+    # Аннотации Crossref - JATS XML; в базу попадает только текст
+    abstract = abstracts.clean(item.get('abstract'))
+    published = item.get('created', {}).get('date-parts', [[None]])[0]
+    year = published[0] if published and published[0] else datetime.now().year
+    doi = item.get('DOI', '')
+
+    if source['api'] == 'crossref_journal':
+        journal = query
+    else:
+        journal = (item.get('container-title') or [source.get('default_journal', 'Unknown')])[0]
+
+    authors = []
+    orcids = {}
+    for author in item.get('author', []):
+        given = author.get('given', '')
+        family = author.get('family', '')
+        if given or family:
+            authors.append(f"{given} {family}".strip())
+            orcid = authorship.normalize_orcid(author.get('ORCID'))
+            if orcid:
+                orcids[authors[-1]] = orcid
+
+    article = {
+        'id': f"{source['id_prefix']}{doi or identity.title_fingerprint(title)}",
+        'title': title,
+        'abstract': abstracts.short(abstract),
+        'full_abstract': abstract,
+        'year': year,
+        'journal': journal,
+        'keywords': source_keywords(source, query),
+        'citation_count': max(item.get('is-referenced-by-count', 1), 1),
+        'doi': doi,
+        'published': str(year),
+        'search_keywords': [query],
+        'authors': authors or list(source.get('missing_authors', [])),
+        'source': source['name'],
+        'references': citations.crossref_references(item),
+        'url': f"https://doi.org/{doi}" if doi else f"https://scholar.google.com/scholar?q={urllib.parse.quote(title)}"
+    }
+    if orcids:
+        article['author_orcids'] = orcids
+    return article
+
+
+def semantic_scholar_article(source, query, paper):
+    """Статья Semantic Scholar -> статья"""
+    title = paper.get('title', 'No title')
+    abstract = abstracts.clean(paper.get('abstract'))
+    year = paper.get('year', datetime.now().year)
+    article = {
+        'id': f"{source['id_prefix']}{paper.get('paperId') or identity.title_fingerprint(title)}",
+        'title': title,
+        'abstract': abstracts.short(abstract),
+        'full_abstract': abstract,
+        'year': year,
+        'journal': paper.get('venue', 'Unknown'),
+        'keywords': source_keywords(source, query),
+        'citation_count': max(paper.get('citationCount', 0), 1),
+        'doi': paper.get('externalIds', {}).get('DOI', ''),
+        'published': str(year),
+        'search_keywords': [query],
+        'authors': [author['name'] for author in paper.get('authors', []) if author.get('name')],
+        'source': source['name'],
+        'url': paper.get('url', '')
+    }
+    article['url'] = ensure_url(article)
+    return article
+
+
+# api источника -> (загрузка записей по одному запросу, нормализация записи)
+ADAPTERS = {
+    'crossref_journal': (
+        lambda source, query, start_date, end_date:
+            harvest.crossref_journal(source['name'], query, start_date, end_date),
+        crossref_article
+    ),
+    'crossref_query': (
+        lambda source, query, start_date, end_date:
+            harvest.crossref_query(source['name'], query, start_date, end_date, extra_filter=source.get('filter')),
+        crossref_article
+    ),
+    'semantic_scholar': (
+        lambda source, query, start_date, end_date:
+            harvest.semantic_scholar_query(source['name'], query, SEMANTIC_SCHOLAR_FIELDS, start_date, end_date),
+        semantic_scholar_article
+    ),
+}
+
+
+def fetch(source, start_date, end_date):
+    """Записи API по каждому запросу источника: (query, items).
+
+    Запросы выполняются параллельно, результаты идут в порядке запросов;
+    запрос с ошибкой пропускается.
+    """
+    load, _ = ADAPTERS[source['api']]
+    queries = source['queries']
+    results = map_parallel(lambda query: load(source, query, start_date, end_date), queries)
+    for query, items in zip(queries, results):
+        if isinstance(items, harvest.RateLimited):
+            logger.warning("Rate limit exceeded for %s, skipping query '%s'", source['name'], query)
+            metrics.query_errors.inc(source=source['name'], reason='rate_limited')
+            continue
+        if isinstance(items, Exception):
+            logger.error("Error searching %s for '%s': %s", source['name'], query, items)
+            metrics.query_errors.inc(source=source['name'], reason='error')
+            continue
+        logger.debug("Found %d records in %s for '%s'", len(items), source['name'], query)
+        yield query, items
+
+
+def normalize(source, records):
+    """Записи API -> статьи; запись, которую не удалось разобрать, пропускается"""
+    _, parse = ADAPTERS[source['api']]
+    for query, items in records:
+        for item in items:
+            try:
+                article = parse(source, query, item)
+            except Exception as e:
+                logger.warning("Error processing %s article: %s", source['name'], e)
+                metrics.articles_failed.inc(source=source['name'])
+                continue
+            metrics.articles_parsed.inc(source=source['name'])
+            yield article
+
+
+def harvest_source(source, start_date, end_date):
+    """Статьи одного источника за диапазон дат"""
+    return normalize(source, fetch(source, start_date, end_date))
+
+
+def harvest_all(start_date, end_date, sources=None):
+    """Статьи всех источников; источники опрашиваются одновременно,
+    а статьи идут в фиксированном порядке источников, чтобы результат не зависел от потоков"""
+    harvest.reset_query_watermarks([source['name'] for source in load_sources() if source['api'] != 'crossref_journal'])
+    sources = load_sources() if sources is None else sources
+
+    def run_source(source):
+        name = source['name']
+        jobs.raise_if_cancelled()
+        jobs.report_source(name, status='running')
+        started = time.monotonic()
+        with metrics.source_context(name):
+            articles = list(harvest_source(source, start_date, end_date))
+        logger.info("Found %d articles in %s", len(articles), name)
+        jobs.report_source(name, status='done', articles=len(articles),
+                           seconds=round(time.monotonic() - started, 2))
+        return articles
+
+    if is_parallel():
+        # Вежливость к API обеспечивает лимит по хостам в http_client
+        logger.info("Searching %d sources in parallel...", len(sources))
+        with ThreadPoolExecutor(max_workers=max(len(sources), 1), thread_name_prefix='source') as executor:
+            results = list(jobs.run_in_context(executor, run_source, sources))
+    else:
+        results = []
+        for number, source in enumerate(sources, 1):
+            logger.info("%d. Searching %s...", number, source['name'])
+            results.append(run_source(source))
+    jobs.raise_if_cancelled()
+    return itertools.chain.from_iterable(results)
+
+
+def unique(articles, resolver=None):
+    """Пропускает дубликаты (по ID, DOI и похожему заголовку), сливая их происхождение в первую статью"""
+    resolver = identity.Resolver() if resolver is None else resolver
+    for article in articles:
+        source = article.get('source', 'Unknown')
+        if not resolver.resolve(article):
+            metrics.articles_deduplicated.inc(source=source, result='duplicate')
+            continue
+        metrics.articles_deduplicated.inc(source=source, result='new')
+        logger.debug("Added from %s: %s", source, article['title'][:50])
+        yield article
+
+
+def batched(articles, size=HARVEST_BATCH_SIZE):
+    """Группирует поток статей в списки по size для записи в базу"""
+    batch = []
+    for article in articles:
+        batch.append(article)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -7,8 +7,11 @@ let currentGraphData = null;
 let linkTypes = {
     authors: true,
     keywords: false,
-    citations: true
+    citations: true,
+    similar: false
 };
+// Сообщества из аналитики графа показываются одним узлом
+let collapseCommunities = false;
 
 // Инициализация при загрузке страницы
 document.addEventListener('DOMContentLoaded', function() {
@@ -78,6 +81,7 @@ function setupEventListeners() {
     const authorLinksCheckbox = document.getElementById('show-author-links');
     const keywordLinksCheckbox = document.getElementById('show-keyword-links');
     const citationLinksCheckbox = document.getElementById('show-citation-links');
+    const similarLinksCheckbox = document.getElementById('show-similar-links');
     
     if (authorLinksCheckbox) {
         authorLinksCheckbox.addEventListener('change', function() {
@@ -106,6 +110,33 @@ function setupEventListeners() {
         });
     }
     
+    if (similarLinksCheckbox) {
+        similarLinksCheckbox.addEventListener('change', function() {
+            linkTypes.similar = this.checked;
+            if (currentGraphData) {
+                renderGraph(currentGraphData);
+            }
+        });
+    }
+    
+    // Поиск по Enter; пустой запрос возвращает граф по фильтрам
+    const searchInput = document.getElementById('search-query');
+    if (searchInput) {
+        searchInput.addEventListener('keydown', function(event) {
+            if (event.key === 'Enter') {
+                searchGraph(this.value.trim());
+            }
+        });
+    }
+    
+    const collapseCheckbox = document.getElementById('collapse-communities');
+    if (collapseCheckbox) {
+        collapseCheckbox.addEventListener('change', function() {
+            collapseCommunities = this.checked;
+            updateGraph();
+        });
+    }
+    
     console.log("Event listeners setup complete");
     
     // Закрытие тултипа по клику вне его
@@ -183,11 +214,13 @@ function updateGraph() {
 
     updateStatus("Loading graph data...");
 
-    fetch(`/api/articles?topic=${topic}&start_date=${startDate}&end_date=${endDate}`)
+    const collapse = collapseCommunities ? '&collapse=communities' : '';
+    fetch(`/api/articles?topic=${topic}&start_date=${startDate}&end_date=${endDate}&format=compact&view=summary${collapse}`)
         .then(response => {
             if (!response.ok) throw new Error('Network error');
             return response.json();
         })
+        .then(decodeGraph)
         .then(data => {
             console.log("Graph data received:", data.nodes.length, "nodes");
             console.log("Links received:", data.links.length, "links");
@@ -215,6 +248,75 @@ function updateGraph() {
         });
 }
 
+// Найденные статьи (не больше SEARCH_GRAPH_SIZE лучших) и связи между ними
+const SEARCH_GRAPH_SIZE = 200;
+
+function searchGraph(query) {
+    if (!query) {
+        updateGraph();
+        return;
+    }
+    const topic = document.getElementById('topic-filter').value;
+    const startDate = document.getElementById('start-date').value;
+    const endDate = document.getElementById('end-date').value;
+    const params = new URLSearchParams({
+        q: query, topic: topic, start_date: startDate, end_date: endDate,
+        graph: '1', per_page: SEARCH_GRAPH_SIZE, format: 'compact', view: 'summary'
+    });
+
+    updateStatus(`Searching for "${query}"...`);
+    fetch(`/api/search?${params}`)
+        .then(response => {
+            if (!response.ok) throw new Error('Network error');
+            return response.json();
+        })
+        .then(data => {
+            const graph = decodeGraph(data);
+            if (graph.nodes.length === 0) {
+                updateStatus(`No articles found for "${query}"`);
+                g.selectAll("*").remove();
+                return;
+            }
+            currentGraphData = graph;
+            renderGraph(graph);
+            updateStatus(`Found ${data.total} articles for "${query}", displaying ${graph.nodes.length} with ${graph.links.length} connections`);
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            updateStatus("Search error: " + error.message);
+        });
+}
+
+// Столбец компактного формата: массив значений или словарь строк с кодами
+function decodeColumn(column) {
+    if (column && column.dictionary) {
+        return column.codes.map(code => code === null ? null : column.dictionary[code]);
+    }
+    return column;
+}
+
+function decodeRows(columns, count) {
+    const rows = Array.from({ length: count }, () => ({}));
+    Object.entries(columns).forEach(([key, column]) => {
+        decodeColumn(column).forEach((value, i) => {
+            if (value !== null) rows[i][key] = value;
+        });
+    });
+    return rows;
+}
+
+// Ответ /api/articles в формате columnar -> {nodes, links} со связями по ID узлов
+function decodeGraph(data) {
+    if (data.format !== 'columnar') return data;
+    const nodes = decodeRows(data.nodes, data.node_count);
+    const links = decodeRows(data.links, data.link_count);
+    links.forEach(link => {
+        link.source = nodes[link.source].id;
+        link.target = nodes[link.target].id;
+    });
+    return { nodes, links };
+}
+
 function updateArticlesData() {
     console.log("Update Articles button clicked");
     
@@ -245,11 +347,9 @@ function updateArticlesData() {
         })
         .then(data => {
             console.log("Update response:", data);
-            if (data.status === 'success') {
-                updateStatus(data.message + ". Updating graph...");
-                setTimeout(() => {
-                    updateGraph();
-                }, 3000);
+            if (data.job_id) {
+                // Сбор идет в фоне: опрашиваем состояние задачи
+                pollUpdateJob(data.job_id);
             } else {
                 updateStatus('Error: ' + data.message);
             }
@@ -260,6 +360,39 @@ function updateArticlesData() {
         });
 }
 
+function describeJobProgress(job) {
+    const sources = Object.entries(job.sources || {});
+    const done = sources.filter(([, info]) => info.status === 'done');
+    const found = done.reduce((sum, [, info]) => sum + (info.articles || 0), 0);
+    const stage = job.stage || job.status;
+    return `Updating articles (${stage}): ${done.length}/${sources.length || '?'} sources, ${found} found, ${job.elapsed || 0}s`;
+}
+
+function pollUpdateJob(jobId) {
+    fetch(`/api/jobs/${jobId}`)
+        .then(response => {
+            if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+            return response.json();
+        })
+        .then(job => {
+            if (job.status === 'queued' || job.status === 'running') {
+                updateStatus(describeJobProgress(job));
+                setTimeout(() => pollUpdateJob(jobId), 2000);
+            } else if (job.status === 'succeeded') {
+                updateStatus(job.result.message + ". Updating graph...");
+                updateGraph();
+            } else if (job.status === 'cancelled') {
+                updateStatus('Update cancelled');
+            } else {
+                updateStatus('Error: ' + job.error);
+            }
+        })
+        .catch(error => {
+            console.error('Error polling update job:', error);
+            updateStatus('Error updating articles: ' + error.message);
+        });
+}
+
 function calculateNodeSize(citationCount) {
     const minSize = 8;
     const maxSize = 30;
@@ -267,6 +400,43 @@ function calculateNodeSize(citationCount) {
     return minSize + (scale * 6);
 }
 
+// Радиус узла: статья - по цитированиям, свернутое сообщество - по числу статей
+function nodeRadius(d) {
+    if (d.type === 'community') {
+        return Math.min(10 + Math.log2(d.size || 1) * 4, 40);
+    }
+    return calculateNodeSize(d.citation_count || 0);
+}
+
+// Толщина связи; свернутая связь между сообществами - по числу исходных связей
+function linkWidth(d) {
+    if (d.count) {
+        return Math.min(1.5 + Math.log2(d.count), 10);
+    }
+    return Math.max(d.strength || 1, 1.5);
+}
+
+// Разворачивает свернутое сообщество: граф из его статей
+function loadCommunity(communityId) {
+    updateStatus("Loading community...");
+    fetch(`/api/communities/${communityId}?format=compact&view=summary`)
+        .then(response => {
+            if (!response.ok) throw new Error('Network error');
+            return response.json();
+        })
+        .then(data => {
+            const community = data.community || {};
+            const graph = decodeGraph(data);
+            currentGraphData = graph;
+            renderGraph(graph);
+            updateStatus(`Community "${community.label || communityId}": ${graph.nodes.length} articles with ${graph.links.length} connections`);
+        })
+        .catch(error => {
+            console.error('Error:', error);
+            updateStatus("Error loading community: " + error.message);
+        });
+}
+
 function renderGraph(graphData) {
     g.selectAll("*").remove();
 
@@ -275,16 +445,32 @@ function renderGraph(graphData) {
         if (link.type === 'authors' && linkTypes.authors) return true;
         if (link.type === 'keywords' && linkTypes.keywords) return true;
         if ((link.type === 'cites' || link.type === 'cited_by') && linkTypes.citations) return true;
+        if (link.type === 'similar' && linkTypes.similar) return true;
         return false;
     });
 
-    console.log(`Displaying ${filteredLinks.length} links (authors: ${linkTypes.authors}, keywords: ${linkTypes.keywords}, citations: ${linkTypes.citations})`);
+    console.log(`Displaying ${filteredLinks.length} links (authors: ${linkTypes.authors}, keywords: ${linkTypes.keywords}, citations: ${linkTypes.citations}, similar: ${linkTypes.similar})`);
+
+    // Серверная раскладка: узлы сразу ставятся в готовые позиции, симуляция только доводит их
+    const hasLayout = graphData.nodes.length > 0 && graphData.nodes.every(d => d.layout);
+    if (hasLayout) {
+        graphData.nodes.forEach(d => {
+            if (d.x === undefined) {
+                d.x = d.layout.x * width;
+                d.y = d.layout.y * height;
+            }
+        });
+    }
 
     simulation = d3.forceSimulation(graphData.nodes)
         .force("link", d3.forceLink(filteredLinks).id(d => d.id).distance(100))
         .force("charge", d3.forceManyBody().strength(-30))
         .force("center", d3.forceCenter(width / 2, height / 2))
-        .force("collision", d3.forceCollide().radius(d => calculateNodeSize(d.citation_count || 0) + 8));
+        .force("collision", d3.forceCollide().radius(d => nodeRadius(d) + 8));
+
+    if (hasLayout) {
+        simulation.alpha(0.1);
+    }
 
     // Рисуем связи
     const link = g.append("g")
@@ -295,23 +481,24 @@ function renderGraph(graphData) {
         .attr("stroke", d => {
             if (d.type === 'authors') return '#e74c3c';
             if (d.type === 'cites' || d.type === 'cited_by') return '#f39c12';
+            if (d.type === 'similar') return '#27ae60';
             return '#3498db';
         })
         .attr("stroke-opacity", 0.8)
-        .attr("stroke-width", d => Math.max(d.strength || 1, 1.5))
+        .attr("stroke-width", d => linkWidth(d))
         .attr("stroke-dasharray", d => d.type === 'cites' ? "5,5" : "0")
         .on("mouseover", function(event, d) {
             d3.select(this)
                 .transition()
                 .duration(200)
-                .attr("stroke-width", Math.max(d.strength || 1, 1.5) * 2)
+                .attr("stroke-width", linkWidth(d) * 2)
                 .attr("stroke-opacity", 1);
         })
         .on("mouseout", function(event, d) {
             d3.select(this)
                 .transition()
                 .duration(200)
-                .attr("stroke-width", Math.max(d.strength || 1, 1.5))
+                .attr("stroke-width", linkWidth(d))
                 .attr("stroke-opacity", 0.8);
         });
 
@@ -321,7 +508,7 @@ function renderGraph(graphData) {
         .selectAll("circle")
         .data(graphData.nodes)
         .enter().append("circle")
-        .attr("r", d => calculateNodeSize(d.citation_count || 0))
+        .attr("r", d => nodeRadius(d))
         .attr("fill", d => colorByYear(d.year || new Date().getFullYear()))
         .attr("stroke", "#2c3e50")
         .attr("stroke-width", 2)
@@ -331,19 +518,23 @@ function renderGraph(graphData) {
                 .transition()
                 .duration(200)
                 .attr("stroke-width", 4)
-                .attr("r", calculateNodeSize(d.citation_count || 0) + 3);
+                .attr("r", nodeRadius(d) + 3);
         })
         .on("mouseout", function(event, d) {
             d3.select(this)
                 .transition()
                 .duration(200)
                 .attr("stroke-width", 2)
-                .attr("r", calculateNodeSize(d.citation_count || 0));
+                .attr("r", nodeRadius(d));
         })
         .on("click", function(event, d) {
             console.log("Node clicked:", d);
             event.stopPropagation();
-            showTooltip(event, d);
+            if (d.type === 'community') {
+                loadCommunity(d.community);
+                return;
+            }
+            showArticle(event, d);
         });
 
     // Добавляем подписи
@@ -356,7 +547,7 @@ function renderGraph(graphData) {
             const title = d.title || 'No title';
             const shortTitle = title.length > 20 ? title.substring(0, 20) + "..." : title;
             
-            const authors = Array.isArray(d.authors) ? d.authors : [];
+            const authors = Array.isArray(d.authors) ? d.authors : (d.first_author ? [d.first_author] : []);
             let authorText = '';
             if (authors.length > 0) {
                 const firstAuthor = authors[0];
@@ -417,6 +608,9 @@ function addLegend() {
     if (linkTypes.keywords) {
         legendItems.push({ color: "#3498db", text: "Common keywords" });
     }
+    if (linkTypes.similar) {
+        legendItems.push({ color: "#27ae60", text: "Similar abstracts" });
+    }
 
     legendItems.forEach((item, i) => {
         const legendItem = legend.append("g")
@@ -441,6 +635,29 @@ function addLegend() {
     });
 }
 
+// Облегченный граф (view=summary) не содержит аннотации, авторов и ключевых слов:
+// они загружаются по клику и кэшируются браузером (Cache-Control ответа)
+function showArticle(event, d) {
+    if (Array.isArray(d.authors)) {
+        showTooltip(event, d);
+        return;
+    }
+    fetch(`/api/articles/${encodeURIComponent(d.id)}`)
+        .then(response => {
+            if (!response.ok) throw new Error('Network error');
+            return response.json();
+        })
+        .then(details => showTooltip(event, Object.assign({}, d, details)))
+        .catch(error => {
+            console.error('Error:', error);
+            updateStatus("Error loading article: " + error.message);
+        });
+}
+
+function escapeHtml(text) {
+    return String(text).replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;').replace(/"/g, '&quot;');
+}
+
 function showTooltip(event, d) {
     console.log("showTooltip called for:", d);
     const tooltip = document.getElementById("tooltip");
@@ -490,8 +707,8 @@ function showTooltip(event, d) {
         </div>
         <div class="abstract-section">
             <strong>Abstract:</strong> 
-            <div class="abstract-content" data-full-abstract="${abstract.replace(/"/g, '&quot;')}">
-                ${abstract}
+            <div class="abstract-content" data-full-abstract="${escapeHtml(abstract)}">
+                ${escapeHtml(abstract)}
             </div>
         </div>
         <div class="keywords">
@@ -0,0 +1,1165 @@
+"""Хранилище статей и связей на SQLite"""
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+import abstracts
+import authorship
+import identity
+import search
+import similarity
+import topics
+
+DATABASE_FILE = os.environ.get('DATABASE_FILE', 'data/articles.sqlite')
+# Прежний формат хранения, переносится в базу один раз
+LEGACY_JSON_FILE = 'data/articles.json'
+
+# Поля узла, хранящиеся в отдельных колонках; остальное уходит в extra
+NODE_COLUMNS = ('id', 'title', 'full_abstract', 'year', 'journal', 'citation_count', 'source', 'url')
+LINK_COLUMNS = ('source', 'target', 'type', 'strength')
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS articles (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    title TEXT,
+    full_abstract TEXT,
+    year INTEGER,
+    journal TEXT,
+    citation_count INTEGER,
+    source TEXT,
+    url TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS articles_position ON articles (position);
+CREATE INDEX IF NOT EXISTS articles_year ON articles (year);
+CREATE INDEX IF NOT EXISTS articles_source ON articles (source);
+CREATE INDEX IF NOT EXISTS articles_citation_count ON articles (citation_count);
+
+-- Указатель авторов: key - ключ имени (authorship.name_key), orcid - ORCID или NULL
+CREATE TABLE IF NOT EXISTS article_authors (
+    article_id TEXT NOT NULL REFERENCES articles (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    orcid TEXT,
+    PRIMARY KEY (article_id, position)
+);
+CREATE INDEX IF NOT EXISTS article_authors_key ON article_authors (key);
+
+CREATE TABLE IF NOT EXISTS article_keywords (
+    article_id TEXT NOT NULL REFERENCES articles (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    keyword TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (article_id, kind, position)
+);
+CREATE INDEX IF NOT EXISTS article_keywords_key ON article_keywords (key);
+
+CREATE TABLE IF NOT EXISTS article_topics (
+    article_id TEXT NOT NULL REFERENCES articles (id) ON DELETE CASCADE,
+    topic TEXT NOT NULL,
+    PRIMARY KEY (article_id, topic)
+);
+CREATE INDEX IF NOT EXISTS article_topics_topic ON article_topics (topic);
+
+-- Ключи поиска дубликатов: нормализованный DOI и LSH-корзины заголовка
+CREATE TABLE IF NOT EXISTS article_identity (
+    article_id TEXT NOT NULL REFERENCES articles (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    PRIMARY KEY (article_id, kind, key)
+);
+CREATE INDEX IF NOT EXISTS article_identity_key ON article_identity (key);
+
+-- Разрешенные списки литературы (DOI) - кэш, который переживает перестройку графа
+CREATE TABLE IF NOT EXISTS article_references (
+    article_id TEXT NOT NULL,
+    ref_doi TEXT NOT NULL,
+    PRIMARY KEY (article_id, ref_doi)
+);
+CREATE INDEX IF NOT EXISTS article_references_doi ON article_references (ref_doi);
+
+-- Векторы слов статей для связей по сходству (см. similarity.py) - кэш, который переживает перестройку графа
+CREATE TABLE IF NOT EXISTS article_vectors (
+    article_id TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    features BLOB NOT NULL,
+    counts BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS reference_status (
+    article_id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    resolved_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS links (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    type TEXT NOT NULL,
+    strength NUMERIC,
+    extra TEXT
+);
+-- Индекс смежности в обе стороны: соседи узла читаются без обращения к самой таблице
+DROP INDEX IF EXISTS links_source;
+DROP INDEX IF EXISTS links_target;
+CREATE INDEX IF NOT EXISTS links_out ON links (source, type, strength, target);
+CREATE INDEX IF NOT EXISTS links_in ON links (target, type, strength, source);
+CREATE INDEX IF NOT EXISTS links_type ON links (type);
+
+CREATE TABLE IF NOT EXISTS node_layout (
+    article_id TEXT PRIMARY KEY REFERENCES articles (id) ON DELETE CASCADE,
+    x REAL NOT NULL,
+    y REAL NOT NULL
+);
+
+-- Метрики узлов и сообщества (см. analytics.py) для версии графа из meta 'analytics'
+CREATE TABLE IF NOT EXISTS node_analytics (
+    article_id TEXT PRIMARY KEY REFERENCES articles (id) ON DELETE CASCADE,
+    pagerank REAL NOT NULL,
+    degree INTEGER NOT NULL,
+    betweenness REAL NOT NULL,
+    community INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS node_analytics_community ON node_analytics (community);
+
+CREATE TABLE IF NOT EXISTS communities (
+    id INTEGER PRIMARY KEY,
+    size INTEGER NOT NULL,
+    label TEXT,
+    pagerank REAL NOT NULL,
+    extra TEXT
+);
+
+-- Покрытые интервалы дат по источнику и запросу для инкрементального сбора
+CREATE TABLE IF NOT EXISTS watermarks (
+    source TEXT NOT NULL,
+    query TEXT NOT NULL,
+    covered_from TEXT NOT NULL,
+    covered_until TEXT NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, query)
+);
+
+-- Состояние фоновых задач (jobs.py), общее для рабочих процессов сервера
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    snapshot TEXT NOT NULL,
+    key TEXT,
+    heartbeat REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+'''
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def get_connection():
+    """Соединение текущего потока; схема и миграция выполняются при первом обращении"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != DATABASE_FILE:
+        os.makedirs(os.path.dirname(DATABASE_FILE) or '.', exist_ok=True)
+        conn = sqlite3.connect(DATABASE_FILE, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        _local.conn = conn
+        _local.path = DATABASE_FILE
+        with _init_lock:
+            if DATABASE_FILE not in _initialized:
+                conn.executescript(SCHEMA)
+                refresh_search(conn)
+                refresh_authors(conn)
+                refresh_jobs(conn)
+                migrate_json(conn)
+                refresh_abstracts(conn)
+                refresh_topics(conn)
+                refresh_identity(conn)
+                refresh_vectors(conn)
+                _initialized.add(DATABASE_FILE)
+    return conn
+
+
+def close_connection():
+    """Закрывает соединение текущего потока; перед fork, чтобы процессы не делили его"""
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def migrate_json(conn, path=LEGACY_JSON_FILE):
+    """Однократно переносит граф из data/articles.json в пустую базу"""
+    if not os.path.exists(path):
+        return False
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_json'").fetchone():
+        return False
+    if conn.execute('SELECT 1 FROM articles LIMIT 1').fetchone():
+        return False
+
+    logger.info("Migrating %s into %s...", path, DATABASE_FILE)
+    with open(path, 'r', encoding='utf-8') as f:
+        graph = json.load(f)
+    with conn:
+        _insert_graph(conn, graph, 0)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('migrated_json', ?)", (path,))
+        _bump_version(conn)
+    logger.info("Migrated %d nodes, %d links", len(graph.get('nodes', [])), len(graph.get('links', [])))
+    return True
+
+
+def refresh_abstracts(conn):
+    """Очищает от разметки аннотации, сохраненные до очистки при сборе, и убирает
+    прежнюю колонку короткой аннотации: она получается из полной"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'abstracts'").fetchone()
+    if row and row[0] == abstracts.ABSTRACTS_VERSION:
+        return
+    columns = {column[1] for column in conn.execute('PRAGMA table_info(articles)')}
+    source = 'COALESCE(full_abstract, abstract)' if 'abstract' in columns else 'full_abstract'
+    rows = conn.execute(f'SELECT id, {source} FROM articles').fetchall()
+    logger.info("Cleaning abstracts of %d articles...", len(rows))
+    with conn:
+        conn.executemany('UPDATE articles SET full_abstract = ? WHERE id = ?',
+                         [(abstracts.clean(text), article_id) for article_id, text in rows])
+        if 'abstract' in columns:
+            try:
+                conn.execute('ALTER TABLE articles DROP COLUMN abstract')
+            except sqlite3.OperationalError:
+                # SQLite до 3.35 не удаляет колонки
+                conn.execute('UPDATE articles SET abstract = NULL')
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('abstracts', ?)", (abstracts.ABSTRACTS_VERSION,))
+        if rows:
+            _bump_version(conn)
+
+
+def _node_row(node, position):
+    # Короткая аннотация не хранится: это начало полной
+    extra = {key: value for key, value in node.items()
+             if key not in NODE_COLUMNS and key not in ('abstract', 'authors', 'keywords', 'search_keywords')}
+    return (node['id'], position) + tuple(node.get(column) for column in NODE_COLUMNS[1:]) + (
+        json.dumps(extra, ensure_ascii=False) if extra else None,
+    )
+
+
+def _link_row(link):
+    extra = {key: value for key, value in link.items() if key not in LINK_COLUMNS}
+    return tuple(link.get(column) for column in LINK_COLUMNS) + (
+        json.dumps(extra, ensure_ascii=False) if extra else None,
+    )
+
+
+def _insert_graph(conn, graph, first_position):
+    """Вставляет узлы (с авторами и ключевыми словами) и связи; вызывается внутри транзакции"""
+    nodes = graph.get('nodes', [])
+    # Замена статьи меняет ее rowid: прежняя строка поискового индекса удаляется заранее.
+    # Индекс префиксов хранит текст в article_search, поэтому удаляется первым, с прежним текстом
+    conn.executemany(
+        f"INSERT INTO article_prefix (article_prefix, rowid, {', '.join(search.SEARCH_FIELDS)}) "
+        f"SELECT 'delete', rowid, {', '.join(search.SEARCH_FIELDS)} FROM article_search "
+        f"WHERE rowid = (SELECT rowid FROM articles WHERE id = ?)",
+        [(node['id'],) for node in nodes]
+    )
+    conn.executemany(
+        'DELETE FROM article_search WHERE rowid = (SELECT rowid FROM articles WHERE id = ?)',
+        [(node['id'],) for node in nodes]
+    )
+    conn.executemany(
+        f"INSERT OR REPLACE INTO articles (id, position, {', '.join(NODE_COLUMNS[1:])}, extra) "
+        f"VALUES ({', '.join('?' * (len(NODE_COLUMNS) + 2))})",
+        [_node_row(node, first_position + k) for k, node in enumerate(nodes)]
+    )
+    _insert_search(conn, nodes)
+    conn.executemany('INSERT INTO article_authors VALUES (?, ?, ?, ?, ?)', _author_rows(nodes))
+    conn.executemany(
+        'INSERT INTO article_keywords VALUES (?, ?, ?, ?, ?)',
+        [(node['id'], kind, k, keyword, keyword.lower())
+         for node in nodes
+         for kind in ('keywords', 'search_keywords')
+         for k, keyword in enumerate(node.get(kind, []))]
+    )
+    conn.executemany(
+        'INSERT INTO article_topics VALUES (?, ?)',
+        [(node['id'], topic) for node in nodes for topic in topics.node_topics(node)]
+    )
+    _insert_identity(conn, nodes)
+    save_vectors(graph.get('vectors', {}), conn)
+    conn.executemany('INSERT INTO links VALUES (?, ?, ?, ?, ?)', [_link_row(link) for link in graph.get('links', [])])
+
+
+def refresh_topics(conn):
+    """Пересчитывает принадлежность статей темам, если topics.json изменился"""
+    fingerprint = topics.topics_fingerprint()
+    row = conn.execute("SELECT value FROM meta WHERE key = 'topics'").fetchone()
+    if row and row[0] == fingerprint:
+        return
+    rows = conn.execute(f'{_NODE_SELECT} ORDER BY a.position').fetchall()
+    nodes = _rows_to_nodes(conn, rows)
+    with conn:
+        conn.execute('DELETE FROM article_topics')
+        conn.executemany(
+            'INSERT INTO article_topics VALUES (?, ?)',
+            [(node['id'], topic) for node in nodes for topic in topics.node_topics(node)]
+        )
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('topics', ?)", (fingerprint,))
+        _bump_version(conn)
+
+
+def _insert_identity(conn, nodes):
+    conn.executemany(
+        'INSERT OR IGNORE INTO article_identity VALUES (?, ?, ?)',
+        [(node['id'], kind, key) for node in nodes for kind, key in identity.identity_keys(node)]
+    )
+
+
+def _author_rows(nodes):
+    rows = []
+    for node in nodes:
+        orcids = node.get('author_orcids') or {}
+        for k, author in enumerate(node.get('authors', [])):
+            rows.append((node['id'], k, author, authorship.name_key(author),
+                         authorship.normalize_orcid(orcids.get(author)) or None))
+    return rows
+
+
+def refresh_jobs(conn):
+    """Добавляет в таблицу задач прежней версии ключ и время последней записи"""
+    columns = {column[1] for column in conn.execute('PRAGMA table_info(jobs)')}
+    with conn:
+        if 'key' not in columns:
+            conn.execute('ALTER TABLE jobs ADD COLUMN key TEXT')
+        if 'heartbeat' not in columns:
+            # Активные задачи прежней версии считаются оборвавшимися
+            conn.execute('ALTER TABLE jobs ADD COLUMN heartbeat REAL NOT NULL DEFAULT 0')
+
+
+def refresh_authors(conn):
+    """Перестраивает указатель авторов, если он построен прежней нормализацией имен"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'authors'").fetchone()
+    if row and row[0] == authorship.AUTHORS_VERSION:
+        return
+    with conn:
+        # Колонки orcid нет в базах, созданных до нее
+        if 'orcid' not in {column[1] for column in conn.execute('PRAGMA table_info(article_authors)')}:
+            conn.execute('ALTER TABLE article_authors ADD COLUMN orcid TEXT')
+        nodes = {}
+        for article_id, name, extra in conn.execute(
+            'SELECT t.article_id, t.name, a.extra FROM article_authors t JOIN articles a ON a.id = t.article_id '
+            'ORDER BY t.article_id, t.position'
+        ):
+            if article_id not in nodes:
+                nodes[article_id] = {'id': article_id, 'authors': [],
+                                     'author_orcids': json.loads(extra or '{}').get('author_orcids')}
+            nodes[article_id]['authors'].append(name)
+        logger.info("Building author index for %d articles...", len(nodes))
+        conn.execute('DELETE FROM article_authors')
+        conn.executemany('INSERT INTO article_authors VALUES (?, ?, ?, ?, ?)', _author_rows(nodes.values()))
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('authors', ?)", (authorship.AUTHORS_VERSION,))
+
+
+def refresh_identity(conn):
+    """Заполняет ключи дубликатов для статей, сохраненных до их появления"""
+    if conn.execute("SELECT 1 FROM meta WHERE key = 'identity'").fetchone():
+        return
+    nodes = [{'id': article_id, 'title': title, 'doi': doi} for article_id, title, doi in conn.execute(
+        "SELECT id, title, json_extract(extra, '$.doi') FROM articles"
+    )]
+    with conn:
+        conn.execute('DELETE FROM article_identity')
+        _insert_identity(conn, nodes)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('identity', 1)")
+
+
+SEARCH_SCHEMA = (
+    f"CREATE VIRTUAL TABLE article_search USING fts5({', '.join(search.SEARCH_FIELDS)}, "
+    f"tokenize = '{search.SEARCH_TOKENIZER}')",
+    # Индекс префиксов без стемминга; текст не хранит, а читает из article_search
+    f"CREATE VIRTUAL TABLE article_prefix USING fts5({', '.join(search.SEARCH_FIELDS)}, "
+    f"tokenize = '{search.PREFIX_TOKENIZER}', prefix = '{search.SEARCH_PREFIXES}', content = 'article_search')"
+)
+
+
+def _insert_search(conn, nodes):
+    """Строки поискового индекса с rowid статьи; вызывается после записи статей"""
+    conn.executemany(
+        f"INSERT INTO article_search (rowid, {', '.join(search.SEARCH_FIELDS)}) "
+        f"SELECT rowid, ?, ?, ?, ? FROM articles WHERE id = ?",
+        [search.document(node) + (node['id'],) for node in nodes]
+    )
+    conn.executemany(
+        f"INSERT INTO article_prefix (rowid, {', '.join(search.SEARCH_FIELDS)}) "
+        f"SELECT s.rowid, {', '.join('s.' + field for field in search.SEARCH_FIELDS)} FROM article_search s "
+        f"WHERE s.rowid = (SELECT rowid FROM articles WHERE id = ?)",
+        [(node['id'],) for node in nodes]
+    )
+
+
+def refresh_search(conn):
+    """Строит поисковый индекс заново, если его нет или он построен прежней версией"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'search'").fetchone()
+    if row and row[0] == search.SEARCH_VERSION:
+        return
+    rows = conn.execute(f'{_NODE_SELECT} ORDER BY a.position').fetchall()
+    nodes = _rows_to_nodes(conn, rows)
+    logger.info("Building search index for %d articles...", len(nodes))
+    with conn:
+        conn.execute('DROP TABLE IF EXISTS article_prefix')
+        conn.execute('DROP TABLE IF EXISTS article_search')
+        for statement in SEARCH_SCHEMA:
+            conn.execute(statement)
+        _insert_search(conn, nodes)
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('search', ?)", (search.SEARCH_VERSION,))
+
+
+def refresh_vectors(conn):
+    """Удаляет векторы, построенные прежней версией векторизации"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'vectors'").fetchone()
+    if row and row[0] == similarity.VECTORIZER_VERSION:
+        return
+    with conn:
+        conn.execute('DELETE FROM article_vectors')
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('vectors', ?)", (similarity.VECTORIZER_VERSION,))
+
+
+def save_vectors(vectors, conn=None):
+    """Сохраняет векторы {id: (отпечаток, признаки, частоты)}"""
+    conn = conn or get_connection()
+    conn.executemany(
+        'INSERT OR REPLACE INTO article_vectors VALUES (?, ?, ?, ?)',
+        [(article_id, fingerprint, features.tobytes(), counts.tobytes())
+         for article_id, (fingerprint, features, counts) in vectors.items()]
+    )
+
+
+def load_vectors(node_ids=None):
+    """Сохраненные векторы {id: (отпечаток, признаки, частоты)}; node_ids=None - все"""
+    conn = get_connection()
+    query = 'SELECT article_id, fingerprint, features, counts FROM article_vectors'
+    with conn:
+        if node_ids is not None:
+            _select_ids(conn, node_ids)
+            query += ' WHERE article_id IN (SELECT id FROM selected)'
+        rows = conn.execute(query).fetchall()
+    return {
+        article_id: (fingerprint, np.frombuffer(features, dtype=np.int32), np.frombuffer(counts, dtype=np.uint16))
+        for article_id, fingerprint, features, counts in rows
+    }
+
+
+def save_graph(graph):
+    """Полностью заменяет граф в одной транзакции"""
+    conn = get_connection()
+    with conn:
+        # Индекс префиксов с внешним текстом очищается своей командой
+        conn.execute("INSERT INTO article_prefix (article_prefix) VALUES ('delete-all')")
+        for table in ('links', 'node_layout', 'node_analytics', 'article_identity', 'article_topics', 'article_keywords',
+                      'article_authors', 'article_search', 'articles'):
+            conn.execute(f'DELETE FROM {table}')
+        _insert_graph(conn, graph, 0)
+        _bump_version(conn)
+
+
+def add_graph(graph):
+    """Добавляет (или обновляет) узлы и новые связи в одной транзакции"""
+    conn = get_connection()
+    with conn:
+        ids = [(node['id'],) for node in graph.get('nodes', [])]
+        conn.executemany('DELETE FROM article_authors WHERE article_id = ?', ids)
+        conn.executemany('DELETE FROM article_keywords WHERE article_id = ?', ids)
+        conn.executemany('DELETE FROM article_topics WHERE article_id = ?', ids)
+        conn.executemany('DELETE FROM article_identity WHERE article_id = ?', ids)
+        next_position = conn.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM articles').fetchone()[0]
+        _insert_graph(conn, graph, next_position)
+        _bump_version(conn)
+
+
+def _bump_version(conn):
+    """Увеличивает версию графа; вызывается в той же транзакции, что и запись"""
+    conn.execute(
+        "INSERT INTO meta VALUES ('graph_version', 1) "
+        "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+    )
+
+
+def graph_version():
+    """Текущая версия графа; меняется при каждой записи, в том числе из другого процесса"""
+    row = get_connection().execute("SELECT value FROM meta WHERE key = 'graph_version'").fetchone()
+    return int(row[0]) if row else 0
+
+
+def _rows_to_nodes(conn, rows, selected=False):
+    """Собирает словари узлов; selected - ограничить дочерние таблицы временной таблицей selected"""
+    nodes = []
+    by_id = {}
+    for row in rows:
+        node = dict(zip(NODE_COLUMNS, row[:len(NODE_COLUMNS)]))
+        node.update({'keywords': [], 'search_keywords': [], 'authors': []})
+        if row[-1]:
+            node.update(json.loads(row[-1]))
+        nodes.append(node)
+        by_id[node['id']] = node
+
+    # CROSS JOIN оставляет маленькую временную таблицу во внешнем цикле: без статистики
+    # по ней планировщик иначе перебирает всю дочернюю таблицу
+    join = 'selected s CROSS JOIN {} t ON t.article_id = s.id' if selected else '{} t'
+    for article_id, name in conn.execute(
+        f"SELECT t.article_id, t.name FROM {join.format('article_authors')} ORDER BY t.article_id, t.position"
+    ):
+        if article_id in by_id:
+            by_id[article_id]['authors'].append(name)
+    for article_id, kind, keyword in conn.execute(
+        f"SELECT t.article_id, t.kind, t.keyword FROM {join.format('article_keywords')} "
+        f"ORDER BY t.article_id, t.kind, t.position"
+    ):
+        if article_id in by_id:
+            by_id[article_id][kind].append(keyword)
+    return nodes
+
+
+def _rows_to_links(rows):
+    links = []
+    for row in rows:
+        link = dict(zip(LINK_COLUMNS, row[:len(LINK_COLUMNS)]))
+        if row[-1]:
+            link.update(json.loads(row[-1]))
+        links.append(link)
+    return links
+
+
+_NODE_FIELDS = ', '.join(f'a.{column}' for column in NODE_COLUMNS) + ', a.extra'
+# Те же поля без текста аннотации (NULL на ее месте)
+_BRIEF_NODE_FIELDS = ', '.join('NULL' if column == 'full_abstract' else f'a.{column}' for column in NODE_COLUMNS) + ', a.extra'
+_LINK_FIELDS = ', '.join(f'l.{column}' for column in LINK_COLUMNS) + ', l.extra'
+_NODE_SELECT = f'SELECT {_NODE_FIELDS} FROM articles a'
+_LINK_SELECT = f'SELECT {_LINK_FIELDS} FROM links l'
+
+
+def load_graph(with_abstracts=True):
+    """Загружает весь граф в формате {'nodes', 'links'}.
+
+    with_abstracts=False - узлы без full_abstract: для графа в памяти сервера, где
+    аннотации занимали бы большую часть памяти (они читаются по запросу, load_abstracts).
+    """
+    conn = get_connection()
+    fields = _NODE_FIELDS if with_abstracts else _BRIEF_NODE_FIELDS
+    nodes = _rows_to_nodes(conn, conn.execute(f'SELECT {fields} FROM articles a ORDER BY a.position'))
+    if not with_abstracts:
+        for node in nodes:
+            del node['full_abstract']
+    links = _rows_to_links(conn.execute(f'{_LINK_SELECT} ORDER BY l.rowid'))
+    return {'nodes': nodes, 'links': links}
+
+
+def load_abstracts(node_ids):
+    """Словарь id -> текст аннотации"""
+    conn = get_connection()
+    with conn:
+        _select_ids(conn, node_ids)
+        return dict(conn.execute('SELECT a.id, a.full_abstract FROM selected s CROSS JOIN articles a ON a.id = s.id'))
+
+
+def query_nodes(start_year=None, end_year=None):
+    """Узлы в диапазоне лет (по индексу на year), в порядке добавления"""
+    conn = get_connection()
+    conditions, params = [], []
+    if start_year is not None:
+        conditions.append('a.year >= ?')
+        params.append(start_year)
+    if end_year is not None:
+        conditions.append('a.year <= ?')
+        params.append(end_year)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    rows = conn.execute(f'{_NODE_SELECT} {where} ORDER BY a.position', params).fetchall()
+    if not conditions:
+        return _rows_to_nodes(conn, rows)
+    _select_ids(conn, [row[0] for row in rows])
+    return _rows_to_nodes(conn, rows, selected=True)
+
+
+def links_among(node_ids):
+    """Связи, у которых оба конца входят в node_ids (по индексам на концы связей)"""
+    conn = get_connection()
+    with conn:
+        _select_ids(conn, node_ids)
+        rows = conn.execute(
+            f'SELECT {_LINK_FIELDS} FROM selected s CROSS JOIN links l ON l.source = s.id '
+            f'JOIN selected t ON t.id = l.target ORDER BY l.rowid'
+        ).fetchall()
+    return _rows_to_links(rows)
+
+
+def load_nodes(node_ids):
+    """Узлы по идентификаторам в порядке node_ids; неизвестные пропускаются"""
+    node_ids = list(node_ids)
+    conn = get_connection()
+    with conn:
+        _select_ids(conn, node_ids)
+        rows = conn.execute(f'SELECT {_NODE_FIELDS} FROM selected s CROSS JOIN articles a ON a.id = s.id').fetchall()
+        by_id = {node['id']: node for node in _rows_to_nodes(conn, rows, selected=True)}
+    return [by_id[node_id] for node_id in node_ids if node_id in by_id]
+
+
+def neighbors(node_ids, types=None):
+    """Связи узлов node_ids в обе стороны по индексу смежности: список (node_id, neighbor_id, type, strength)"""
+    type_filter, params = '', []
+    if types:
+        type_filter = f"AND l.type IN ({', '.join('?' * len(types))})"
+        params = list(types)
+    conn = get_connection()
+    with conn:
+        _select_ids(conn, node_ids)
+        return conn.execute(
+            f'SELECT l.source, l.target, l.type, l.strength FROM selected s '
+            f'CROSS JOIN links l ON l.source = s.id {type_filter} '
+            f'UNION ALL '
+            f'SELECT l.target, l.source, l.type, l.strength FROM selected s '
+            f'CROSS JOIN links l ON l.target = s.id {type_filter}',
+            params + params
+        ).fetchall()
+
+
+def citation_counts(node_ids):
+    """Словарь id -> citation_count"""
+    conn = get_connection()
+    with conn:
+        _select_ids(conn, node_ids)
+        return dict(conn.execute('SELECT a.id, a.citation_count FROM selected s CROSS JOIN articles a ON a.id = s.id'))
+
+
+def articles_by_author(name, limit):
+    """ID статей автора (по ORCID или ключу имени), самые цитируемые первыми"""
+    orcid = authorship.normalize_orcid(name)
+    column, value = ('t.orcid', orcid) if orcid else ('t.key', authorship.name_key(name))
+    return [row[0] for row in get_connection().execute(
+        'SELECT DISTINCT t.article_id, a.citation_count, a.position FROM article_authors t '
+        f'JOIN articles a ON a.id = t.article_id WHERE {column} = ? '
+        'ORDER BY a.citation_count DESC, a.position LIMIT ?',
+        (value, limit)
+    )]
+
+
+def author_records(node_ids=None):
+    """Записи указателя авторов (article_id, имя, ключ, ORCID) статей node_ids (None - всех)"""
+    conn = get_connection()
+    with conn:
+        if node_ids is None:
+            return conn.execute("SELECT article_id, name, key, orcid FROM article_authors WHERE key != ''").fetchall()
+        _select_ids(conn, node_ids)
+        return conn.execute(
+            'SELECT t.article_id, t.name, t.key, t.orcid FROM selected s CROSS JOIN article_authors t '
+            "ON t.article_id = s.id WHERE t.key != ''"
+        ).fetchall()
+
+
+# Допустимые порядки постраничного списка статей
+LIST_ORDERS = {
+    'position': 'a.position',
+    'citation_count': 'a.citation_count DESC, a.position',
+    'year': 'a.year DESC, a.position',
+    'title': 'a.title COLLATE NOCASE, a.position'
+}
+
+
+def list_articles(topic=None, start_year=None, end_year=None, order='position', offset=0, limit=50):
+    """Страница статей с фильтрами по теме и годам: (всего подходящих, узлы страницы)"""
+    conditions, params = [], []
+    if topic is not None:
+        conditions.append('a.id IN (SELECT article_id FROM article_topics WHERE topic = ?)')
+        params.append(topic)
+    if start_year is not None:
+        conditions.append('a.year >= ?')
+        params.append(start_year)
+    if end_year is not None:
+        conditions.append('a.year <= ?')
+        params.append(end_year)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    conn = get_connection()
+    total = conn.execute(f'SELECT COUNT(*) FROM articles a {where}', params).fetchone()[0]
+    rows = conn.execute(
+        f'{_NODE_SELECT} {where} ORDER BY {LIST_ORDERS[order]} LIMIT ? OFFSET ?', params + [limit, offset]
+    ).fetchall()
+    with conn:
+        _select_ids(conn, [row[0] for row in rows])
+        nodes = _rows_to_nodes(conn, rows, selected=True)
+    return total, nodes
+
+
+def search_articles(expression, topic=None, start_year=None, end_year=None, offset=0, limit=50):
+    """Поиск по индексу: (всего совпадений, [(id, оценка BM25, заголовок, фрагмент аннотации)])
+    по убыванию оценки. expression - пара выражений FTS5 (search.match_expression); в заголовке
+    и фрагменте совпадения окружены search.MARK_START и search.MARK_END.
+
+    Ранжирует и выделяет совпадения индекс целых слов; префиксы только отбирают статьи.
+    Запрос из одних префиксов ранжируется индексом префиксов.
+    """
+    words, prefixes = expression
+    table = 'article_search' if words else 'article_prefix'
+    conditions, params = [f'{table} MATCH ?'], [words or prefixes]
+    if words and prefixes:
+        conditions.append('s.rowid IN (SELECT rowid FROM article_prefix WHERE article_prefix MATCH ?)')
+        params.append(prefixes)
+    if topic is not None:
+        # EXISTS проверяет каждое совпадение по первичному ключу, а не строит список всей темы
+        conditions.append('EXISTS (SELECT 1 FROM article_topics t WHERE t.article_id = a.id AND t.topic = ?)')
+        params.append(topic)
+    if start_year is not None:
+        conditions.append('a.year >= ?')
+        params.append(start_year)
+    if end_year is not None:
+        conditions.append('a.year <= ?')
+        params.append(end_year)
+    where = ' AND '.join(conditions)
+    conn = get_connection()
+    source = f'{table} s JOIN articles a ON a.rowid = s.rowid'
+    # Без фильтров совпадения считаются по индексу, без обращения к статьям
+    filtered = topic is not None or start_year is not None or end_year is not None
+    total = conn.execute(
+        f'SELECT COUNT(*) FROM {source if filtered else f"{table} s"} WHERE {where}', params
+    ).fetchone()[0]
+    marks = (search.MARK_START, search.MARK_END)
+    rows = conn.execute(
+        f"SELECT a.id, -{search.rank_function(table)} AS score, highlight({table}, 0, ?, ?), "
+        f"snippet({table}, 1, ?, ?, '…', ?) FROM {source} "
+        f"WHERE {where} ORDER BY score DESC LIMIT ? OFFSET ?",
+        marks + marks + (search.SNIPPET_TOKENS,) + tuple(params) + (limit, offset)
+    ).fetchall()
+    return total, rows
+
+
+def _select_ids(conn, node_ids):
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS selected (id TEXT PRIMARY KEY)')
+    conn.execute('DELETE FROM selected')
+    conn.executemany('INSERT OR IGNORE INTO selected VALUES (?)', [(node_id,) for node_id in node_ids])
+
+
+def save_layout(positions):
+    """Заменяет сохраненную раскладку графа {id: (x, y)}"""
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM node_layout')
+        conn.executemany(
+            'INSERT OR IGNORE INTO node_layout SELECT id, ?, ? FROM articles WHERE id = ?',
+            [(x, y, article_id) for article_id, (x, y) in positions.items()]
+        )
+        _bump_version(conn)
+
+
+def load_layout(node_ids=None):
+    """Сохраненная раскладка {id: (x, y)}, всего графа или только узлов node_ids"""
+    conn = get_connection()
+    if node_ids is None:
+        return {row[0]: (row[1], row[2]) for row in conn.execute('SELECT article_id, x, y FROM node_layout')}
+    with conn:
+        _select_ids(conn, node_ids)
+        return {row[0]: (row[1], row[2]) for row in conn.execute(
+            'SELECT p.article_id, p.x, p.y FROM selected s CROSS JOIN node_layout p ON p.article_id = s.id'
+        )}
+
+
+ANALYTICS_FIELDS = ('pagerank', 'degree', 'betweenness', 'community')
+
+
+def save_analytics(result, version):
+    """Заменяет сохраненную аналитику (analytics.analyze) и отмечает версию графа, по которой
+    она посчитана. Версия графа не меняется: аналитика - производная от той же версии"""
+    conn = get_connection()
+    with conn:
+        conn.execute('DELETE FROM node_analytics')
+        conn.execute('DELETE FROM communities')
+        conn.executemany(
+            'INSERT OR IGNORE INTO node_analytics SELECT id, ?, ?, ?, ? FROM articles WHERE id = ?',
+            [tuple(values[field] for field in ANALYTICS_FIELDS) + (article_id,)
+             for article_id, values in result['nodes'].items()]
+        )
+        conn.executemany('INSERT INTO communities VALUES (?, ?, ?, ?, ?)', [
+            (community['id'], community['size'], community['label'], community['pagerank'], json.dumps({
+                key: value for key, value in community.items() if key not in ('id', 'size', 'label', 'pagerank')
+            }, ensure_ascii=False))
+            for community in result['communities']
+        ])
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('analytics', ?)", (version,))
+
+
+def analytics_version():
+    """Версия графа, для которой сохранена аналитика; None - аналитики нет"""
+    row = get_connection().execute("SELECT value FROM meta WHERE key = 'analytics'").fetchone()
+    return int(row[0]) if row else None
+
+
+def load_analytics():
+    """Сохраненная аналитика в форме analytics.analyze"""
+    conn = get_connection()
+    nodes = {
+        row[0]: dict(zip(ANALYTICS_FIELDS, row[1:]))
+        for row in conn.execute('SELECT article_id, ' + ', '.join(ANALYTICS_FIELDS) + ' FROM node_analytics')
+    }
+    return {'nodes': nodes, 'communities': load_communities()}
+
+
+def load_communities(offset=0, limit=-1):
+    """Сообщества по убыванию размера"""
+    rows = get_connection().execute(
+        'SELECT id, size, label, pagerank, extra FROM communities ORDER BY id LIMIT ? OFFSET ?', (limit, offset)
+    ).fetchall()
+    return [
+        dict({'id': row[0], 'size': row[1], 'label': row[2], 'pagerank': row[3]}, **json.loads(row[4] or '{}'))
+        for row in rows
+    ]
+
+
+def count_communities():
+    return get_connection().execute('SELECT COUNT(*) FROM communities').fetchone()[0]
+
+
+# Метрики, по которым /api/analytics отдает самые центральные статьи
+ANALYTICS_ORDERS = ('pagerank', 'betweenness', 'degree')
+
+
+def top_articles(metric, limit, community=None):
+    """Статьи с наибольшим значением метрики: [{id, title, year, journal, метрики}]"""
+    where, params = '', [limit]
+    if community is not None:
+        where, params = 'WHERE n.community = ?', [community, limit]
+    rows = get_connection().execute(
+        'SELECT a.id, a.title, a.year, a.journal, ' + ', '.join(f'n.{field}' for field in ANALYTICS_FIELDS) +
+        f' FROM node_analytics n JOIN articles a ON a.id = n.article_id {where} '
+        f'ORDER BY n.{metric} DESC, a.position LIMIT ?',
+        params
+    ).fetchall()
+    return [dict(zip(('id', 'title', 'year', 'journal') + ANALYTICS_FIELDS, row)) for row in rows]
+
+
+def community_members(community):
+    """Идентификаторы статей сообщества в порядке добавления"""
+    return [row[0] for row in get_connection().execute(
+        'SELECT n.article_id FROM node_analytics n JOIN articles a ON a.id = n.article_id '
+        'WHERE n.community = ? ORDER BY a.position', (community,)
+    )]
+
+
+def topic_members():
+    """Словарь тема -> множество идентификаторов статей для всех настроенных тем"""
+    members = {topic: set() for topic in topics.load_topics()}
+    for article_id, topic in get_connection().execute('SELECT article_id, topic FROM article_topics'):
+        members.setdefault(topic, set()).add(article_id)
+    return members
+
+
+def article_ids():
+    """Множество идентификаторов всех статей"""
+    return {row[0] for row in get_connection().execute('SELECT id FROM articles')}
+
+
+def count_articles():
+    return get_connection().execute('SELECT COUNT(*) FROM articles').fetchone()[0]
+
+
+def keyword_frequencies(terms):
+    """Число статей с каждым из нормализованных ключевых слов"""
+    terms = list(terms)
+    if not terms:
+        return {}
+    placeholders = ', '.join('?' * len(terms))
+    return dict(get_connection().execute(
+        f'SELECT key, COUNT(DISTINCT article_id) FROM article_keywords WHERE key IN ({placeholders}) GROUP BY key',
+        terms
+    ).fetchall())
+
+
+def keyword_sets(ids):
+    """Нормализованные множества ключевых слов статей по идентификаторам"""
+    ids = list(ids)
+    sets = {article_id: set() for article_id in ids}
+    if not ids:
+        return sets
+    placeholders = ', '.join('?' * len(ids))
+    for article_id, key in get_connection().execute(
+        f'SELECT article_id, key FROM article_keywords WHERE article_id IN ({placeholders})', ids
+    ):
+        sets[article_id].add(key)
+    return sets
+
+
+def find_common(kind, terms):
+    """Статьи, у которых есть нормализованные авторы (kind='authors') или ключевые слова из terms.
+
+    Возвращает список (position, article_id, term) по индексу на key.
+    """
+    terms = list(terms)
+    if not terms:
+        return []
+    table = 'article_authors' if kind == 'authors' else 'article_keywords'
+    placeholders = ', '.join('?' * len(terms))
+    return get_connection().execute(
+        f'SELECT DISTINCT a.position, t.article_id, t.key FROM {table} t '
+        f'JOIN articles a ON a.id = t.article_id WHERE t.key IN ({placeholders})',
+        terms
+    ).fetchall()
+
+
+def find_coauthors(keys):
+    """Статьи с авторами, чьи ключи имен входят в keys: список (position, article_id, key, orcid)"""
+    keys = list(keys)
+    if not keys:
+        return []
+    placeholders = ', '.join('?' * len(keys))
+    return get_connection().execute(
+        f'SELECT DISTINCT a.position, t.article_id, t.key, t.orcid FROM article_authors t '
+        f'JOIN articles a ON a.id = t.article_id WHERE t.key IN ({placeholders})',
+        keys
+    ).fetchall()
+
+
+def find_identities(keys):
+    """Статьи с общими ключами дубликатов: список (id, title, doi)"""
+    keys = list(keys)
+    if not keys:
+        return []
+    placeholders = ', '.join('?' * len(keys))
+    rows = get_connection().execute(
+        f"SELECT DISTINCT a.id, a.title, json_extract(a.extra, '$.doi'), i.kind, i.key FROM article_identity i "
+        f"JOIN articles a ON a.id = i.article_id WHERE i.key IN ({placeholders})",
+        [key for _, key in keys]
+    ).fetchall()
+    wanted = set(keys)
+    found = {}
+    for article_id, title, doi, kind, key in rows:
+        if (kind, key) in wanted:
+            found.setdefault(article_id, (article_id, title, doi))
+    return list(found.values())
+
+
+def add_provenance(merged):
+    """Дописывает происхождение слитых дубликатов {id: [записи]} в сохраненные статьи"""
+    if not merged:
+        return
+    conn = get_connection()
+    with conn:
+        changed = False
+        for article_id, entries in merged.items():
+            row = conn.execute('SELECT source, extra FROM articles WHERE id = ?', (article_id,)).fetchone()
+            if row is None:
+                continue
+            extra = json.loads(row[1]) if row[1] else {}
+            node = {'id': article_id, 'source': row[0], 'search_keywords': [], **extra}
+            if 'provenance' not in extra:
+                # Статья сохранена до появления происхождения: первая запись - она сама
+                node['search_keywords'] = [keyword for (keyword,) in conn.execute(
+                    "SELECT keyword FROM article_keywords WHERE article_id = ? AND kind = 'search_keywords' "
+                    "ORDER BY position", (article_id,)
+                )]
+            if identity.add_provenance(node, entries):
+                extra['provenance'] = node['provenance']
+                conn.execute('UPDATE articles SET extra = ? WHERE id = ?',
+                             (json.dumps(extra, ensure_ascii=False), article_id))
+                changed = True
+        if changed:
+            _bump_version(conn)
+
+
+def save_references(references, source):
+    """Сохраняет списки литературы {id: [DOI]} и отмечает статьи разрешенными"""
+    if not references:
+        return
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO article_references VALUES (?, ?)',
+            [(article_id, doi) for article_id, dois in references.items() for doi in dois]
+        )
+        conn.executemany(
+            'INSERT OR REPLACE INTO reference_status (article_id, source) VALUES (?, ?)',
+            [(article_id, source) for article_id in references]
+        )
+
+
+def unresolved_references():
+    """Статьи, список литературы которых еще не запрашивался: список (id, doi)"""
+    return get_connection().execute(
+        "SELECT a.id, json_extract(a.extra, '$.doi') FROM articles a "
+        "LEFT JOIN reference_status s ON s.article_id = a.id WHERE s.article_id IS NULL ORDER BY a.position"
+    ).fetchall()
+
+
+def add_citation_links(article_ids):
+    """Добавляет связи 'cites' (source цитирует target), у которых хотя бы один конец из article_ids.
+
+    Цели находятся по индексу DOI в article_identity. Возвращает число новых связей.
+    """
+    if not article_ids:
+        return 0
+    conn = get_connection()
+    with conn:
+        _select_ids(conn, article_ids)
+        added = conn.execute('''
+            INSERT INTO links (source, target, type, strength)
+            SELECT DISTINCT c.source, c.target, 'cites', 1 FROM (
+                SELECT r.article_id AS source, i.article_id AS target
+                FROM selected s
+                JOIN article_references r ON r.article_id = s.id
+                JOIN article_identity i ON i.key = r.ref_doi AND i.kind = 'doi'
+                UNION
+                SELECT r.article_id AS source, s.id AS target
+                FROM selected s
+                JOIN article_identity i ON i.article_id = s.id AND i.kind = 'doi'
+                JOIN article_references r ON r.ref_doi = i.key
+            ) c
+            JOIN articles a ON a.id = c.source
+            JOIN articles b ON b.id = c.target
+            WHERE c.source != c.target AND NOT EXISTS (
+                SELECT 1 FROM links l WHERE l.source = c.source AND l.target = c.target AND l.type = 'cites'
+            )
+        ''').rowcount
+        if added:
+            _bump_version(conn)
+    return added
+
+
+def get_watermark(source, query):
+    """Покрытый интервал (covered_from, covered_until) в ISO-датах или None"""
+    return get_connection().execute(
+        'SELECT covered_from, covered_until FROM watermarks WHERE source = ? AND query = ?', (source, query)
+    ).fetchone()
+
+
+def reset_watermarks(version, sources):
+    """Удаляет водяные знаки источников sources, сохраненные до версии version сбора"""
+    conn = get_connection()
+    row = conn.execute("SELECT value FROM meta WHERE key = 'watermarks'").fetchone()
+    if row and row[0] == version:
+        return
+    with conn:
+        deleted = conn.executemany('DELETE FROM watermarks WHERE source = ?', [(source,) for source in sources]).rowcount
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('watermarks', ?)", (version,))
+    if deleted:
+        logger.info("Reset %d harvest watermarks of %s", deleted, ', '.join(sources))
+
+
+def save_watermarks(watermarks):
+    """Сохраняет список (source, query, covered_from, covered_until)"""
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            'INSERT INTO watermarks (source, query, covered_from, covered_until) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT (source, query) DO UPDATE SET covered_from = excluded.covered_from, '
+            'covered_until = excluded.covered_until, updated_at = CURRENT_TIMESTAMP',
+            watermarks
+        )
+
+
+# Сколько задач хранить в таблице jobs
+JOB_HISTORY_SIZE = 200
+
+
+def _write_job(conn, snapshot):
+    conn.execute(
+        'INSERT INTO jobs (id, kind, status, created_at, cancel_requested, snapshot, key, heartbeat) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?) '
+        'ON CONFLICT (id) DO UPDATE SET status = excluded.status, snapshot = excluded.snapshot, '
+        'heartbeat = excluded.heartbeat, cancel_requested = MAX(cancel_requested, excluded.cancel_requested)',
+        (snapshot['id'], snapshot['kind'], snapshot['status'], snapshot['created_at'],
+         int(snapshot['cancel_requested']), json.dumps(snapshot, ensure_ascii=False, default=str),
+         snapshot.get('key'), time.time())
+    )
+    if snapshot['status'] == 'queued':
+        conn.execute(
+            'DELETE FROM jobs WHERE id IN (SELECT id FROM jobs ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+            (JOB_HISTORY_SIZE,)
+        )
+
+
+def save_job(snapshot):
+    """Сохраняет состояние задачи (jobs.Job.snapshot), не сбрасывая запрошенную отмену"""
+    conn = get_connection()
+    with conn:
+        _write_job(conn, snapshot)
+
+
+def claim_job(snapshot, stale_after):
+    """Записывает новую задачу, если у ее ключа нет активной задачи ни в одном процессе.
+
+    Возвращает состояние уже активной задачи или None, если записана новая. Задача,
+    не записывавшаяся дольше stale_after секунд, считается оборвавшейся вместе с процессом.
+    Проверка и запись идут в одной транзакции с блокировкой записи: из двух процессов,
+    запускающих задачу одновременно, второй видит задачу первого.
+    """
+    conn = get_connection()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            "SELECT snapshot, cancel_requested FROM jobs WHERE key = ? AND status IN ('queued', 'running') "
+            "AND heartbeat >= ? ORDER BY created_at LIMIT 1",
+            (snapshot['key'], time.time() - stale_after)
+        ).fetchone()
+        if row is None:
+            _write_job(conn, snapshot)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return _job_snapshot(row) if row else None
+
+
+def _job_snapshot(row):
+    snapshot = json.loads(row[0])
+    snapshot['cancel_requested'] = bool(row[1])
+    return snapshot
+
+
+def load_job(job_id):
+    """Состояние задачи или None"""
+    row = get_connection().execute('SELECT snapshot, cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _job_snapshot(row) if row else None
+
+
+def list_jobs(limit):
+    """Последние задачи, новые первыми"""
+    return [_job_snapshot(row) for row in get_connection().execute(
+        'SELECT snapshot, cancel_requested FROM jobs ORDER BY created_at DESC LIMIT ?', (limit,)
+    )]
+
+
+def request_job_cancel(job_id):
+    """Отмечает отмену задачи; выполняющий ее процесс увидит отметку при синхронизации.
+    False - такой задачи нет"""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status IN ('queued', 'running')", (job_id,)
+        )
+    return conn.execute('SELECT 1 FROM jobs WHERE id = ?', (job_id,)).fetchone() is not None
+
+
+def job_cancel_requested(job_id):
+    row = get_connection().execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return bool(row and row[0])
+
+
+if __name__ == '__main__':
+    # python storage.py migrate [path/to/articles.json]
+    if len(sys.argv) >= 2 and sys.argv[1] == 'migrate':
+        logging.basicConfig(level=logging.INFO, format='%(message)s')
+        connection = get_connection()
+        if not migrate_json(connection, sys.argv[2] if len(sys.argv) > 2 else LEGACY_JSON_FILE):
+            print("Nothing to migrate")
+    else:
+        print("Usage: python storage.py migrate [path/to/articles.json]")
@@ -0,0 +1,59 @@
+"""Поиск по мере набора: префиксы слов находят статьи, несмотря на стемминг индекса"""
+import pytest
+
+import search
+import storage
+
+
+def article(article_id, title, abstract):
+    return {
+        'id': article_id, 'title': title, 'full_abstract': abstract, 'year': 2024, 'journal': 'Macromolecules',
+        'citation_count': 0, 'source': 'ACS Publications', 'url': '', 'authors': ['J. Smith'], 'keywords': []
+    }
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, 'DATABASE_FILE', str(tmp_path / 'articles.sqlite'))
+    storage.save_graph({'nodes': [
+        article('a', 'Polymer diffusion in copolymer films', 'Molecular simulations of gas diffusion.'),
+        article('b', 'Block copolymer self-assembly', 'Simulated morphologies of thin films.'),
+        article('c', 'Hydrogel networks', 'Mechanical properties of swollen gels.'),
+    ], 'links': []})
+    yield
+    storage.close_connection()
+
+
+def found(query, prefix=True, **kwargs):
+    total, rows = storage.search_articles(search.match_expression(query, prefix), **kwargs)
+    assert total == len(rows)
+    return sorted(row[0] for row in rows)
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('poly', ['a']),
+    ('copoly', ['a', 'b']),
+    ('diffusi', ['a']),
+    ('simulat', ['a', 'b']),
+    ('hydro', ['c']),
+])
+def test_typed_prefixes_match_indexed_words(index, query, expected):
+    assert found(query) == expected
+
+
+def test_whole_words_are_stemmed(index):
+    # "simulation", "simulations" и "simulated" сводятся к одной основе
+    assert found('simulation', prefix=False) == ['a', 'b']
+    assert found('film', prefix=False) == ['a', 'b']
+
+
+def test_words_and_prefix_combined(index):
+    assert found('films copoly') == ['a', 'b']
+    assert found('gas diffusi') == ['a']
+    assert found('films copoly', start_year=2025) == []
+
+
+def test_prefix_index_follows_replaced_articles(index):
+    storage.add_graph({'nodes': [article('a', 'Polyester fibres', 'Spinning.')], 'links': []})
+    assert found('diffusi') == []
+    assert found('polyest') == ['a']
@@ -0,0 +1,42 @@
+"""Темы для фильтрации графа: настраиваются в topics.json"""
+import hashlib
+import json
+import os
+
+import abstracts
+
+TOPICS_FILE = os.environ.get('TOPICS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topics.json'))
+
+_topics = None
+
+
+def load_topics():
+    """Словарь тема -> {'label', 'terms'} в порядке из файла"""
+    global _topics
+    if _topics is None:
+        with open(TOPICS_FILE, 'r', encoding='utf-8') as f:
+            _topics = json.load(f)
+    return _topics
+
+
+def topics_fingerprint():
+    """Хэш настроек тем: при его изменении сохраненную принадлежность нужно пересчитать"""
+    return hashlib.sha1(json.dumps(load_topics(), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def node_text(node):
+    """Текст узла, по которому определяется тема"""
+    return ' '.join([
+        ' '.join(node.get('search_keywords', [])),
+        ' '.join(node.get('keywords', [])),
+        node.get('title', ''),
+        # Как и раньше, тема определяется по началу аннотации
+        node.get('abstract') or abstracts.short(node.get('full_abstract'))
+    ]).lower()
+
+
+def node_topics(node):
+    """Темы, термины которых встречаются в тексте узла"""
+    text = node_text(node)
+    return [topic for topic, config in load_topics().items()
+            if any(term in text for term in config['terms'])]
@@ -0,0 +1,79 @@
+"""Компактный формат ответа /api/articles и сжатие тел ответов"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    # brotli необязателен: без него ответы сжимаются gzip
+    brotli = None
+
+# Меньшие тела не сжимаются: выигрыш меньше заголовков
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _column(values):
+    """Столбец значений; строки с частыми повторами кодируются словарем"""
+    strings = [value for value in values if value is not None]
+    if strings and all(isinstance(value, str) for value in strings):
+        dictionary = list(dict.fromkeys(strings))
+        if len(dictionary) * 2 <= len(values):
+            codes = {value: code for code, value in enumerate(dictionary)}
+            return {'dictionary': dictionary, 'codes': [codes.get(value) for value in values]}
+    return values
+
+
+def _columns(rows, skip=()):
+    keys = []
+    for row in rows:
+        keys.extend(key for key in row if key not in skip and key not in keys)
+    return {key: _column([row.get(key) for row in rows]) for key in keys}
+
+
+def compact_graph(graph):
+    """Граф в столбцах: узлы - массив значений на каждое поле, связи ссылаются на номера узлов.
+
+    Отсутствующее у узла или связи поле передается как null.
+    """
+    nodes = graph['nodes']
+    index = {node['id']: k for k, node in enumerate(nodes)}
+    links = [link for link in graph['links'] if link['source'] in index and link['target'] in index]
+    link_columns = _columns(links, skip=('source', 'target'))
+    link_columns['source'] = [index[link['source']] for link in links]
+    link_columns['target'] = [index[link['target']] for link in links]
+    return {
+        'format': 'columnar',
+        'node_count': len(nodes),
+        'link_count': len(links),
+        'nodes': _columns(nodes),
+        'links': link_columns
+    }
+
+
+def accepted_encoding(accept_encoding):
+    """Лучшее поддерживаемое кодирование из Accept-Encoding: 'br', 'gzip' или None"""
+    offered = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip().lower()] = quality
+    if brotli is not None and offered.get('br', 0) > 0:
+        return 'br'
+    if offered.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """Сжатое тело ответа; (body, None), если сжимать не нужно"""
+    if encoding is None or len(body) < MIN_COMPRESS_SIZE:
+        return body, None
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY), 'br'
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), 'gzip'